@@ -0,0 +1,271 @@
+"""
+Measures the end-to-end cost of the main commands at different scales.
+
+Every scenario runs against a FakeYouTube and stubbed USCCB readings, so no network access is needed.
+The medians can be saved and later compared against, failing if any scenario got slower than the tolerance:
+
+    python -m benchmarks.pipeline --repeat 3 --output baseline.json
+    python -m benchmarks.pipeline --repeat 3 --baseline baseline.json --tolerance 0.25
+
+The descriptions are generated from synthetic masses, unless --masses is given the readings cache
+(e.g. the readings directory next to the token file) of a previous schedule-masses run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import functools
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Final, Self
+from unittest import mock
+
+from catholic_mass_readings import USCCB
+from catholic_mass_readings.models import Mass, MassType, Reading, Section, SectionType, Verse
+
+from stjoseph.api import constants, generators, readings, utils
+from stjoseph.commands import channel, schedule
+from tests import fakes
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from types import TracebackType
+
+_WEEKS: Final[tuple[int, ...]] = (4, 52, 260)
+_ARCHIVE_SIZES: Final[tuple[int, ...]] = (1_000, 10_000, 50_000)
+_DUPLICATE_EVERY: Final[int] = 10  # every nth broadcast of the archive is scheduled twice
+_SHORT_EVERY: Final[int] = 10  # every nth broadcast of the archive was too short to keep
+_ARCHIVE_END: Final[datetime.datetime] = datetime.datetime(2025, 1, 5, 15, tzinfo=datetime.UTC)
+_ARCHIVE_INTERVAL: Final[datetime.timedelta] = datetime.timedelta(hours=6)  # so 50k broadcasts end in the past
+_TEXT: Final[str] = (
+    "In those days, the word of the LORD came to the prophet, saying: Go forth, and proclaim to the people "
+    "all that I command you, for I am with you always, and my words shall not pass away. "
+)
+_CORPUS_SIZE: Final[int] = 52
+
+
+class _Options(argparse.Namespace):
+    repeat: int
+    latency: float
+    rate_limit: float
+    masses: Path | None
+
+
+class _StubUSCCB:
+    """Answers the readings from the corpus instead of USCCB, after latency seconds."""
+
+    DEFAULT_MASS_TYPES: Final[list[MassType]] = USCCB.DEFAULT_MASS_TYPES
+
+    def __init__(self, corpus: list[Mass], latency: float) -> None:
+        self._corpus = corpus
+        self._latency = latency
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        pass
+
+    @staticmethod
+    def get_sunday_mass_dates(start: datetime.date, end: datetime.date | None = None) -> Iterator[datetime.date]:
+        # unlike USCCB, the dates are not capped at the dates which have been published
+        assert end is not None
+        date = start + datetime.timedelta(days=(6 - start.weekday()) % 7)
+        while date < end:
+            yield date
+            date += datetime.timedelta(weeks=1)
+
+    async def get_mass(self, date: datetime.date, _type: MassType) -> Mass | None:
+        if self._latency > 0:
+            await asyncio.sleep(self._latency)
+        return self._corpus[date.toordinal() % len(self._corpus)]._replace(date=date)
+
+
+def _synthetic_mass(idx: int) -> Mass:
+    """Creates a mass with the sections and the length of the readings of a typical Sunday."""
+
+    def reading(book: str, chapter: int, sentences: int) -> Reading:
+        verse = Verse(f"{chapter}:1-{sentences}", f"https://bible.usccb.org/bible/{book}/{chapter}", book)
+        return Reading([verse], _TEXT * sentences)
+
+    chapter = idx % 20 + 1
+    return Mass(
+        None,
+        MassType.DEFAULT,
+        f"https://bible.usccb.org/bible/readings/synthetic-{idx}.cfm",
+        f"Sunday {idx + 1} in Ordinary Time",
+        [
+            Section(SectionType.READING, "Reading I", [reading("isaiah", chapter, 6)]),
+            Section(SectionType.PSALM, "Responsorial Psalm", [reading("psalms", chapter, 4)]),
+            Section(SectionType.READING, "Reading II", [reading("romans", chapter, 5)]),
+            Section(SectionType.ALLELUIA, "Alleluia", [reading("matthew", chapter, 1)]),
+            Section(SectionType.GOSPEL, "Gospel", [reading("matthew", chapter, 10)]),
+        ],
+    )
+
+
+@functools.cache
+def _load_corpus(path: Path | None) -> list[Mass]:
+    corpus = list(readings.MassCache(path).masses()) if path is not None else []
+    return corpus or [_synthetic_mass(idx) for idx in range(_CORPUS_SIZE)]
+
+
+def _create_files(tmp_dir: str) -> tuple[Path, Path]:
+    credentials = Path(tmp_dir, "credentials.json")
+    credentials.write_text("{}")
+    return credentials, Path(tmp_dir, "token.json")
+
+
+def _schedule_masses(weeks: int, options: _Options) -> float:
+    """Times schedule-masses publishing a mass for every Sunday of the weeks."""
+    youtube = fakes.FakeYouTube(options.latency)
+    corpus = _load_corpus(options.masses)
+    start = utils.today()
+    end = start + datetime.timedelta(weeks=weeks)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        credentials, token = _create_files(tmp_dir)
+        args = [
+            "--credentials",
+            str(credentials),
+            "--token",
+            str(token),
+            "--start",
+            start.strftime(constants.DATE_FMT),
+            "--end",
+            end.strftime(constants.DATE_FMT),
+            "--rate-limit",
+            str(options.rate_limit),
+        ]
+        with (
+            mock.patch.object(
+                schedule, "create_channel", functools.partial(channel.create_channel, http_factory=youtube.http)
+            ),
+            mock.patch.object(readings, "create_usccb", functools.partial(_StubUSCCB, corpus, options.latency)),
+        ):
+            start_time = time.perf_counter()
+            asyncio.run(schedule.schedule_masses.main(args, standalone_mode=False))
+            elapsed = time.perf_counter() - start_time
+
+    assert len(youtube) >= weeks - 1, f"only {len(youtube)} masses were scheduled"
+    return elapsed
+
+
+def _get_duplicated_schedules_dates(size: int, options: _Options) -> float:
+    """Times finding the duplicates within an archive of upcoming broadcasts."""
+    youtube = fakes.FakeYouTube(options.latency)
+    duplicated = size // _DUPLICATE_EVERY
+    start = _ARCHIVE_END - size * _ARCHIVE_INTERVAL
+    youtube.populate(size - duplicated, start, _ARCHIVE_INTERVAL, life_cycle_status="created")
+    interval = _ARCHIVE_INTERVAL * ((size - duplicated) // duplicated)
+    youtube.populate(duplicated, start, interval, life_cycle_status="created")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        channel_svc = channel.create_channel(*_create_files(tmp_dir), http_factory=youtube.http)
+        start_time = time.perf_counter()
+        duplicates = channel_svc.get_duplicated_schedules_dates()
+        elapsed = time.perf_counter() - start_time
+
+    assert len(duplicates) == duplicated
+    return elapsed
+
+
+def _list_eligible_for_deletion(size: int, options: _Options) -> float:
+    """Times listing the broadcasts which can be deleted from an archive of completed broadcasts."""
+    youtube = fakes.FakeYouTube(options.latency)
+    short = size // _SHORT_EVERY
+    start = _ARCHIVE_END - size * _ARCHIVE_INTERVAL
+    youtube.populate(size - short, start, _ARCHIVE_INTERVAL)
+    interval = _ARCHIVE_INTERVAL * ((size - short) // short)
+    youtube.populate(short, start + datetime.timedelta(hours=1), interval, duration=datetime.timedelta(minutes=5))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        channel_svc = channel.create_channel(*_create_files(tmp_dir), http_factory=youtube.http)
+        start_time = time.perf_counter()
+        eligible = list(channel_svc.list_eligible_for_deletion())
+        elapsed = time.perf_counter() - start_time
+
+    assert len(eligible) == short
+    return elapsed
+
+
+def _generate_description(options: _Options) -> float:
+    """Times generating the description of every mass of the corpus."""
+    corpus = _load_corpus(options.masses)
+    start_time = time.perf_counter()
+    for mass in corpus:
+        generators.generate_description(mass)
+    return time.perf_counter() - start_time
+
+
+_SCENARIOS: Final[dict[str, Callable[[_Options], float]]] = {
+    **{f"schedule_masses_{weeks}w": functools.partial(_schedule_masses, weeks) for weeks in _WEEKS},
+    **{
+        f"get_duplicated_schedules_dates_{size // 1000}k": functools.partial(_get_duplicated_schedules_dates, size)
+        for size in _ARCHIVE_SIZES
+    },
+    **{
+        f"list_eligible_for_deletion_{size // 1000}k": functools.partial(_list_eligible_for_deletion, size)
+        for size in _ARCHIVE_SIZES
+    },
+    "generate_description": _generate_description,
+}
+
+
+def _compare(
+    results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], tolerance: float
+) -> list[str]:
+    """Gets the scenarios whose median is slower than the baseline by more than the tolerance."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median"] / baseline[name]["median"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: {result['median']:.4f}s vs {baseline[name]['median']:.4f}s ({ratio:.2f}x)")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="The number of times each scenario is run")
+    parser.add_argument(
+        "--scenario", dest="scenarios", action="append", choices=list(_SCENARIOS), help="Only run the scenario"
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="The seconds each YouTube and USCCB request takes")
+    parser.add_argument(
+        "--rate-limit", type=float, default=1000.0, help="The requests per second made for the mass readings"
+    )
+    parser.add_argument("--masses", type=Path, help="The readings cache directory the masses are loaded from")
+    parser.add_argument("--output", type=Path, help="Write the results to the file")
+    parser.add_argument("--baseline", type=Path, help="Fail if a scenario is slower than in the results file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="The slowdown allowed against the baseline")
+    options = parser.parse_args(namespace=_Options())
+
+    results: dict[str, dict[str, float]] = {}
+    for name in options.scenarios or _SCENARIOS:
+        timings = [_SCENARIOS[name](options) for _ in range(options.repeat)]
+        results[name] = {"median": statistics.median(timings), "min": min(timings), "max": max(timings)}
+
+    print(json.dumps(results, indent=2))  # noqa: T201
+    if options.output is not None:
+        options.output.write_text(json.dumps(results, indent=2) + "\n")
+
+    if options.baseline is not None:
+        regressions = _compare(results, json.loads(options.baseline.read_text()), options.tolerance)
+        for regression in regressions:
+            print(f"Regression {regression}", file=sys.stderr)  # noqa: T201
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
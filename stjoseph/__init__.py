@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import importlib
 import importlib.metadata
+from typing import TYPE_CHECKING, Any
 
-from stjoseph import api
+if TYPE_CHECKING:
+    from stjoseph import api
 
 # set the version number within the package using importlib
 try:
@@ -13,3 +16,12 @@ except importlib.metadata.PackageNotFoundError:
 
 
 __all__ = ["__version__", "api"]
+
+
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    # the api is imported on first use so that the CLI starts without its dependencies
+    if name == "api":
+        return importlib.import_module(f"{__name__}.{name}")
+
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
@@ -1,3 +1,48 @@
-from stjoseph.api import constants, generators, oauth2, services
+from __future__ import annotations
 
-__all__ = ["constants", "generators", "oauth2", "services"]
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from stjoseph.api import (
+        cassette,
+        constants,
+        export,
+        generators,
+        metrics,
+        oauth2,
+        profiling,
+        quota,
+        readings,
+        reconcile,
+        services,
+        snapshot,
+        thumbnails,
+        watermark,
+    )
+
+__all__ = [
+    "cassette",
+    "constants",
+    "export",
+    "generators",
+    "metrics",
+    "oauth2",
+    "profiling",
+    "quota",
+    "readings",
+    "reconcile",
+    "services",
+    "snapshot",
+    "thumbnails",
+    "watermark",
+]
+
+
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    # the submodules are imported on first use since most of them pull in heavy dependencies
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
@@ -0,0 +1,290 @@
+"""
+Records the HTTP responses of a run into a cassette file, to replay them later without the network.
+
+The responses are matched on the method and URI of the request, each recorded response being replayed once
+in the order it was recorded, so retries and paging replay exactly as they happened. The request headers and
+bodies (which carry the OAuth token) are never recorded.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import contextlib
+import json
+import logging
+import threading
+import time
+from http import HTTPStatus
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Literal, NamedTuple
+
+from stjoseph.api import utils
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from os import PathLike
+
+    import httplib2
+    from curl_cffi.requests import Response
+
+    from stjoseph.api.services.async_channel import Session
+
+logger = logging.getLogger(__name__)
+
+CassetteMode = Literal["record", "replay"]
+
+_VERSION = 1
+# the headers which describe the encoding of the content as it was sent, rather than as it is recorded
+_SKIPPED_HEADERS = frozenset(("content-encoding", "content-length", "status", "transfer-encoding"))
+
+
+class CassetteError(Exception):
+    """Raised when a request made during a replay was not recorded."""
+
+
+class Interaction(NamedTuple):
+    method: str
+    uri: str
+    status: int
+    headers: dict[str, str]
+    content: bytes
+    elapsed: float
+
+    def to_dict(self) -> dict[str, Any]:
+        try:
+            body: dict[str, str] = {"text": self.content.decode()}
+        except UnicodeDecodeError:
+            body = {"base64": base64.b64encode(self.content).decode()}
+        return {
+            "request": {"method": self.method, "uri": self.uri},
+            "response": {"status": self.status, "headers": self.headers, "body": body},
+            "elapsed": self.elapsed,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Interaction:
+        body = data["response"]["body"]
+        content = body["text"].encode() if "text" in body else base64.b64decode(body["base64"])
+        return cls(
+            data["request"]["method"],
+            data["request"]["uri"],
+            data["response"]["status"],
+            data["response"]["headers"],
+            content,
+            data["elapsed"],
+        )
+
+
+class Cassette:
+    """
+    The HTTP interactions of a run, either being recorded or replayed.
+
+    A replay takes latency_scale times the recorded time of each response,
+    so 0 replays as fast as possible and 1 as slowly as it was recorded.
+    """
+
+    def __init__(self, path: PathLike, mode: CassetteMode, latency_scale: float = 0.0) -> None:
+        self._path = Path(path)
+        self._mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._recorded: list[Interaction] = []
+        self.__pending: dict[tuple[str, str], list[Interaction]] | None = None
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def mode(self) -> CassetteMode:
+        return self._mode
+
+    def record(self, interaction: Interaction) -> None:
+        with self._lock:
+            self._recorded.append(interaction)
+
+    def play(self, method: str, uri: str) -> Interaction:
+        """
+        Gets the next recorded response of the request.
+
+        Raises:
+            CassetteError if there are no more recorded responses of the request.
+        """
+        with self._lock:
+            pending = self._pending.get((method, uri))
+            if not pending:
+                msg = f"There is no recorded response for {method} {uri} in {self._path}"
+                raise CassetteError(msg)
+            return pending.pop(0)
+
+    def delay(self, interaction: Interaction) -> float:
+        """Gets the number of seconds the replay of the interaction takes."""
+        return interaction.elapsed * self.latency_scale
+
+    def save(self) -> None:
+        """Writes the recorded interactions to the cassette file."""
+        with self._lock:
+            interactions = [i.to_dict() for i in self._recorded]
+        logger.info("Saving %d interactions to %s", len(interactions), self._path)
+        utils.write_text_atomic(self._path, json.dumps({"version": _VERSION, "interactions": interactions}, indent=1))
+
+    def http(self, http: httplib2.Http | None = None) -> CassetteHttp:
+        """Creates the httplib2.Http compatible transport which records the requests made through http."""
+        if self._mode == "record" and http is None:
+            msg = "Recording requires the transport to record"
+            raise ValueError(msg)
+        return CassetteHttp(self, http)
+
+    def http_factory(self, factory: Callable[[], httplib2.Http] | None = None) -> Callable[[], CassetteHttp]:
+        """Gets the http_factory of a Channel, which records the transports created by factory (or replays)."""
+
+        def create() -> CassetteHttp:
+            return self.http(factory() if self._mode == "record" and factory is not None else None)
+
+        return create
+
+    def session(self, session: Session | None = None) -> CassetteSession:
+        """Creates the curl_cffi AsyncSession compatible session which records the requests made through session."""
+        if self._mode == "record" and session is None:
+            msg = "Recording requires the session to record"
+            raise ValueError(msg)
+        return CassetteSession(self, session)
+
+    def session_factory(self, factory: Callable[[], Session] | None = None) -> Callable[[], CassetteSession]:
+        """Gets the session_factory of an AsyncChannel, which records the sessions created by factory (or replays)."""
+
+        def create() -> CassetteSession:
+            return self.session(factory() if self._mode == "record" and factory is not None else None)
+
+        return create
+
+    @property
+    def _pending(self) -> dict[tuple[str, str], list[Interaction]]:
+        if self.__pending is None:
+            self.__pending = {}
+            with contextlib.suppress(FileNotFoundError):
+                data = json.loads(self._path.read_text())
+                for item in data["interactions"]:
+                    interaction = Interaction.from_dict(item)
+                    self.__pending.setdefault((interaction.method, interaction.uri), []).append(interaction)
+        return self.__pending
+
+
+class CassetteHttp:
+    """An httplib2.Http compatible transport which records (or replays) the responses."""
+
+    def __init__(self, cassette: Cassette, http: httplib2.Http | None = None) -> None:
+        self.cassette = cassette
+        self.http = http
+
+    def request(  # noqa: PLR0913
+        self,
+        uri: str,
+        method: str = "GET",
+        body: bytes | str | None = None,
+        headers: dict[str, str] | None = None,
+        redirections: int = 5,
+        connection_type: Any = None,  # noqa: ANN401
+    ) -> tuple[httplib2.Response, bytes]:
+        import httplib2  # noqa: PLC0415
+
+        if self.http is None:
+            interaction = self.cassette.play(method, uri)
+            if (delay := self.cassette.delay(interaction)) > 0:
+                time.sleep(delay)
+            return httplib2.Response({"status": str(interaction.status), **interaction.headers}), interaction.content
+
+        start = time.perf_counter()
+        response, content = self.http.request(
+            uri, method=method, body=body, headers=headers, redirections=redirections, connection_type=connection_type
+        )
+        headers = {key: value for key, value in response.items() if _is_recorded_header(key)}
+        self.cassette.record(
+            Interaction(method, uri, response.status, headers, content or b"", time.perf_counter() - start)
+        )
+        return response, content
+
+    def close(self) -> None:
+        if self.http is not None:
+            self.http.close()
+
+    def __getattr__(self, name: str) -> Any:  # noqa: ANN401
+        # e.g. the credentials of an AuthorizedHttp
+        if self.http is None:
+            raise AttributeError(name)
+        return getattr(self.http, name)
+
+
+class CassetteSession:
+    """A curl_cffi AsyncSession compatible session which records (or replays) the responses."""
+
+    def __init__(self, cassette: Cassette, session: Session | None = None) -> None:
+        self.cassette = cassette
+        self.session = session
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> Response:  # noqa: ANN401
+        from curl_cffi.requests import Headers, Request, Response  # noqa: PLC0415
+
+        if self.session is None:
+            interaction = self.cassette.play(method, url)
+            if (delay := self.cassette.delay(interaction)) > 0:
+                await asyncio.sleep(delay)
+            response = Response(request=Request(url, Headers(kwargs.get("headers")), method))
+            response.url = url
+            response.status_code = interaction.status
+            response.reason = _get_reason(interaction.status)
+            response.ok = interaction.status < HTTPStatus.BAD_REQUEST
+            response.content = interaction.content
+            response.headers.update(interaction.headers)
+            return response
+
+        start = time.perf_counter()
+        response = await self.session.request(method, url, **kwargs)  # type: ignore[arg-type]
+        headers = {
+            key: value for key, value in response.headers.items() if value is not None and _is_recorded_header(key)
+        }
+        self.cassette.record(
+            Interaction(method, url, response.status_code, headers, response.content, time.perf_counter() - start)
+        )
+        return response
+
+    async def get(self, url: str, **kwargs: Any) -> Response:  # noqa: ANN401
+        return await self.request("GET", url, **kwargs)
+
+    async def head(self, url: str, **kwargs: Any) -> Response:  # noqa: ANN401
+        return await self.request("HEAD", url, **kwargs)
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+
+
+def _is_recorded_header(name: str) -> bool:
+    # httplib2 adds the headers it has processed prefixed with a dash
+    return not name.startswith("-") and name.lower() not in _SKIPPED_HEADERS
+
+
+def _get_reason(status: int) -> str:
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return ""
+
+
+_active: Cassette | None = None
+
+
+def install(cassette: Cassette) -> None:
+    """Makes the cassette the one the Channel and USCCB of the commands record to (or replay from)."""
+    global _active  # noqa: PLW0603
+    _active = cassette
+
+
+def uninstall() -> None:
+    global _active  # noqa: PLW0603
+    _active = None
+
+
+def get_active() -> Cassette | None:
+    return _active
@@ -6,6 +6,39 @@ import pytz
 
 MAX_RETRIES: Final[int] = 2
 
+RETRY_BACKOFF: Final[float] = 1.0  # the seconds the first retry waits at most, doubling with each retry
+MAX_RETRY_BACKOFF: Final[float] = 32.0
+MAX_RETRY_AFTER: Final[float] = 60.0  # a longer Retry-After is not waited for
+RETRY_BUDGET: Final[int] = 20  # the number of retries shared by the calls of a run
+CIRCUIT_BREAKER_THRESHOLD: Final[int] = 5  # the number of consecutive transient failures which open the circuit
+CIRCUIT_BREAKER_COOLDOWN: Final[datetime.timedelta] = datetime.timedelta(seconds=30)
+
+MAX_BATCH_SIZE: Final[int] = 50  # the maximum number of requests within a batch request
+
+YOUTUBE_API_URL: Final[str] = "https://youtube.googleapis.com/youtube/v3"
+YOUTUBE_UPLOAD_URL: Final[str] = "https://youtube.googleapis.com/upload/youtube/v3"
+
+CHANNEL_WORKERS: Final[int] = 1  # the number of concurrent YouTube calls
+
+TOKEN_REFRESH_MARGIN: Final[datetime.timedelta] = datetime.timedelta(minutes=5)  # refresh ahead of the expiry
+TOKEN_REFRESH_RETRY_DELAY: Final[datetime.timedelta] = datetime.timedelta(seconds=30)
+
+MAX_PAGE_SIZE: Final[int] = 50  # the maximum maxResults accepted by liveBroadcasts().list
+
+# Partial response masks for liveBroadcasts().list:
+# every field of a LiveStream, which the list commands output
+LIVE_STREAM_FIELDS: Final[str] = (
+    "etag,nextPageToken,"
+    "items(id,snippet(title,description,publishedAt,scheduledStartTime,scheduledEndTime,actualStartTime,"
+    "actualEndTime),status(lifeCycleStatus,privacyStatus))"
+)
+SCHEDULED_DATES_FIELDS: Final[str] = "etag,nextPageToken,items(id,snippet(scheduledStartTime),status(lifeCycleStatus))"
+VIDEO_CATEGORY_FIELDS: Final[str] = "items(id,snippet(categoryId))"
+RECONCILE_FIELDS: Final[str] = (
+    "etag,nextPageToken,"
+    "items(id,snippet(title,description,scheduledStartTime,scheduledEndTime),status(lifeCycleStatus,privacyStatus))"
+)
+
 MAX_FIELD_LEN: Final[int] = 25
 
 GCLOUD_DATE_FMT: Final[str] = "%Y-%m-%dT%H:%M:%SZ"
@@ -14,6 +47,41 @@ CREDENTIALS_FILE: Final[Path] = Path(Path.cwd(), "credentials.json").resolve()
 
 TOKEN_FILE: Final[Path] = Path(Path.cwd(), "token.json").resolve()
 
+SNAPSHOT_FILE_NAME: Final[str] = "broadcasts.json"  # stored next to the token file
+
+QUOTA_FILE_NAME: Final[str] = "quota.json"  # stored next to the token file
+QUOTA_TIMEZONE: Final[datetime.tzinfo] = pytz.timezone("America/Los_Angeles")  # the quota resets at midnight PT
+QUOTA_HISTORY_DAYS: Final[int] = 31  # the number of days of usage kept
+QUOTA_FLUSH_CALLS: Final[int] = 20  # the calls charged in memory before they are added to the file
+DAILY_QUOTA: Final[int] = 10_000  # the default daily quota of a project
+DEFAULT_QUOTA_COST: Final[int] = 1
+# the units charged per call of each API method (https://developers.google.com/youtube/v3/determine_quota_cost)
+QUOTA_COSTS: Final[dict[str, int]] = {
+    "youtube.channels.list": 1,
+    "youtube.liveBroadcasts.delete": 50,
+    "youtube.liveBroadcasts.insert": 50,
+    "youtube.liveBroadcasts.list": 1,
+    "youtube.liveBroadcasts.update": 50,
+    "youtube.thumbnails.set": 50,
+    "youtube.videos.list": 1,
+    "youtube.videos.update": 50,
+}
+
+THUMBNAILS_FILE_NAME: Final[str] = "thumbnails.json"  # stored next to the token file
+
+WATERMARK_FILE_NAME: Final[str] = "watermark.json"  # stored next to the token file
+# the size of each part of a resumable upload, which must be a multiple of 256 KiB
+THUMBNAIL_CHUNK_SIZE: Final[int] = 1024 * 1024
+
+MASS_CACHE_DIR_NAME: Final[str] = "readings"  # stored next to the token file
+MASS_CACHE_TTL: Final[datetime.timedelta] = datetime.timedelta(days=7)
+MASS_CACHE_MAX_ENTRIES: Final[int] = 512
+
+READINGS_CONCURRENCY: Final[int] = 4  # the number of mass readings queried at once
+READINGS_RATE_LIMIT: Final[float] = 5.0  # the number of requests per second to USCCB
+READINGS_MAX_RETRIES: Final[int] = 4
+READINGS_RETRY_BACKOFF: Final[float] = 0.5  # seconds
+
 DATE_FMT: Final[str] = "%Y-%m-%d"
 
 DATE_TIME_FMT: Final[str] = "%Y-%m-%d %H:%M"
@@ -30,3 +98,18 @@ LIVE_STREAMING_URL_FMT: Final[str] = "https://studio.youtube.com/video/{VIDEO_ID
 DEFAULT_TIMEZONE: Final[datetime.tzinfo] = pytz.timezone("America/New_York")
 
 MAX_DESCRIPTION_LENGTH: Final[int] = 5000  # the description maximum length
+
+METRICS_PREFIX: Final[str] = "stjoseph"
+# the upper bounds, in seconds, of the buckets of the latency histograms
+METRICS_BUCKETS: Final[tuple[float, ...]] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROFILE_PUBLISHING_PHASE: Final[str] = "publishing"
+# the phase of the run which each instrumented call belongs to (the writes to the channel are publishing)
+PROFILE_PHASES: Final[dict[str, str]] = {
+    "oauth2.create_credentials": "credentials",
+    "channel.build_resource": "resource",
+    "channel.get_page": "listing",
+    "usccb.get_mass": "readings",
+    "generators.generate_description": "rendering",
+    "channel.execute_batch": PROFILE_PUBLISHING_PHASE,
+}
@@ -0,0 +1,86 @@
+"""
+Writes the broadcasts being listed in a machine-readable format, as they are listed.
+
+The broadcasts are written one at a time, so that a listing of any size is written in bounded memory,
+and the listing stops being paged as soon as the limit, or the start of the period of a listing which is
+newest first, is reached.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import logging
+from typing import IO, TYPE_CHECKING, Literal
+
+from stjoseph.api import models
+
+if TYPE_CHECKING:
+    import datetime
+    from collections.abc import Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+ExportFormat = Literal["text", "jsonl", "csv", "ids0"]
+
+
+def select_streams(
+    streams: Iterable[models.LiveStream],
+    limit: int | None = None,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    newest_first: bool = False,
+) -> Iterator[models.LiveStream]:
+    """
+    Selects the streams scheduled within the period, up to the limit.
+
+    If the streams are newest first (e.g. the completed broadcasts), then they stop being iterated once one is
+    scheduled before since, otherwise (e.g. the upcoming broadcasts, whose order is not guaranteed) they are all
+    iterated.
+    """
+    if limit is not None and limit <= 0:
+        return
+    count = 0
+    for stream in streams:
+        scheduled_start = stream.scheduled_start
+        if since is not None and scheduled_start is not None and scheduled_start < since:
+            if not newest_first:
+                continue
+            logger.debug("Stopping at %s which is scheduled before %s", stream.id, since)
+            return
+        if until is not None and scheduled_start is not None and scheduled_start >= until:
+            continue
+        count += 1
+        yield stream
+        if count == limit:
+            # returning before the next stream is pulled, which could be on a page not listed yet
+            return
+
+
+def write_streams(streams: Iterable[models.LiveStream], file: IO[str], export_format: ExportFormat = "text") -> int:
+    """
+    Writes the streams to the file as they are iterated, returning how many were written.
+
+    Args:
+        streams (Iterable[LiveStream]): The streams to write.
+        file (IO[str]): The file to write to.
+        export_format (ExportFormat): text for the repr of each stream, jsonl for a JSON object per line,
+            csv for a header then a row per stream, ids0 for the ids terminated by NUL (e.g. for xargs -0).
+    """
+    writer = csv.DictWriter(file, models.LiveStream._fields) if export_format == "csv" else None
+    if writer is not None:
+        writer.writeheader()
+
+    count = 0
+    for stream in streams:
+        if export_format == "jsonl":
+            file.write(json.dumps(stream.to_dict()) + "\n")
+        elif writer is not None:
+            writer.writerow(stream.to_dict())
+        elif export_format == "ids0":
+            file.write(f"{stream.id}\0")
+        else:
+            file.write(f"{stream}\n")
+        count += 1
+    file.flush()
+    return count
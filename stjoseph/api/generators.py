@@ -4,7 +4,7 @@ from typing import Final
 import jinja2
 from catholic_mass_readings.models import Mass, SectionType
 
-from stjoseph.api import constants
+from stjoseph.api import constants, metrics
 
 DESCRIPTION: Final[str] = """
 Please consider giving this video a like, and subscribing to the channel. Thanks for watching, and see you all next week. Please share this video with family and friends.
@@ -27,6 +27,7 @@ def generate_description_christmas_pageant() -> str:
     return template.render()
 
 
+@metrics.instrumented("generators.generate_description")
 def generate_description(mass: Mass) -> str:
     environment = _create_jinja_envirionment()
     template = environment.from_string(DESCRIPTION)
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import bisect
+import contextlib
+import functools
+import inspect
+import json
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Literal, ParamSpec, Protocol, TypeVar, cast
+
+from stjoseph.api import constants, utils
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from os import PathLike
+
+    from tenacity import RetryCallState
+
+_P = ParamSpec("_P")
+_T = TypeVar("_T")
+
+Direction = Literal["sent", "received"]
+MetricsFormat = Literal["json", "prometheus"]
+
+
+class Hook(Protocol):
+    """Receives the measurements of the instrumented code."""
+
+    def on_timing(self, name: str, seconds: float, labels: dict[str, str]) -> None: ...
+
+    def on_retry(self, name: str, labels: dict[str, str]) -> None: ...
+
+    def on_bytes(self, name: str, direction: Direction, size: int, labels: dict[str, str]) -> None: ...
+
+
+_hooks: list[Hook] = []
+
+
+def add_hook(hook: Hook) -> None:
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Hook) -> None:
+    _hooks.remove(hook)
+
+
+def is_enabled() -> bool:
+    """Determines if there are any hooks, nothing is measured otherwise."""
+    return bool(_hooks)
+
+
+def record_timing(name: str, seconds: float, **labels: str) -> None:
+    for hook in _hooks:
+        hook.on_timing(name, seconds, labels)
+
+
+def record_retry(name: str, **labels: str) -> None:
+    for hook in _hooks:
+        hook.on_retry(name, labels)
+
+
+def record_bytes(name: str, direction: Direction, size: int, **labels: str) -> None:
+    for hook in _hooks:
+        hook.on_bytes(name, direction, size, labels)
+
+
+@contextlib.contextmanager
+def timed(name: str, **labels: str) -> Iterator[None]:
+    """Records how long the block takes."""
+    if not _hooks:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - start, **labels)
+
+
+def instrumented(name: str) -> Callable[[Callable[_P, _T]], Callable[_P, _T]]:
+    """Records how long each call of the (sync or async) function takes."""
+
+    def decorator(fn: Callable[_P, _T]) -> Callable[_P, _T]:
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args: _P.args, **kwargs: _P.kwargs) -> Any:  # noqa: ANN401
+                with timed(name):
+                    return await fn(*args, **kwargs)
+
+            return cast("Callable[_P, _T]", async_wrapper)
+
+        @functools.wraps(fn)
+        def wrapper(*args: _P.args, **kwargs: _P.kwargs) -> _T:
+            with timed(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def retry_hook(name: str) -> Callable[[RetryCallState], None]:
+    """Gets the tenacity before_sleep callback which records each retry."""
+
+    def before_sleep(retry_state: RetryCallState) -> None:
+        exception = retry_state.outcome.exception() if retry_state.outcome is not None else None
+        record_retry(name, exception=type(exception).__name__ if exception is not None else "")
+
+    return before_sleep
+
+
+class Histogram:
+    """A histogram of the values observed in cumulative buckets, as in Prometheus."""
+
+    def __init__(self, buckets: tuple[float, ...] = constants.METRICS_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Gets the upper bound of the bucket containing the q quantile."""
+        rank = q * self.count
+        cumulative = 0
+        for bucket, count in zip(self.buckets, self.counts, strict=False):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bucket, self.max)
+        return self.max
+
+    def cumulative_counts(self) -> list[int]:
+        counts, cumulative = [], 0
+        for count in self.counts:
+            cumulative += count
+            counts.append(cumulative)
+        return counts
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": self.max,
+        }
+
+
+_Key = tuple[str, tuple[tuple[str, str], ...]]
+
+
+class MetricsRecorder:
+    """A Hook which aggregates the measurements in memory, to be exported as JSON or a Prometheus textfile."""
+
+    def __init__(self, buckets: tuple[float, ...] = constants.METRICS_BUCKETS) -> None:
+        self._buckets = buckets
+        self._timings: dict[_Key, Histogram] = {}
+        self._retries: dict[_Key, int] = {}
+        self._bytes: dict[_Key, int] = {}
+        self._lock = threading.Lock()
+
+    def on_timing(self, name: str, seconds: float, labels: dict[str, str]) -> None:
+        with self._lock:
+            key = _key(name, labels)
+            histogram = self._timings.get(key)
+            if histogram is None:
+                histogram = self._timings[key] = Histogram(self._buckets)
+            histogram.observe(seconds)
+
+    def on_retry(self, name: str, labels: dict[str, str]) -> None:
+        with self._lock:
+            key = _key(name, labels)
+            self._retries[key] = self._retries.get(key, 0) + 1
+
+    def on_bytes(self, name: str, direction: Direction, size: int, labels: dict[str, str]) -> None:
+        with self._lock:
+            key = _key(name, {**labels, "direction": direction})
+            self._bytes[key] = self._bytes.get(key, 0) + size
+
+    def to_json(self) -> dict[str, Any]:
+        """Gets the summary of the latencies (in seconds), the retries and the bytes transferred."""
+        with self._lock:
+            return {
+                "timings": [{"name": n, "labels": dict(ls), **h.to_dict()} for (n, ls), h in self._timings.items()],
+                "retries": [{"name": n, "labels": dict(ls), "count": c} for (n, ls), c in self._retries.items()],
+                "bytes": [{"name": n, "labels": dict(ls), "total": b} for (n, ls), b in self._bytes.items()],
+            }
+
+    def to_prometheus(self, prefix: str = constants.METRICS_PREFIX) -> str:
+        """Gets the metrics in the Prometheus text exposition format, e.g. for the node exporter textfile collector."""
+        lines: list[str] = []
+        with self._lock:
+            lines += [
+                f"# HELP {prefix}_duration_seconds The latency of the instrumented calls.",
+                f"# TYPE {prefix}_duration_seconds histogram",
+            ]
+            for (name, labels), histogram in self._timings.items():
+                bounds = [*map(str, histogram.buckets), "+Inf"]
+                for bound, count in zip(bounds, histogram.cumulative_counts(), strict=True):
+                    lines.append(f"{prefix}_duration_seconds_bucket{_labels(name, labels, le=bound)} {count}")
+                lines.append(f"{prefix}_duration_seconds_sum{_labels(name, labels)} {histogram.sum}")
+                lines.append(f"{prefix}_duration_seconds_count{_labels(name, labels)} {histogram.count}")
+
+            lines += [
+                f"# HELP {prefix}_retries_total The retries of the instrumented calls.",
+                f"# TYPE {prefix}_retries_total counter",
+            ]
+            lines += [f"{prefix}_retries_total{_labels(n, ls)} {c}" for (n, ls), c in self._retries.items()]
+
+            lines += [
+                f"# HELP {prefix}_bytes_total The bytes transferred by the instrumented calls.",
+                f"# TYPE {prefix}_bytes_total counter",
+            ]
+            lines += [f"{prefix}_bytes_total{_labels(n, ls)} {b}" for (n, ls), b in self._bytes.items()]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: PathLike, metrics_format: MetricsFormat = "json") -> None:
+        """Writes the metrics atomically, so that a scraper never reads a partial file."""
+        data = self.to_prometheus() if metrics_format == "prometheus" else json.dumps(self.to_json(), indent=2) + "\n"
+        utils.write_text_atomic(Path(path), data)
+
+
+def _key(name: str, labels: dict[str, str]) -> _Key:
+    return name, tuple(sorted(labels.items()))
+
+
+def _labels(name: str, labels: tuple[tuple[str, str], ...], **extra: str) -> str:
+    pairs = [("name", name), *labels, *extra.items()]
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
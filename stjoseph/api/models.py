@@ -2,12 +2,13 @@ from __future__ import annotations
 
 import datetime
 from enum import Enum, IntEnum, unique
-from typing import NamedTuple
-
-from catholic_mass_readings import USCCB
+from typing import TYPE_CHECKING, NamedTuple
 
 from stjoseph.api import constants, utils
 
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
 
 class LiveStream(NamedTuple):
     id: str
@@ -17,6 +18,9 @@ class LiveStream(NamedTuple):
     scheduled_start: datetime.datetime | None
     actual_start: datetime.datetime | None
     actual_end: datetime.datetime | None
+    status: BroadcastStatus | None = None
+    scheduled_end: datetime.datetime | None = None
+    privacy_status: str | None = None
 
     def __repr__(self) -> str:
         description = utils.truncate(self.description, constants.MAX_FIELD_LEN)
@@ -31,13 +35,17 @@ class LiveStream(NamedTuple):
     def __str__(self) -> str:
         return repr(self)
 
+    def to_dict(self) -> dict[str, str | None]:
+        """Gets the fields as strings (the datetimes in ISO 8601), e.g. to export as JSON or CSV."""
+        return {name: _to_str(value) for name, value in zip(self._fields, self, strict=True)}
+
     @property
     def duration(self) -> datetime.timedelta | None:
         """Gets the actual duration of the mass"""
         return self.actual_end - self.actual_start if self.actual_start and self.actual_end else None
 
     def is_eligible_for_deletion(self) -> bool:
-        if self.scheduled_start and self.scheduled_start.date() >= USCCB.today():
+        if self.scheduled_start and self.scheduled_start.date() >= utils.today():
             return False  # starting in the future.
 
         return (
@@ -47,6 +55,14 @@ class LiveStream(NamedTuple):
         )
 
 
+def _to_str(value: object) -> str | None:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return str(value.value)
+    return None if value is None else str(value)
+
+
 @unique
 class Weekday(IntEnum):
     MONDAY = 0
@@ -65,6 +81,100 @@ class BroadcastStatus(str, Enum):
     COMPLETED = "completed"
     UPCOMING = "upcoming"
 
+    @classmethod
+    def from_life_cycle_status(cls, life_cycle_status: str | None) -> BroadcastStatus | None:
+        """Maps the liveBroadcast status.lifeCycleStatus onto the BroadcastStatus used to list it."""
+        if life_cycle_status in ("created", "ready"):
+            return cls.UPCOMING
+        if life_cycle_status in ("testStarting", "testing", "liveStarting", "live"):
+            return cls.ACTIVE
+        if life_cycle_status == "complete":
+            return cls.COMPLETED
+        return None
+
+
+class BroadcastIndex:
+    """An in-memory index of the broadcasts returned from a single listing of the channel."""
+
+    def __init__(self, streams: Iterable[LiveStream], broadcast_status: BroadcastStatus = BroadcastStatus.ALL) -> None:
+        self._broadcast_status = broadcast_status
+        self._streams: list[LiveStream] = []
+        self._by_id: dict[str, LiveStream] = {}
+        self._by_scheduled_start: dict[datetime.datetime, list[LiveStream]] = {}
+        self._by_status: dict[BroadcastStatus, list[LiveStream]] = {}
+        for stream in streams:
+            self.add(stream)
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def __iter__(self) -> Iterator[LiveStream]:
+        return iter(self._streams)
+
+    def __contains__(self, broadcast_id: object) -> bool:
+        return broadcast_id in self._by_id
+
+    @property
+    def broadcast_status(self) -> BroadcastStatus:
+        """Gets the BroadcastStatus the index was listed with."""
+        return self._broadcast_status
+
+    def add(self, stream: LiveStream) -> None:
+        self._streams.append(stream)
+        self._by_id[stream.id] = stream
+        if stream.scheduled_start is not None:
+            self._by_scheduled_start.setdefault(stream.scheduled_start, []).append(stream)
+        status = self._broadcast_status if self._broadcast_status != BroadcastStatus.ALL else stream.status
+        if status is not None:
+            self._by_status.setdefault(status, []).append(stream)
+
+    def get(self, broadcast_id: str) -> LiveStream | None:
+        """Gets the broadcast by its id."""
+        return self._by_id.get(broadcast_id)
+
+    def with_status(self, broadcast_status: BroadcastStatus) -> list[LiveStream]:
+        """Gets the broadcasts with the BroadcastStatus."""
+        if broadcast_status == BroadcastStatus.ALL:
+            return list(self._streams)
+        if self._broadcast_status not in (BroadcastStatus.ALL, broadcast_status):
+            msg = f"The index only contains {self._broadcast_status.value} broadcasts, not {broadcast_status.value}"
+            raise ValueError(msg)
+        return list(self._by_status.get(broadcast_status, []))
+
+    def scheduled_at(
+        self, scheduled_start: datetime.datetime, broadcast_status: BroadcastStatus = BroadcastStatus.ALL
+    ) -> list[LiveStream]:
+        """Gets the broadcasts scheduled to start at scheduled_start."""
+        streams = self._by_scheduled_start.get(scheduled_start, [])
+        return [s for s in streams if self._has_status(s, broadcast_status)]
+
+    def get_scheduled_dates(
+        self, broadcast_status: BroadcastStatus = BroadcastStatus.UPCOMING
+    ) -> dict[datetime.datetime, str]:
+        """Gets a map of the scheduled start to the id of the last broadcast listed at that time."""
+        results: dict[datetime.datetime, str] = {}
+        for scheduled_start in self._by_scheduled_start:
+            streams = self.scheduled_at(scheduled_start, broadcast_status)
+            if streams:
+                results[scheduled_start] = streams[-1].id
+        return results
+
+    def get_duplicated_schedules_dates(
+        self, broadcast_status: BroadcastStatus = BroadcastStatus.UPCOMING
+    ) -> dict[datetime.datetime, list[str]]:
+        """Gets a map of the scheduled start to the ids of all the broadcasts sharing it."""
+        results: dict[datetime.datetime, list[str]] = {}
+        for scheduled_start in self._by_scheduled_start:
+            streams = self.scheduled_at(scheduled_start, broadcast_status)
+            if len(streams) > 1:
+                results[scheduled_start] = [s.id for s in streams]
+        return results
+
+    def _has_status(self, stream: LiveStream, broadcast_status: BroadcastStatus) -> bool:
+        if broadcast_status in (BroadcastStatus.ALL, self._broadcast_status):
+            return True
+        return stream.status == broadcast_status
+
 
 @unique
 class BroadcastType(str, Enum):
@@ -1,3 +1,3 @@
-from stjoseph.api.oauth2.credentials import CredentialsManager
+from stjoseph.api.oauth2.credentials import CredentialsManager, TokenRefresher
 
-__all__ = ["CredentialsManager"]
+__all__ = ["CredentialsManager", "TokenRefresher"]
@@ -1,9 +1,10 @@
 import contextlib
+import datetime
+import json
 import logging
-from functools import wraps
+import threading
 from os import PathLike
 from pathlib import Path
-from typing import TYPE_CHECKING, Final
 
 from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request
@@ -11,10 +12,8 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 
-from stjoseph.api import constants
-
-if TYPE_CHECKING:
-    from collections.abc import Callable
+from stjoseph.api import constants, metrics
+from stjoseph.api.oauth2.store import TokenStore
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +23,37 @@ def _is_refresh_exception(e: BaseException) -> bool:
     return isinstance(e, RefreshError)
 
 
+def _utcnow() -> datetime.datetime:
+    # google-auth keeps the expiry as a naive UTC datetime
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+class _StoredCredentials(Credentials):
+    """Credentials which are refreshed through the CredentialsManager of their token."""
+
+    manager: "CredentialsManager | None" = None
+
+    def refresh(self, request: Request) -> None:
+        if self.manager is None:
+            super().refresh(request)
+        else:
+            self.manager.refresh_credentials(self, request)
+
+
 class CredentialsManager:
+    """
+    Creates the credentials of the token file, which can be shared by concurrent processes.
+
+    The credentials are cached by scopes, and refreshed while holding the lock of the token file,
+    so a refresh made by another thread or process is used rather than made again.
+    """
+
     def __init__(self, creds_file: PathLike, token_file: PathLike) -> None:
         self._creds_file = Path(creds_file)
-        self._token_file = Path(token_file)
-        self.__token_file_ctime = self._token_file.stat().st_ctime if self._token_file.exists() else None
+        self._store = TokenStore(token_file)
+        self._lock = threading.Lock()
+        self._cache: dict[frozenset[str], Credentials] = {}
+        self.__token_file_mtime = self._store.get_mtime()
 
     @property
     def creds_file(self) -> Path:
@@ -36,63 +61,171 @@ class CredentialsManager:
 
     @property
     def token_file(self) -> Path:
-        return self._token_file
+        return self._store.path
 
     def write_token(self, data: str) -> None:
-        self._token_file.write_text(data)
+        with self._store.lock():
+            self._store.write(data)
+            self.__token_file_mtime = self._store.get_mtime()
 
     def invalidate_token(self) -> bool:
-        """Invalidates the token"""
-        if self._token_file.exists():
-            logger.info("Removing %s", self._token_file)
-            self._token_file.unlink()
+        """
+        Invalidates the token, so the credentials are refreshed when next created.
+
+        The access token is expired rather than the token removed, keeping the refresh token, and a token
+        another process has written since it was last read is kept as is.
+        """
+        with self._lock:
+            self._cache.clear()
+
+        with self._store.lock():
+            if self.is_token_changed():
+                logger.info("Keeping %s which has changed", self.token_file)
+                return False
+            if (data := self._store.read()) is None:
+                return False
+
+            try:
+                info = json.loads(data)
+            except ValueError:
+                return self._store.remove()
+
+            logger.info("Expiring %s", self.token_file)
+            info.pop("expiry", None)  # a token without an expiry is expired when loaded
+            self.write_token(json.dumps(info))
             return True
-        return False
 
     def is_token_changed(self) -> bool:
-        """Determines if the token has changed."""
-        token_file_ctime = self._token_file.stat().st_ctime if self._token_file.exists() else None
-        return token_file_ctime != self.__token_file_ctime
+        """Determines if the token has changed since it was last read or written."""
+        return self._store.get_mtime() != self.__token_file_mtime
 
+    @metrics.instrumented("oauth2.create_credentials")
     @retry(
         retry=retry_if_exception(_is_refresh_exception),
         wait=wait_exponential(),
         stop=stop_after_attempt(constants.MAX_RETRIES),
+        before_sleep=metrics.retry_hook("oauth2.create_credentials"),
     )
     def create_oauth_credentials(self, scopes: list[str]) -> Credentials:
         """Creates an instance of OAuth 2.0 Credentials"""
-        creds = None
-        if self._token_file.exists():
-            with contextlib.suppress(ValueError):
-                logger.info("Authenticating %s", self._token_file)
-                creds = self._wrap_creds(Credentials.from_authorized_user_file(str(self._token_file), scopes))
-
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                logger.info("Refreshing credentials")
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(str(self._creds_file), scopes)
-                creds = self._wrap_creds(flow.run_local_server(port=0), save=True)
-
+        key = frozenset(scopes)
+        with self._lock:
+            creds = self._cache.get(key)
+        if creds is not None and creds.valid:
+            return creds
+
+        with self._store.lock():
+            creds = self._load_credentials(scopes)
+            if not creds or not creds.valid:
+                if creds and creds.expired and creds.refresh_token:
+                    creds.refresh(Request())
+                else:
+                    flow = InstalledAppFlow.from_client_secrets_file(str(self._creds_file), scopes)
+                    creds = self._wrap_creds(json.loads(flow.run_local_server(port=0).to_json()), scopes)
+                    self.write_token(creds.to_json())
+
+        with self._lock:
+            self._cache[key] = creds
         return creds
 
-    def _wrap_creds(self, creds: Credentials, save: bool = False) -> Credentials:
-        refresh_orig: Final[Callable[[Request], None]] = creds.refresh
-
-        def save_token() -> None:
-            logger.info("Saving token to %s", self._token_file)
+    def refresh_credentials(self, creds: Credentials, request: Request) -> None:
+        """
+        Refreshes the credentials, unless another thread or process has refreshed their token meanwhile.
+
+        Raises:
+            RefreshError if the credentials failed to be refreshed, removing the token unless it may succeed later.
+        """
+        stale_token = creds.token
+        with self._store.lock():
+            if creds.token != stale_token:
+                logger.debug("Credentials already refreshed")
+                return
+
+            latest = self._load_credentials(creds.scopes)
+            if latest is not None and latest.valid and latest.token != stale_token:
+                logger.info("Using the token refreshed in %s", self.token_file)
+                creds.token = latest.token
+                creds.expiry = latest.expiry
+                return
+
+            logger.info("Refreshing credentials")
+            try:
+                Credentials.refresh(creds, request)
+            except RefreshError as e:
+                if not e.retryable:
+                    self._store.remove()
+                raise
             self.write_token(creds.to_json())
 
-        @wraps(creds.refresh)
-        def refresh(request: Request) -> None:
-            self.invalidate_token()
-            refresh_orig(request)
-            save_token()
-
-        creds.refresh = refresh
+    def is_expiring(self, creds: Credentials, margin: datetime.timedelta = constants.TOKEN_REFRESH_MARGIN) -> bool:
+        """Determines if the credentials are invalid, or expire within the margin."""
+        return not creds.valid or (creds.expiry is not None and creds.expiry - margin <= _utcnow())
+
+    def refresh_if_expiring(
+        self, creds: Credentials, margin: datetime.timedelta = constants.TOKEN_REFRESH_MARGIN
+    ) -> bool:
+        """Refreshes the credentials ahead of use if they expire within the margin, returning if they were."""
+        if not self.is_expiring(creds, margin):
+            return False
+        creds.refresh(Request())
+        return True
+
+    def start_refresher(
+        self, creds: Credentials, margin: datetime.timedelta = constants.TOKEN_REFRESH_MARGIN
+    ) -> "TokenRefresher":
+        """Starts refreshing the credentials in the background, margin before they expire."""
+        refresher = TokenRefresher(self, creds, margin)
+        refresher.start()
+        return refresher
+
+    def _load_credentials(self, scopes: list[str] | None) -> Credentials | None:
+        data = self._store.read()
+        self.__token_file_mtime = self._store.get_mtime()
+        if data is None:
+            return None
+
+        with contextlib.suppress(ValueError):
+            logger.info("Authenticating %s", self.token_file)
+            return self._wrap_creds(json.loads(data), scopes)
+        return None
+
+    def _wrap_creds(self, info: dict[str, str], scopes: list[str] | None) -> Credentials:
+        creds = _StoredCredentials.from_authorized_user_info(info, scopes)
+        creds.manager = self
+        return creds
 
-        if save:
-            save_token()
 
-        return creds
+class TokenRefresher:
+    """Refreshes the credentials in a background thread, margin before they expire, for long-running processes."""
+
+    def __init__(self, manager: CredentialsManager, creds: Credentials, margin: datetime.timedelta) -> None:
+        self._manager = manager
+        self._creds = creds
+        self._margin = margin
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="token-refresher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _get_delay(self) -> float | None:
+        """Gets the seconds until the credentials are to be refreshed, or None if they do not expire."""
+        if self._creds.expiry is None:
+            return None
+        return max((self._creds.expiry - self._margin - _utcnow()).total_seconds(), 0.0)
+
+    def _run(self) -> None:
+        delay = self._get_delay()
+        while not self._stopped.wait(delay):
+            try:
+                self._manager.refresh_if_expiring(self._creds, self._margin)
+            except RefreshError:
+                logger.warning("Failed to refresh the credentials in the background", exc_info=True)
+                delay = constants.TOKEN_REFRESH_RETRY_DELAY.total_seconds()
+            else:
+                delay = self._get_delay()
@@ -0,0 +1,69 @@
+"""
+The token file, shared by the processes (e.g. concurrent cron jobs) using the same token.
+
+The token is only read, written or removed while holding an exclusive lock on a file next to it, and written
+to a temporary file which replaces it, so no process ever reads a partial token or removes one another process
+has just refreshed.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from stjoseph.api import utils
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from os import PathLike
+
+logger = logging.getLogger(__name__)
+
+
+class TokenStore:
+    """The token file, locked against the other threads and processes using it."""
+
+    def __init__(self, path: PathLike) -> None:
+        self._path = Path(path)
+        self._file_lock = utils.FileLock(self._path.with_name(f".{self._path.name}.lock"))
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @contextlib.contextmanager
+    def lock(self) -> Iterator[None]:
+        """Holds the exclusive lock of the token (which is reentrant within a thread)."""
+        with self._file_lock.hold():
+            yield
+
+    def read(self) -> str | None:
+        """Reads the token, or None if there is none."""
+        try:
+            return self._path.read_text()
+        except FileNotFoundError:
+            return None
+
+    def write(self, data: str) -> None:
+        with self.lock():
+            logger.info("Saving token to %s", self._path)
+            utils.write_text_atomic(self._path, data)
+
+    def remove(self) -> bool:
+        """Removes the token, returning whether there was one."""
+        with self.lock():
+            try:
+                self._path.unlink()
+            except FileNotFoundError:
+                return False
+            logger.info("Removed %s", self._path)
+            return True
+
+    def get_mtime(self) -> int | None:
+        """Gets the time the token was last written, in nanoseconds, or None if there is none."""
+        try:
+            return self._path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import cProfile
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from stjoseph.api import constants, metrics
+
+if TYPE_CHECKING:
+    from os import PathLike
+
+
+def get_phase(name: str, labels: dict[str, str]) -> str | None:
+    """Gets the phase of the run which the timing of the instrumented call belongs to, if any."""
+    if name == "channel.execute":
+        # the listing calls are timed per page, the others are the writes to the channel:
+        return None if labels.get("method", "").endswith(".list") else constants.PROFILE_PUBLISHING_PHASE
+    return constants.PROFILE_PHASES.get(name)
+
+
+def merge_intervals(intervals: list[tuple[float, float]]) -> float:
+    """Gets the time covered by the (possibly overlapping) intervals, so that concurrent calls are counted once."""
+    total = 0.0
+    end = float("-inf")
+    for interval_start, interval_end in sorted(intervals):
+        start = max(interval_start, end)
+        if interval_end > start:
+            total += interval_end - start
+        end = max(end, interval_end)
+    return total
+
+
+class PhaseTimer:
+    """A metrics Hook which breaks down the wall-clock time of the run by phase."""
+
+    def __init__(self) -> None:
+        self._intervals: dict[str, list[tuple[float, float]]] = {}
+        self._lock = threading.Lock()
+
+    def on_timing(self, name: str, seconds: float, labels: dict[str, str]) -> None:
+        phase = get_phase(name, labels)
+        if phase is None:
+            return
+        end = time.perf_counter()
+        with self._lock:
+            self._intervals.setdefault(phase, []).append((end - seconds, end))
+
+    def on_retry(self, name: str, labels: dict[str, str]) -> None:
+        pass
+
+    def on_bytes(self, name: str, direction: metrics.Direction, size: int, labels: dict[str, str]) -> None:
+        pass
+
+    def calls(self, phase: str) -> int:
+        with self._lock:
+            return len(self._intervals.get(phase, []))
+
+    def wall_time(self, phase: str | None = None) -> float:
+        """Gets the wall-clock time spent in the phase (or in any of the phases)."""
+        with self._lock:
+            if phase is not None:
+                return merge_intervals(self._intervals.get(phase, []))
+            return merge_intervals([i for intervals in self._intervals.values() for i in intervals])
+
+    def format(self, elapsed: float) -> str:
+        """
+        Formats the breakdown of the elapsed wall-clock time of the run.
+
+        The phases can nest (e.g. the resource is built within the first listing), so the shares may add up to over
+        100%.
+        """
+        rows = [(p, self.calls(p), self.wall_time(p)) for p in dict.fromkeys(constants.PROFILE_PHASES.values())]
+        rows.append(("other", 0, max(elapsed - self.wall_time(), 0.0)))
+        lines = [f"{'phase':<12} {'calls':>6} {'seconds':>9} {'share':>6}"]
+        for phase, calls, seconds in rows:
+            share = seconds / elapsed if elapsed else 0.0
+            lines.append(f"{phase:<12} {calls:>6} {seconds:>9.3f} {share:>6.1%}")
+        lines.append(f"{'total':<12} {'':>6} {elapsed:>9.3f}")
+        return "\n".join(lines)
+
+
+class Profiler:
+    """
+    Runs cProfile over the calling thread and times the phases of the run.
+
+    cProfile only covers the thread which started it, the calls made by the worker threads (e.g. publishing)
+    show up in the phase breakdown but not in the pstats file.
+    """
+
+    def __init__(self, path: PathLike) -> None:
+        self._path = Path(path)
+        self._profile = cProfile.Profile()
+        self._phases = PhaseTimer()
+        self._start = 0.0
+        self._elapsed = 0.0
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def phases(self) -> PhaseTimer:
+        return self._phases
+
+    @property
+    def elapsed(self) -> float:
+        return self._elapsed
+
+    def start(self) -> None:
+        metrics.add_hook(self._phases)
+        self._start = time.perf_counter()
+        self._profile.enable()
+
+    def stop(self) -> None:
+        """Stops profiling and writes the pstats file."""
+        self._profile.disable()
+        self._elapsed = time.perf_counter() - self._start
+        metrics.remove_hook(self._phases)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._profile.dump_stats(self._path)
+
+    def format(self) -> str:
+        return self._phases.format(self._elapsed)
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import contextlib
+import datetime
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from stjoseph.api import constants, utils
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from os import PathLike
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceededError(Exception):
+    """Raised instead of making a call which would take the usage of the day over the budget."""
+
+
+class MethodUsage(NamedTuple):
+    calls: int
+    units: int
+
+
+def get_cost(method_id: str) -> int:
+    """Gets the quota cost of a call to the API method, e.g. youtube.liveBroadcasts.insert."""
+    return constants.QUOTA_COSTS.get(method_id, constants.DEFAULT_QUOTA_COST)
+
+
+def quota_day(now: datetime.datetime | None = None) -> datetime.date:
+    """Gets the day the quota is counted against, which resets at midnight Pacific Time."""
+    if now is None:
+        now = datetime.datetime.now(tz=datetime.UTC)
+    return now.astimezone(constants.QUOTA_TIMEZONE).date()
+
+
+class QuotaLedger:
+    """
+    A persisted running total of the quota units used per day, by API method.
+
+    The file is shared by the processes using the same token (e.g. concurrent cron jobs), so the calls charged
+    are kept in memory and added to it, re-read under an exclusive lock, every flush_every calls and on flush().
+    If a budget is set, then a call which would take the total of the day over it is refused.
+    """
+
+    def __init__(
+        self, path: PathLike, budget: int | None = None, flush_every: int = constants.QUOTA_FLUSH_CALLS
+    ) -> None:
+        self._path = Path(path)
+        self._budget = budget
+        self._flush_every = flush_every
+        self._file_lock = utils.FileLock(self._path.with_name(f".{self._path.name}.lock"))
+        self._saved: dict[str, dict[str, dict[str, int]]] = {}
+        self._saved_mtime: int | None = None
+        self._unsaved: dict[str, dict[str, dict[str, int]]] = {}
+        self._unsaved_calls = 0
+        self._lock = threading.RLock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def budget(self) -> int | None:
+        """Gets the maximum number of units used in a day, if any."""
+        return self._budget
+
+    def days(self) -> list[datetime.date]:
+        """Gets the days with any usage, the most recent first."""
+        with self._lock:
+            self._refresh()
+            return sorted(map(datetime.date.fromisoformat, {*self._saved, *self._unsaved}), reverse=True)
+
+    def usage(self, day: datetime.date | None = None) -> dict[str, MethodUsage]:
+        """Gets the usage of each API method on the day (today by default), including the calls not yet saved."""
+        key = (day or quota_day()).isoformat()
+        with self._lock:
+            self._refresh()
+            methods: dict[str, dict[str, int]] = {}
+            _add(methods, self._saved.get(key, {}))
+            _add(methods, self._unsaved.get(key, {}))
+        return {method_id: MethodUsage(u["calls"], u["units"]) for method_id, u in methods.items()}
+
+    def used(self, day: datetime.date | None = None) -> int:
+        """Gets the units used on the day (today by default)."""
+        return sum(u.units for u in self.usage(day).values())
+
+    def remaining(self) -> int | None:
+        """Gets the units left in the budget today, None if there is no budget."""
+        return None if self._budget is None else max(self._budget - self.used(), 0)
+
+    def ensure_available(self, method_ids: Iterable[str]) -> None:
+        """
+        Checks that the calls to the API methods would all fit in the budget of today, without charging them.
+
+        Raises:
+            QuotaExceededError: if the calls would take the usage of today over the budget.
+        """
+        method_ids = list(method_ids)
+        cost = sum(map(get_cost, method_ids))
+        with self._lock:
+            used = self.used()
+            if self._budget is not None and used + cost > self._budget:
+                msg = (
+                    f"{', '.join(sorted(set(method_ids)))} cost {cost} units, "
+                    f"{used} of the budget of {self._budget} units are used today"
+                )
+                raise QuotaExceededError(msg)
+
+    def charge(self, method_id: str) -> int:
+        """
+        Records a call to the API method before it is made.
+
+        Returns:
+            int of the cost of the call.
+
+        Raises:
+            QuotaExceededError: if the call would take the usage of today over the budget.
+        """
+        cost = get_cost(method_id)
+        day = quota_day()
+        with self._lock:
+            used = self.used(day)
+            if self._budget is not None and used + cost > self._budget:
+                msg = f"{method_id} costs {cost} units, {used} of the budget of {self._budget} units are used today"
+                raise QuotaExceededError(msg)
+
+            _add(self._unsaved.setdefault(day.isoformat(), {}), {method_id: {"calls": 1, "units": cost}})
+            self._unsaved_calls += 1
+            if self._unsaved_calls >= self._flush_every:
+                self.flush()
+        return cost
+
+    def flush(self) -> None:
+        """Adds the calls charged since the last flush to the file, merged with what the other processes saved."""
+        with self._lock:
+            if not self._unsaved:
+                return
+
+            with self._file_lock.hold():
+                self._saved_mtime = None
+                self._refresh()
+                for day, methods in self._unsaved.items():
+                    _add(self._saved.setdefault(day, {}), methods)
+                self._prune(quota_day())
+                logger.debug("Saving the quota usage to %s", self._path)
+                utils.write_text_atomic(self._path, json.dumps({"days": self._saved}))
+                self._saved_mtime = self._get_mtime()
+            self._unsaved.clear()
+            self._unsaved_calls = 0
+
+    def _prune(self, today: datetime.date) -> None:
+        oldest = today - datetime.timedelta(days=constants.QUOTA_HISTORY_DAYS)
+        for day in [d for d in self._saved if datetime.date.fromisoformat(d) < oldest]:
+            del self._saved[day]
+
+    def _refresh(self) -> None:
+        """Re-reads the file once another process (or a flush) has replaced it."""
+        mtime = self._get_mtime()
+        if mtime is None or mtime == self._saved_mtime:
+            return
+
+        self._saved = {}
+        with contextlib.suppress(ValueError, KeyError, FileNotFoundError):
+            self._saved = json.loads(self._path.read_text())["days"]
+        self._saved_mtime = mtime
+
+    def _get_mtime(self) -> int | None:
+        try:
+            return self._path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
+def _add(methods: dict[str, dict[str, int]], other: dict[str, dict[str, int]]) -> None:
+    """Adds the calls and units of each API method of other to methods."""
+    for method_id, usage in other.items():
+        total = methods.setdefault(method_id, {"calls": 0, "units": 0})
+        total["calls"] += usage["calls"]
+        total["units"] += usage["units"]
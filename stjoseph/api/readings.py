@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import datetime
+import json
+import logging
+import time
+from http import HTTPStatus
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
+
+from catholic_mass_readings import USCCB
+from catholic_mass_readings.models import Mass, MassType, Reading, Section, SectionType, Verse
+from curl_cffi.requests.exceptions import RequestException
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+
+from stjoseph.api import cassette, constants, metrics, utils
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Iterable, Iterator
+    from os import PathLike
+
+    from curl_cffi.requests import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+
+def create_usccb() -> USCCB:
+    """Creates the USCCB client, which records to (or replays from) the installed cassette, if any."""
+    active = cassette.get_active()
+    return USCCB() if active is None else _CassetteUSCCB(active)
+
+
+class _CassetteUSCCB(USCCB):
+    def __init__(self, active: cassette.Cassette) -> None:
+        super().__init__()
+        self._cassette = active
+
+    def _create_session(self) -> AsyncSession:
+        session = super()._create_session() if self._cassette.mode == "record" else None
+        return cast("AsyncSession", self._cassette.session(session))
+
+
+class MassCache:
+    """
+    A disk cache of the parsed Mass readings keyed by the mass date and the mass types.
+
+    Entries older than the ttl are ignored and the least recently written entries
+    are evicted once there are more than max_entries.
+    """
+
+    def __init__(
+        self,
+        path: PathLike,
+        ttl: datetime.timedelta = constants.MASS_CACHE_TTL,
+        max_entries: int = constants.MASS_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self._path = Path(path)
+        self._ttl = ttl
+        self._max_entries = max_entries
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def get(self, date: datetime.date, types: list[MassType] | None) -> Mass | None:
+        """Gets the cached Mass, or None if it is not cached or has expired."""
+        entry = self._get_entry_path(date, types)
+        if not entry.exists():
+            return None
+
+        if time.time() - entry.stat().st_mtime > self._ttl.total_seconds():
+            logger.debug("Expiring %s", entry)
+            entry.unlink(missing_ok=True)
+            return None
+
+        try:
+            return _mass_from_dict(json.loads(entry.read_text()))
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Removing unreadable cache entry %s", entry, exc_info=True)
+            entry.unlink(missing_ok=True)
+            return None
+
+    def put(self, date: datetime.date, types: list[MassType] | None, mass: Mass) -> None:
+        """Caches the Mass, evicting the oldest entries if the cache is full."""
+        self._path.mkdir(parents=True, exist_ok=True)
+        utils.write_text_atomic(self._get_entry_path(date, types), json.dumps(_mass_to_dict(mass)))
+        self._evict()
+
+    def masses(self) -> Iterator[Mass]:
+        """Yields every readable Mass in the cache, whether or not it has expired."""
+        for entry in sorted(self._path.glob("*.json")):
+            with contextlib.suppress(ValueError, KeyError, TypeError):
+                yield _mass_from_dict(json.loads(entry.read_text()))
+
+    def _get_entry_path(self, date: datetime.date, types: list[MassType] | None) -> Path:
+        types_key = "+".join(t.name for t in types) if types else "ALL"
+        return Path(self._path, f"{date:%Y%m%d}-{types_key}.json")
+
+    def _evict(self) -> None:
+        entries = sorted(self._path.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for entry in entries[: max(len(entries) - self._max_entries, 0)]:
+            logger.debug("Evicting %s", entry)
+            entry.unlink(missing_ok=True)
+
+
+class RateLimiter:
+    """Spaces out the callers of acquire so that at most rate calls proceed per second."""
+
+    def __init__(self, rate: float) -> None:
+        self._interval = 1.0 / rate
+        self._next_time = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class MassFetcher:
+    """
+    Fetches the Mass readings from USCCB with bounded concurrency and a rate limit.
+
+    Requests that fail (other than with a 404) are retried with an exponential backoff.
+    """
+
+    def __init__(
+        self,
+        usccb: USCCB,
+        mass_cache: MassCache | None = None,
+        concurrency: int = constants.READINGS_CONCURRENCY,
+        rate_limit: float = constants.READINGS_RATE_LIMIT,
+    ) -> None:
+        self._usccb = usccb
+        self._mass_cache = mass_cache
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._rate_limiter = RateLimiter(rate_limit)
+
+    async def get_mass_from_date(self, date: datetime.date, types: list[MassType] | None = None) -> Mass | None:
+        """
+        Gets the first mass for the specified date and type.
+
+        Raises:
+            RequestException if the readings could not be retrieved after retrying.
+        """
+        if self._mass_cache is not None:
+            mass = self._mass_cache.get(date, types)
+            if mass is not None:
+                logger.debug("Using cached mass for %s", date)
+                return mass
+
+        async with self._semaphore:
+            mass = await self._query_mass_from_date(date, types)
+
+        if mass is None:
+            logger.warning("No mass for date: %s, types: %s", date, types)
+        elif self._mass_cache is not None:
+            self._mass_cache.put(date, types, mass)
+        return mass
+
+    async def get_masses(
+        self, dates: Iterable[datetime.date], types: list[MassType] | None = None
+    ) -> dict[datetime.date, Mass | None]:
+        """
+        Gets the mass for each of the dates.
+
+        Dates which still fail after retrying are logged and omitted from the results.
+        """
+        return {dt: mass async for dt, mass in self.iter_masses(dates, types)}
+
+    async def iter_masses(
+        self, dates: Iterable[datetime.date], types: list[MassType] | None = None
+    ) -> AsyncIterator[tuple[datetime.date, Mass | None]]:
+        """
+        Yields each date along with its mass as soon as it has been queried.
+
+        Dates which still fail after retrying are logged and skipped.
+        """
+
+        async def get_mass(dt: datetime.date) -> tuple[datetime.date, Mass | RequestException | None]:
+            try:
+                return dt, await self.get_mass_from_date(dt, types)
+            except RequestException as e:
+                return dt, e
+
+        tasks = [asyncio.ensure_future(get_mass(dt)) for dt in dates]
+        try:
+            for future in asyncio.as_completed(tasks):
+                dt, result = await future
+                if isinstance(result, RequestException):
+                    logger.error("Failed to query the mass on %s: %s", dt, result)
+                    continue
+                yield dt, result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _query_mass_from_date(self, date: datetime.date, types: list[MassType] | None) -> Mass | None:
+        for type_ in types or self._usccb.DEFAULT_MASS_TYPES:
+            try:
+                return await self._query_mass(date, type_)
+            except RequestException as e:
+                if not _is_not_found(e):
+                    raise
+        return None
+
+    @retry(
+        retry=retry_if_exception(lambda e: isinstance(e, RequestException) and not _is_not_found(e)),
+        wait=wait_exponential(multiplier=constants.READINGS_RETRY_BACKOFF),
+        stop=stop_after_attempt(constants.READINGS_MAX_RETRIES),
+        before_sleep=metrics.retry_hook("usccb.get_mass"),
+        reraise=True,
+    )
+    async def _query_mass(self, date: datetime.date, type_: MassType) -> Mass | None:
+        await self._rate_limiter.acquire()
+        with metrics.timed("usccb.get_mass"):
+            return await self._usccb.get_mass(date, type_)
+
+
+def _is_not_found(e: RequestException) -> bool:
+    response = getattr(e, "response", None)
+    return response is not None and response.status_code == HTTPStatus.NOT_FOUND
+
+
+def _mass_to_dict(mass: Mass) -> dict[str, Any]:
+    result = mass.to_dict()
+    if isinstance(mass.type_, MassType):
+        result["type_"] = mass.type_.name
+    return result
+
+
+def _mass_from_dict(data: dict[str, Any]) -> Mass:
+    type_: MassType | str | None = data.get("type_")
+    if isinstance(type_, str):
+        with contextlib.suppress(KeyError):
+            type_ = MassType[type_]
+
+    date = data.get("date")
+    return Mass(
+        datetime.date.fromisoformat(date) if date else None,
+        type_,
+        data["url"],
+        data["title"],
+        [
+            Section(
+                SectionType[section["type"]],
+                section["header"],
+                [
+                    Reading([Verse(v["text"], v["link"], v["book"]) for v in reading["verses"]], reading["text"])
+                    for reading in section["readings"]
+                ],
+            )
+            for section in data["sections"]
+        ],
+    )
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import datetime
+import logging
+from enum import Enum, unique
+from typing import TYPE_CHECKING, NamedTuple
+
+from stjoseph.api import models, utils
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from stjoseph.api.services import AsyncChannel, Channel
+
+logger = logging.getLogger(__name__)
+
+
+@unique
+class Action(str, Enum):
+    INSERT = "insert"
+    UPDATE = "update"
+    NOOP = "noop"
+
+
+class DesiredBroadcast(NamedTuple):
+    """The broadcast as it should be on the channel."""
+
+    title: str
+    description: str
+    scheduled_start: datetime.datetime
+    scheduled_end: datetime.datetime | None = None
+    is_public: bool = False
+
+    @property
+    def privacy_status(self) -> str:
+        return "public" if self.is_public else "private"
+
+
+class Operation(NamedTuple):
+    """The operation which brings the broadcast scheduled at desired.scheduled_start up to date."""
+
+    action: Action
+    desired: DesiredBroadcast
+    broadcast_id: str | None = None
+    changes: tuple[str, ...] = ()
+
+    def __str__(self) -> str:
+        result = f"{self.action.name:<6} {self.desired.scheduled_start} '{self.desired.title}'"
+        if self.broadcast_id is not None:
+            result += f" id='{self.broadcast_id}'"
+        if self.changes:
+            result += f" changes={','.join(self.changes)}"
+        return result
+
+
+class Plan:
+    """The operations which reconcile the desired broadcasts with the ones on the channel."""
+
+    def __init__(self, operations: Iterable[Operation] = ()) -> None:
+        self._operations = list(operations)
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def __iter__(self) -> Iterator[Operation]:
+        return iter(self._operations)
+
+    def __str__(self) -> str:
+        return "\n".join([*map(str, self._operations), self.summary()])
+
+    def add(self, operation: Operation) -> None:
+        self._operations.append(operation)
+
+    def with_action(self, action: Action) -> list[Operation]:
+        return [o for o in self._operations if o.action == action]
+
+    def summary(self) -> str:
+        return ", ".join(f"{len(self.with_action(action))} to {action.value}" for action in Action)
+
+
+def diff(desired: DesiredBroadcast, stream: models.LiveStream) -> tuple[str, ...]:
+    """
+    Gets the names of the fields which differ between the desired and the current broadcast.
+
+    Fields which were not listed (e.g. the privacy status) are treated as changed.
+    """
+    changes: list[str] = []
+    if _normalize(desired.title) != _normalize(stream.title):
+        changes.append("title")
+    if _normalize(desired.description) != _normalize(stream.description):
+        changes.append("description")
+    if _to_gcloud_datetime(desired.scheduled_end) != _to_gcloud_datetime(stream.scheduled_end):
+        changes.append("scheduled_end")
+    if desired.privacy_status != stream.privacy_status:
+        changes.append("privacy_status")
+    return tuple(changes)
+
+
+def plan_broadcast(desired: DesiredBroadcast, index: models.BroadcastIndex) -> Operation:
+    """Plans the operation for the desired broadcast against the upcoming broadcasts of the index."""
+    streams = index.scheduled_at(desired.scheduled_start.astimezone(datetime.UTC), models.BroadcastStatus.UPCOMING)
+    if not streams:
+        return Operation(Action.INSERT, desired)
+
+    # The same broadcast as get_scheduled_dates, the last listed:
+    stream = streams[-1]
+    changes = diff(desired, stream)
+    return Operation(Action.UPDATE if changes else Action.NOOP, desired, stream.id, changes)
+
+
+def create_plan(desired: Iterable[DesiredBroadcast], index: models.BroadcastIndex) -> Plan:
+    return Plan(plan_broadcast(d, index) for d in desired)
+
+
+def apply_operation(channel: Channel, operation: Operation, dry_run: bool = False) -> str:
+    """
+    Applies the operation, nothing is sent for a NOOP.
+
+    Returns:
+        str of the id of the broadcast.
+    """
+    desired = operation.desired
+    if operation.action == Action.INSERT:
+        return channel.schedule_broadcast(
+            desired.title,
+            desired.description,
+            desired.scheduled_start,
+            desired.scheduled_end,
+            is_public=desired.is_public,
+            dry_run=dry_run,
+        )
+
+    assert operation.broadcast_id is not None
+    if operation.action == Action.UPDATE:
+        return channel.update_broadcast(
+            operation.broadcast_id,
+            desired.title,
+            desired.description,
+            desired.scheduled_start,
+            desired.scheduled_end,
+            is_public=desired.is_public,
+            dry_run=dry_run,
+        )
+
+    logger.info("%s is up to date under %s.", desired.scheduled_start, operation.broadcast_id)
+    return operation.broadcast_id
+
+
+async def async_apply_operation(channel: AsyncChannel, operation: Operation, dry_run: bool = False) -> str:
+    """Applies the operation as apply_operation does, through an AsyncChannel."""
+    desired = operation.desired
+    if operation.action == Action.INSERT:
+        return await channel.schedule_broadcast(
+            desired.title,
+            desired.description,
+            desired.scheduled_start,
+            desired.scheduled_end,
+            is_public=desired.is_public,
+            dry_run=dry_run,
+        )
+
+    assert operation.broadcast_id is not None
+    if operation.action == Action.UPDATE:
+        return await channel.update_broadcast(
+            operation.broadcast_id,
+            desired.title,
+            desired.description,
+            desired.scheduled_start,
+            desired.scheduled_end,
+            is_public=desired.is_public,
+            dry_run=dry_run,
+        )
+
+    logger.info("%s is up to date under %s.", desired.scheduled_start, operation.broadcast_id)
+    return operation.broadcast_id
+
+
+def apply_plan(channel: Channel, plan: Plan, dry_run: bool = False) -> list[str]:
+    return [apply_operation(channel, operation, dry_run) for operation in plan]
+
+
+def _normalize(text: str) -> str:
+    # the line endings and the surrounding whitespace are not significant
+    return text.replace("\r\n", "\n").strip()
+
+
+def _to_gcloud_datetime(dt: datetime.datetime | None) -> str | None:
+    return utils.to_gcloud_datetime(dt) if dt is not None else None
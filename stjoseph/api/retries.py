@@ -0,0 +1,343 @@
+"""
+The retry policy of the calls to the YouTube Data API.
+
+The failures are classified by what retrying them can achieve: an auth failure is retried once the
+credentials are refreshed, a rate limit or a transient failure after backing off (or as long as the
+Retry-After of the response), while running out of quota or a permanent failure are not retried at all.
+The retries of a run are bounded by a shared budget, and a circuit breaker fails the calls fast once
+the API looks down, rather than retrying each call in turn.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import datetime
+import email.utils
+import logging
+import random
+import socket
+import ssl
+import threading
+import time
+from enum import Enum
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Any, Final
+
+import google.auth.exceptions
+import httplib2
+from curl_cffi.requests import exceptions as curl_exceptions
+from googleapiclient.errors import HttpError
+from tenacity import AsyncRetrying, RetryCallState, Retrying, retry_if_exception, retry_if_result
+
+from stjoseph.api import constants, metrics, quota
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator, Mapping
+
+logger = logging.getLogger(__name__)
+
+
+_QUOTA_REASONS: Final[frozenset[str]] = frozenset(("quotaExceeded", "dailyLimitExceeded"))
+_RATE_LIMIT_REASONS: Final[frozenset[str]] = frozenset(
+    ("rateLimitExceeded", "userRateLimitExceeded", "RATE_LIMIT_EXCEEDED")
+)
+_AUTH_STATUSES: Final[frozenset[int]] = frozenset((HTTPStatus.UNAUTHORIZED, HTTPStatus.FORBIDDEN))
+_TRANSIENT_STATUSES: Final[frozenset[int]] = frozenset((HTTPStatus.REQUEST_TIMEOUT, HTTPStatus.TOO_EARLY))
+# the network failures, including those of the transports of Channel (httplib2) and AsyncChannel (curl_cffi)
+_TRANSIENT_EXCEPTIONS: Final[tuple[type[BaseException], ...]] = (
+    ConnectionError,
+    TimeoutError,
+    socket.gaierror,
+    ssl.SSLError,
+    httplib2.HttpLib2Error,
+    curl_exceptions.ConnectionError,
+    curl_exceptions.Timeout,
+)
+
+
+class ErrorKind(str, Enum):
+    AUTH = "auth"
+    QUOTA = "quota"
+    RATE_LIMIT = "rate_limit"
+    TRANSIENT = "transient"
+    PERMANENT = "permanent"
+
+
+# the number of attempts made of a call failing with each kind of error
+DEFAULT_ATTEMPTS: Final[Mapping[ErrorKind, int]] = {
+    ErrorKind.AUTH: constants.MAX_RETRIES,
+    ErrorKind.QUOTA: 1,
+    ErrorKind.RATE_LIMIT: 5,
+    ErrorKind.TRANSIENT: 5,
+    ErrorKind.PERMANENT: 1,
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a call while the circuit breaker is open."""
+
+
+def get_error_reasons(e: HttpError) -> set[str]:
+    """Gets the reasons of the errors in the response, e.g. quotaExceeded."""
+    details = e.error_details if isinstance(e.error_details, list) else []
+    return {detail["reason"] for detail in details if isinstance(detail, dict) and "reason" in detail}
+
+
+def get_retry_after(e: BaseException) -> float | None:
+    """Gets the seconds the Retry-After of the error response asks to wait, if any."""
+    if not isinstance(e, HttpError) or (value := e.resp.get("retry-after")) is None:
+        return None
+
+    with contextlib.suppress(ValueError):
+        return max(float(value), 0.0)
+    with contextlib.suppress(TypeError, ValueError):
+        date = email.utils.parsedate_to_datetime(value)
+        return max((date - datetime.datetime.now(datetime.UTC)).total_seconds(), 0.0)
+    return None
+
+
+def classify(e: BaseException) -> ErrorKind:
+    """Classifies the failure of a call by what retrying it can achieve."""
+    if isinstance(e, google.auth.exceptions.RefreshError):
+        return ErrorKind.AUTH
+    if isinstance(e, quota.QuotaExceededError):
+        return ErrorKind.QUOTA
+    if isinstance(e, HttpError):
+        return _classify_http_error(e)
+    if isinstance(e, _TRANSIENT_EXCEPTIONS):
+        return ErrorKind.TRANSIENT
+    return ErrorKind.PERMANENT
+
+
+def _classify_http_error(e: HttpError) -> ErrorKind:
+    reasons = get_error_reasons(e)
+    if reasons & _QUOTA_REASONS:
+        return ErrorKind.QUOTA
+    if e.status_code == HTTPStatus.TOO_MANY_REQUESTS or reasons & _RATE_LIMIT_REASONS:
+        return ErrorKind.RATE_LIMIT
+    if e.status_code in _AUTH_STATUSES:
+        return ErrorKind.AUTH
+    if e.status_code in _TRANSIENT_STATUSES or e.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR:
+        return ErrorKind.TRANSIENT
+    # e.g. a 304 Not Modified, which is a response rather than a failure
+    return ErrorKind.PERMANENT
+
+
+class RetryBudget:
+    """The number of retries the calls of a run can make between them."""
+
+    def __init__(self, retries: int = constants.RETRY_BUDGET) -> None:
+        self._remaining = retries
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self) -> int:
+        return self._remaining
+
+    def acquire(self) -> bool:
+        """Takes a retry from the budget, returning False if there are none left."""
+        with self._lock:
+            if self._remaining <= 0:
+                return False
+            self._remaining -= 1
+            return True
+
+
+class CircuitBreaker:
+    """
+    Fails the calls fast once threshold consecutive calls have failed transiently.
+
+    After the cooldown a single trial call is let through, which closes the circuit if it succeeds
+    and opens it again if it fails.
+    """
+
+    def __init__(
+        self,
+        threshold: int = constants.CIRCUIT_BREAKER_THRESHOLD,
+        cooldown: datetime.timedelta = constants.CIRCUIT_BREAKER_COOLDOWN,
+    ) -> None:
+        self._threshold = threshold
+        self._cooldown = cooldown.total_seconds()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def before_call(self) -> None:
+        """
+        Checks that a call can be made.
+
+        Raises:
+            CircuitOpenError if the circuit is open, or half-open with the trial call already made.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self._cooldown or self._trial:
+                msg = f"The circuit is open after {self._failures} consecutive transient failures"
+                raise CircuitOpenError(msg)
+            self._trial = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Closing the circuit")
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial or (self._opened_at is None and self._failures >= self._threshold):
+                logger.warning("Opening the circuit after %d consecutive transient failures", self._failures)
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class RetryPolicy:
+    """
+    Decides which failed calls are retried, and how long they wait before each retry.
+
+    The budget and the circuit breaker are shared by every call made with the policy, e.g. by a Channel
+    over a command run. The kinds of errors, and so what is retried, can be changed by overriding classify.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        attempts: Mapping[ErrorKind, int] = DEFAULT_ATTEMPTS,
+        backoff: float = constants.RETRY_BACKOFF,
+        max_backoff: float = constants.MAX_RETRY_BACKOFF,
+        max_retry_after: float = constants.MAX_RETRY_AFTER,
+        budget: RetryBudget | None = None,
+        breaker: CircuitBreaker | None = None,
+    ) -> None:
+        """
+        Args:
+            attempts (Mapping): The number of attempts made of a call failing with each kind of error.
+            backoff (float): The seconds the first retry waits at most (with full jitter), doubling with each retry.
+            max_backoff (float): The seconds a retry waits at most, unless the response has a Retry-After.
+            max_retry_after (float): The longest Retry-After which is waited for, rather than the call failing.
+            budget (RetryBudget): The retries shared by the calls (by default RETRY_BUDGET of them).
+            breaker (CircuitBreaker): The circuit breaker of the calls.
+        """
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.budget = budget if budget is not None else RetryBudget()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+
+    def classify(self, e: BaseException) -> ErrorKind:
+        return classify(e)
+
+    def get_wait(self, e: BaseException, attempt: int) -> float:
+        """Gets the seconds to wait before retrying the call which failed on the attempt."""
+        jitter = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))  # noqa: S311
+        retry_after = get_retry_after(e)
+        return jitter if retry_after is None else retry_after + random.uniform(0, self.backoff)  # noqa: S311
+
+    def is_retryable(self, e: BaseException) -> bool:
+        """Whether a call which failed with the error is retried, e.g. not once the quota is exceeded."""
+        if self.classify(e) not in (ErrorKind.AUTH, ErrorKind.RATE_LIMIT, ErrorKind.TRANSIENT):
+            return False
+        retry_after = get_retry_after(e)
+        return retry_after is None or retry_after <= self.max_retry_after
+
+    def retrying(self, name: str) -> Retrying:
+        """Creates the tenacity Retrying of the calls, with name as the metrics name of the retries."""
+        return Retrying(**self._get_retry_kwargs(name))
+
+    def async_retrying(self, name: str) -> AsyncRetrying:
+        return AsyncRetrying(**self._get_retry_kwargs(name))
+
+    def retrying_failures(self, name: str) -> Retrying:
+        """
+        Creates the tenacity Retrying of the calls which return the mapping of what failed to its error,
+        e.g. the sub-requests of a batch, which are retried as long as any failed.
+
+        The failures should only be the retryable ones (see is_retryable). A retry waits as long as the failure
+        waiting the longest, and the attempts stop at the most allowed by the kinds of the failures. The failures
+        of the last attempt are returned, rather than a RetryError raised.
+        """
+        return Retrying(
+            retry=retry_if_result(bool),
+            wait=self._wait_failures,
+            stop=self._stop_failures,
+            before_sleep=self._record_failures_retry(name),
+            retry_error_callback=_get_result,
+        )
+
+    @contextlib.contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        Makes a call through the circuit breaker, recording whether it failed transiently.
+
+        Raises:
+            CircuitOpenError if the circuit is open.
+        """
+        self.breaker.before_call()
+        try:
+            yield
+        except Exception as e:
+            if self.classify(e) is ErrorKind.TRANSIENT:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+
+    def _get_retry_kwargs(self, name: str) -> dict[str, Any]:
+        return {
+            "retry": retry_if_exception(self.is_retryable),
+            "wait": self._wait,
+            "stop": self._stop,
+            "before_sleep": metrics.retry_hook(name),
+        }
+
+    def _wait(self, retry_state: RetryCallState) -> float:
+        assert retry_state.outcome is not None
+        exception = retry_state.outcome.exception()
+        assert exception is not None
+        return self.get_wait(exception, retry_state.attempt_number)
+
+    def _stop(self, retry_state: RetryCallState) -> bool:
+        assert retry_state.outcome is not None
+        exception = retry_state.outcome.exception()
+        assert exception is not None
+        return self._should_stop([exception], retry_state.attempt_number)
+
+    def _wait_failures(self, retry_state: RetryCallState) -> float:
+        failures: Mapping[Any, BaseException] = _get_result(retry_state)
+        return max(self.get_wait(exception, retry_state.attempt_number) for exception in failures.values())
+
+    def _stop_failures(self, retry_state: RetryCallState) -> bool:
+        failures: Mapping[Any, BaseException] = _get_result(retry_state)
+        return self._should_stop(failures.values(), retry_state.attempt_number)
+
+    def _should_stop(self, exceptions: Iterable[BaseException], attempt: int) -> bool:
+        if attempt >= max(self.attempts.get(self.classify(exception), 1) for exception in exceptions):
+            return True
+        if not self.budget.acquire():
+            logger.warning("Not retrying as the retry budget is spent")
+            return True
+        return False
+
+    @staticmethod
+    def _record_failures_retry(name: str) -> Callable[[RetryCallState], None]:
+        def before_sleep(retry_state: RetryCallState) -> None:
+            failures: Mapping[Any, BaseException] = _get_result(retry_state)
+            for exception in failures.values():
+                metrics.record_retry(name, exception=type(exception).__name__)
+
+        return before_sleep
+
+
+def _get_result(retry_state: RetryCallState) -> Any:  # noqa: ANN401
+    """Gets the result of the last attempt, e.g. instead of a RetryError once the retries stop."""
+    assert retry_state.outcome is not None
+    return retry_state.outcome.result()
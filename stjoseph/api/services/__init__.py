@@ -1,3 +1,24 @@
-from stjoseph.api.services.channel import Channel
+from __future__ import annotations
 
-__all__ = ["Channel"]
+import importlib
+from typing import TYPE_CHECKING, Any, Final
+
+if TYPE_CHECKING:
+    from stjoseph.api.services.async_channel import AsyncChannel
+    from stjoseph.api.services.channel import Channel
+
+__all__ = ["AsyncChannel", "Channel"]
+
+# Channel pulls in googleapiclient and AsyncChannel curl_cffi, which listing the commands (e.g. --help) has no use for.
+_MODULES: Final[dict[str, str]] = {
+    "AsyncChannel": "stjoseph.api.services.async_channel",
+    "Channel": "stjoseph.api.services.channel",
+}
+
+
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    if name in _MODULES:
+        return getattr(importlib.import_module(_MODULES[name]), name)
+
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
@@ -0,0 +1,584 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import urllib.parse
+from functools import partial
+from http import HTTPStatus
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Final, Literal, Protocol, Self, cast
+
+import google.auth.exceptions
+import httplib2
+from curl_cffi.requests import AsyncSession
+from google.auth.transport.requests import Request
+from googleapiclient.errors import HttpError
+
+from stjoseph.api import constants, metrics, models, oauth2, quota, resources, retries, utils
+from stjoseph.api.services.channel import Channel, create_broadcast_body, create_live_stream
+
+if TYPE_CHECKING:
+    import datetime
+    from collections.abc import AsyncIterator, Callable
+    from os import PathLike
+    from types import TracebackType
+
+    from curl_cffi.requests import Response
+    from google.oauth2.credentials import Credentials
+
+    from stjoseph.api import snapshot, thumbnails
+
+
+logger = logging.getLogger(__name__)
+
+_HttpMethod = Literal["GET", "POST", "PUT", "DELETE"]
+
+# The HTTP method and path of each API method called, which are charged and timed by the method id as in Channel
+_METHODS: Final[dict[str, tuple[_HttpMethod, str]]] = {
+    "youtube.channels.list": ("GET", "channels"),
+    "youtube.liveBroadcasts.list": ("GET", "liveBroadcasts"),
+    "youtube.liveBroadcasts.insert": ("POST", "liveBroadcasts"),
+    "youtube.liveBroadcasts.update": ("PUT", "liveBroadcasts"),
+    "youtube.liveBroadcasts.delete": ("DELETE", "liveBroadcasts"),
+    "youtube.videos.list": ("GET", "videos"),
+    "youtube.videos.update": ("PUT", "videos"),
+    "youtube.thumbnails.set": ("POST", "thumbnails/set"),
+}
+
+
+class Session(Protocol):
+    """The part of a curl_cffi AsyncSession used by AsyncChannel, e.g. a CassetteSession."""
+
+    async def request(
+        self,
+        method: _HttpMethod,
+        url: str,
+        *,
+        data: bytes | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Response: ...
+
+    async def close(self) -> None: ...
+
+
+class AuthorizedSession:
+    """
+    A session which authorizes the requests with the OAuth 2.0 credentials, as an AuthorizedHttp does for Channel.
+
+    The credentials are refreshed ahead of a request if they are about to expire, and once a request is rejected
+    as unauthorized, so that it succeeds when it is retried.
+    """
+
+    def __init__(self, creds: oauth2.CredentialsManager, session: Session | None = None) -> None:
+        self.creds = creds
+        self.session: Session = session if session is not None else AsyncSession()
+        self._credentials: Credentials | None = None
+        self._lock = asyncio.Lock()
+
+    async def request(
+        self,
+        method: _HttpMethod,
+        url: str,
+        *,
+        data: bytes | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Response:
+        credentials = await self._get_credentials()
+        headers = {**(headers or {}), "Authorization": f"Bearer {credentials.token}"}
+        response = await self.session.request(method, url, data=data, headers=headers)
+        if response.status_code == HTTPStatus.UNAUTHORIZED:
+            logger.exception("Token failed to be refreshed", exc_info=False)
+            await asyncio.to_thread(self._refresh_credentials, credentials)
+        return response
+
+    async def close(self) -> None:
+        await self.session.close()
+
+    async def _get_credentials(self) -> Credentials:
+        async with self._lock:
+            try:
+                if self._credentials is None:
+                    logger.debug("Creating credentials")
+                    self._credentials = await asyncio.to_thread(self.creds.create_oauth_credentials, Channel.SCOPES)
+                await asyncio.to_thread(self.creds.refresh_if_expiring, self._credentials)
+            except google.auth.exceptions.RefreshError:
+                logger.exception("Token failed to be refreshed", exc_info=False)
+                self._reset_credentials()
+                raise
+            return self._credentials
+
+    def _refresh_credentials(self, credentials: Credentials) -> None:
+        """Refreshes the credentials in place, which are only created again if they failed to be refreshed."""
+        self.creds.invalidate_token()
+        try:
+            credentials.refresh(Request())
+        except google.auth.exceptions.RefreshError:
+            logger.exception("Token failed to be refreshed", exc_info=False)
+            self._reset_credentials()
+
+    def _reset_credentials(self) -> None:
+        logger.debug("Resetting credentials.")
+        self._credentials = None
+        self.creds.invalidate_token()
+
+
+class AsyncChannel:
+    """
+    An asyncio counterpart of Channel which calls the YouTube Data API REST endpoints directly.
+
+    The requests share a single keep-alive session, so that they run on the same event loop as USCCB, and they
+    are retried, charged to the quota ledger and timed as those of a Channel. The thumbnails are uploaded by tasks
+    which close() waits for, and the category of a video is synced after each write (there is no batched pass).
+    """
+
+    SCOPES: Final[list[str]] = Channel.SCOPES
+
+    def __init__(  # noqa: PLR0913
+        self,
+        creds: oauth2.CredentialsManager,
+        broadcast_snapshot: snapshot.BroadcastSnapshot | None = None,
+        max_age: datetime.timedelta | None = None,
+        thumbnail_manager: thumbnails.ThumbnailManager | None = None,
+        quota_ledger: quota.QuotaLedger | None = None,
+        session_factory: Callable[[], Session] | None = None,
+        retry_policy: retries.RetryPolicy | None = None,
+        api_url: str = constants.YOUTUBE_API_URL,
+        upload_url: str = constants.YOUTUBE_UPLOAD_URL,
+    ) -> None:
+        """
+        Args:
+            creds (CredentialsManager): The OAuth 2.0 credentials.
+            broadcast_snapshot (BroadcastSnapshot): The optional local snapshot to list the broadcasts from,
+                which may be shared with a Channel.
+            max_age (datetime.timedelta): How long the snapshot is served without being revalidated
+                (if not specified, then every listing is revalidated).
+            thumbnail_manager (ThumbnailManager): The optional record of the thumbnails already uploaded,
+                as for a Channel.
+            quota_ledger (QuotaLedger): The optional running total of the quota used, which every call is charged to
+                (and refused with a QuotaExceededError once over its budget).
+            session_factory (Callable): The optional factory of the session, which is then used instead of one
+                authorized with the credentials (e.g. the FakeYouTube.session of the tests to run offline).
+            retry_policy (RetryPolicy): The policy the failed calls are retried by (if not specified, then a default
+                RetryPolicy).
+            api_url (str): The base URL of the REST endpoints.
+            upload_url (str): The base URL of the media upload endpoints.
+        """
+        self.creds = creds
+        self.broadcast_snapshot = broadcast_snapshot
+        self.max_age = max_age
+        self.thumbnail_manager = thumbnail_manager
+        self._thumbnail_tasks: set[asyncio.Task[None]] = set()
+        self._thumbnail_failures: dict[str, BaseException] = {}
+        self.quota_ledger = quota_ledger
+        self._session_factory = session_factory
+        self._session: Session | None = None
+        self.retry_policy = retry_policy if retry_policy is not None else retries.RetryPolicy()
+        self._api_url = api_url.rstrip("/")
+        self._upload_url = upload_url.rstrip("/")
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Waits for the thumbnail uploads, saves the quota used and closes the session."""
+        if self._thumbnail_tasks:
+            await asyncio.gather(*self._thumbnail_tasks, return_exceptions=True)
+        if self.quota_ledger is not None:
+            self.quota_ledger.flush()
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
+
+    async def get_channels(self) -> dict[str, Any]:
+        return await self._request("youtube.channels.list", {"part": "snippet", "mine": True})
+
+    async def broadcasts(
+        self,
+        broadcast_status: models.BroadcastStatus,
+        broadcast_type: models.BroadcastType,
+        fields: str | None = None,
+        max_results: int = constants.MAX_PAGE_SIZE,
+    ) -> AsyncIterator[dict[str, Any]]:
+        # the same parameters as those of Channel, so that a snapshot is shared under the same keys
+        params: dict[str, Any] = {
+            "part": "id,snippet,status",
+            "broadcastStatus": broadcast_status.value,
+            "broadcastType": broadcast_type.value,
+            "maxResults": max_results,
+        }
+        if fields is not None:
+            params["fields"] = fields if "nextPageToken" in fields else f"nextPageToken,{fields}"
+
+        if self.broadcast_snapshot is not None:
+            async for item in self._get_snapshot_pages(self.broadcast_snapshot, params):
+                yield item
+            return
+
+        page_count = 1
+        while True:
+            with metrics.timed("channel.get_page"):
+                results = await self._request("youtube.liveBroadcasts.list", params)
+            values = cast("list[dict[str, Any]]", results.get("items", []))
+            logger.debug("Page: %d (%d items)", page_count, len(values))
+            for value in values:
+                yield value
+
+            next_page_token = results.get("nextPageToken")
+            if next_page_token is None:
+                break
+
+            params = {**params, "pageToken": next_page_token}
+            page_count += 1
+
+    async def build_index(
+        self,
+        broadcast_status: models.BroadcastStatus = models.BroadcastStatus.ALL,
+        fields: str = constants.LIVE_STREAM_FIELDS,
+    ) -> models.BroadcastIndex:
+        """Lists the broadcasts once, returning an index which the query methods can answer from."""
+        items = self.broadcasts(broadcast_status, models.BroadcastType.EVENT, fields)
+        return models.BroadcastIndex([create_live_stream(item) async for item in items], broadcast_status)
+
+    async def get_scheduled_dates(self, index: models.BroadcastIndex | None = None) -> dict[datetime.datetime, str]:
+        """Gets a list of the upcoming scheduled dates to id."""
+        if index is None:
+            index = await self.build_index(models.BroadcastStatus.UPCOMING, constants.SCHEDULED_DATES_FIELDS)
+        duplicated_dates = index.get_duplicated_schedules_dates(models.BroadcastStatus.UPCOMING)
+        for scheduled_start in duplicated_dates:
+            logger.warning("Duplicate scheduled broadcast on %s.", scheduled_start)
+        return index.get_scheduled_dates(models.BroadcastStatus.UPCOMING)
+
+    async def delete_broadcast(self, broadcast_id: str) -> None:
+        await self._request("youtube.liveBroadcasts.delete", {"id": broadcast_id})
+        self._invalidate_snapshot()
+        if self.thumbnail_manager is not None:
+            self.thumbnail_manager.forget([broadcast_id])
+        logger.info("Broadcast with ID %s has been deleted.", broadcast_id)
+
+    async def schedule_broadcast(  # noqa: PLR0913
+        self,
+        title: str,
+        description: str,
+        scheduled_start_time: datetime.datetime,
+        scheduled_end_time: datetime.datetime | None = None,
+        is_public: bool = False,
+        category_id: models.VideoCategory = models.VideoCategory.NONPROFITS_AND_ACTIVISM,
+        dry_run: bool = False,
+    ) -> str:
+        if not dry_run:
+            self._reserve_insert()
+
+        broadcast_id = await self._upsert_broadcast(
+            None, title, description, scheduled_start_time, scheduled_end_time, is_public, category_id, dry_run
+        )
+        if dry_run:
+            return broadcast_id
+
+        # Upload the thumbnail, scheduling does not wait for it to finish:
+        self._submit_thumbnail(broadcast_id)
+        logger.info(
+            "Successfully scheduled ID: %s, url: %s",
+            broadcast_id,
+            constants.LIVE_STREAMING_URL_FMT.format(VIDEO_ID=broadcast_id),
+        )
+        return broadcast_id
+
+    async def update_broadcast(  # noqa: PLR0913
+        self,
+        broadcast_id: str,
+        title: str,
+        description: str,
+        scheduled_start_time: datetime.datetime,
+        scheduled_end_time: datetime.datetime | None = None,
+        is_public: bool = False,
+        dry_run: bool = False,
+    ) -> str:
+        broadcast_id = await self._upsert_broadcast(
+            broadcast_id,
+            title,
+            description,
+            scheduled_start_time,
+            scheduled_end_time,
+            is_public,
+            models.VideoCategory.NONPROFITS_AND_ACTIVISM,
+            dry_run,
+        )
+        if not dry_run and self._has_thumbnail_record(broadcast_id):
+            # Only the broadcasts recorded with another image are uploaded to (see _submit_thumbnail):
+            self._submit_thumbnail(broadcast_id)
+
+        logger.info(
+            "Successfully updated scheduled ID: %s, url: %s",
+            broadcast_id,
+            constants.LIVE_STREAMING_URL_FMT.format(VIDEO_ID=broadcast_id),
+        )
+        return broadcast_id
+
+    async def set_thumbnail(
+        self, video_id: str, path: PathLike = resources.THUMBNAIL, mime_type: str = resources.THUMBNAIL_MIME_TYPE
+    ) -> None:
+        """
+        Uploads the thumbnail of the video.
+
+        The image is then recorded by the thumbnail manager as set on the video.
+        """
+        path = Path(path)
+        assert path.is_file()
+        content = await asyncio.to_thread(path.read_bytes)
+        await self._request(
+            "youtube.thumbnails.set", {"videoId": video_id, "uploadType": "media"}, data=content, mime_type=mime_type
+        )
+        metrics.record_bytes("channel.thumbnail", "sent", len(content))
+        if self.thumbnail_manager is not None:
+            self.thumbnail_manager.record(video_id, self.thumbnail_manager.digest(path))
+
+        logger.debug("Thumbnail %s has been set on %s.", path.name, video_id)
+
+    @property
+    def thumbnail_failures(self) -> dict[str, BaseException]:
+        """Gets the error of each video whose thumbnail failed to be set by its task."""
+        return dict(self._thumbnail_failures)
+
+    def resume_thumbnails(self, index: models.BroadcastIndex) -> list[str]:
+        """
+        Sets the thumbnails left pending by a previous run (e.g. stopped by its quota budget) as tasks.
+
+        The pending videos which are not in the index (e.g. deleted or no longer upcoming) are forgotten instead.
+
+        Returns:
+            list of the ids of the videos whose thumbnail was submitted.
+        """
+        if self.thumbnail_manager is None:
+            return []
+
+        pending = self.thumbnail_manager.pending()
+        resumed = [video_id for video_id in pending if video_id in index]
+        self.thumbnail_manager.forget(video_id for video_id in pending if video_id not in index)
+        if resumed:
+            logger.info("Resuming the thumbnails of %d broadcasts", len(resumed))
+        for video_id in resumed:
+            self._submit_thumbnail(video_id)
+        return resumed
+
+    def _has_thumbnail_record(self, video_id: str) -> bool:
+        """Determines if the thumbnail manager has a record of an image set on the video (see Channel)."""
+        return self.thumbnail_manager is not None and self.thumbnail_manager.get_digest(video_id) is not None
+
+    def _reserve_insert(self) -> None:
+        """Refuses an insert whose follow-up calls, and the thumbnails still uploading, would not fit in the budget."""
+        if self.quota_ledger is None:
+            return
+
+        method_ids = ["youtube.liveBroadcasts.insert", "youtube.videos.update"]
+        method_ids.extend(["youtube.thumbnails.set"] * (len(self._thumbnail_tasks) + 1))
+        self.quota_ledger.ensure_available(method_ids)
+
+    def _submit_thumbnail(self, video_id: str, path: PathLike = resources.THUMBNAIL) -> asyncio.Task[None] | None:
+        """
+        Sets the thumbnail in a task, close() waits for it to finish.
+
+        A video which the thumbnail manager has recorded with the image is skipped, without a call (or its quota)
+        being spent on it.
+
+        Returns:
+            Task of the upload, None if it was skipped.
+        """
+        if self.thumbnail_manager is not None:
+            if self.thumbnail_manager.has_thumbnail(video_id, self.thumbnail_manager.digest(path)):
+                logger.debug("Thumbnail %s is already set on %s.", Path(path).name, video_id)
+                self.thumbnail_manager.discard_pending(video_id)
+                return None
+            # kept until it is set, so that a later run sets it if this one does not (see resume_thumbnails)
+            self.thumbnail_manager.add_pending(video_id)
+        task = asyncio.create_task(self.set_thumbnail(video_id, path))
+        self._thumbnail_tasks.add(task)
+        task.add_done_callback(partial(self._on_thumbnail_done, video_id))
+        return task
+
+    def _on_thumbnail_done(self, video_id: str, task: asyncio.Task[None]) -> None:
+        self._thumbnail_tasks.discard(task)
+        e = None if task.cancelled() else task.exception()
+        if e is not None:
+            self._thumbnail_failures[video_id] = e
+            logger.error("Failed to set the thumbnail of %s: %s", video_id, e)
+
+    async def _upsert_broadcast(  # noqa: PLR0913
+        self,
+        broadcast_id: str | None,
+        title: str,
+        description: str,
+        scheduled_start_time: datetime.datetime,
+        scheduled_end_time: datetime.datetime | None,
+        is_public: bool,
+        category_id: models.VideoCategory,
+        dry_run: bool,
+    ) -> str:
+        body = create_broadcast_body(
+            broadcast_id, title, description, scheduled_start_time, scheduled_end_time, is_public, category_id
+        )
+        logger.info(
+            "%s mass%s: %s (%s) %s",
+            "Scheduling" if broadcast_id is None else "Updating",
+            " [DRY-RUN]" if dry_run else "",
+            title,
+            scheduled_start_time,
+            utils.truncate(description, constants.MAX_FIELD_LEN),
+        )
+        if dry_run:
+            return constants.NO_OP
+
+        method_id = "youtube.liveBroadcasts.insert" if broadcast_id is None else "youtube.liveBroadcasts.update"
+        broadcast_response = await self._request(method_id, {"part": "snippet,status"}, body)
+        self._invalidate_snapshot()
+
+        video_id = cast("str", broadcast_response["id"])
+
+        # The category belongs to the video, so it is synced separately (checked first on update, which saves quota
+        # rather than round trips, as in Channel._upsert_broadcast):
+        category = None if broadcast_id is None else (await self._get_categories([video_id])).get(video_id)
+        if category != body["snippet"]["categoryId"]:
+            # a new video always starts with the default category of the channel
+            request_body = {"id": video_id, "snippet": body["snippet"]}
+            await self._request("youtube.videos.update", {"part": "snippet"}, request_body)
+
+        return video_id
+
+    async def _get_categories(self, video_ids: list[str]) -> dict[str, str]:
+        """Gets the current category of each video."""
+        params = {"part": "snippet", "id": ",".join(video_ids), "fields": constants.VIDEO_CATEGORY_FIELDS}
+        response = await self._request("youtube.videos.list", params)
+        return {item["id"]: item["snippet"]["categoryId"] for item in response.get("items", [])}
+
+    async def _get_snapshot_pages(
+        self, broadcast_snapshot: snapshot.BroadcastSnapshot, params: dict[str, Any]
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Gets the pages from the snapshot, revalidating each page against its ETag once it is stale."""
+        if "fields" in params and "etag" not in params["fields"]:
+            params["fields"] = f"etag,{params['fields']}"
+
+        key = broadcast_snapshot.key(**params)
+        if broadcast_snapshot.is_fresh(key, self.max_age):
+            logger.debug("Listing items from %s", broadcast_snapshot.path)
+            for page in broadcast_snapshot.get_pages(key):
+                for item in page["items"]:
+                    yield item
+            return
+
+        pages: list[dict[str, Any]] = []
+        next_page_token: str | None = None
+        not_modified_count = 0
+        while True:
+            cached_page = broadcast_snapshot.get_page(key, next_page_token)
+            page_params = params if next_page_token is None else {**params, "pageToken": next_page_token}
+            etag = cached_page["etag"] if cached_page is not None else None
+            try:
+                with metrics.timed("channel.get_page"):
+                    results = await self._request("youtube.liveBroadcasts.list", page_params, if_none_match=etag)
+                page = {
+                    "page_token": next_page_token,
+                    "etag": results.get("etag"),
+                    "next_page_token": results.get("nextPageToken"),
+                    "items": results.get("items", []),
+                }
+            except HttpError as e:
+                if e.status_code != HTTPStatus.NOT_MODIFIED or cached_page is None:
+                    raise
+                page = cached_page
+                not_modified_count += 1
+
+            pages.append(page)
+            for item in page["items"]:
+                yield item
+
+            next_page_token = page["next_page_token"]
+            if next_page_token is None:
+                break
+
+        logger.debug("Refreshed %d pages (%d not modified)", len(pages), not_modified_count)
+        broadcast_snapshot.put_pages(key, pages)
+
+    def _invalidate_snapshot(self) -> None:
+        if self.broadcast_snapshot is not None:
+            self.broadcast_snapshot.invalidate()
+
+    async def _request(  # noqa: PLR0913
+        self,
+        method_id: str,
+        params: dict[str, Any],
+        body: dict[str, Any] | None = None,
+        data: bytes | None = None,
+        mime_type: str | None = None,
+        if_none_match: str | None = None,
+    ) -> dict[str, Any]:
+        """Calls the API method, with either a JSON body or the data of a media upload."""
+        method, path = _METHODS[method_id]
+        base_url = self._api_url if data is None else self._upload_url
+        query = urllib.parse.urlencode({key: _to_param(value) for key, value in params.items()})
+        url = f"{base_url}/{path}?{query}"
+        headers: dict[str, str] = {}
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        elif mime_type is not None:
+            headers["Content-Type"] = mime_type
+        if if_none_match is not None:
+            headers["If-None-Match"] = if_none_match
+
+        return await self.retry_policy.async_retrying("channel.execute")(
+            self._send, method_id, method, url, data, headers
+        )
+
+    async def _send(
+        self, method_id: str, method: _HttpMethod, url: str, data: bytes | None, headers: dict[str, str]
+    ) -> dict[str, Any]:
+        with self.retry_policy.guard():
+            self._charge(method_id)
+            if data:
+                metrics.record_bytes("channel.execute", "sent", len(data), method=method_id)
+            with metrics.timed("channel.execute", method=method_id):
+                response = await self._ensure_session().request(method, url, data=data, headers=headers)
+            _raise_for_status(response, url)
+
+        metrics.record_bytes("channel.execute", "received", len(response.content), method=method_id)
+        if response.status_code == HTTPStatus.NO_CONTENT or not response.content:
+            return {}
+        return cast("dict[str, Any]", response.json())
+
+    def _charge(self, method_id: str) -> None:
+        """Charges the call to the quota ledger, raising a QuotaExceededError if it is over the budget."""
+        if self.quota_ledger is not None:
+            self.quota_ledger.charge(method_id)
+
+    def _ensure_session(self) -> Session:
+        if self._session is None:
+            if self._session_factory is not None:
+                self._session = self._session_factory()
+            else:
+                self._session = AuthorizedSession(self.creds)
+        return self._session
+
+
+def _to_param(value: Any) -> str:  # noqa: ANN401
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+def _raise_for_status(response: Response, url: str) -> None:
+    """Raises the same HttpError as googleapiclient, so that both channels share the retry semantics."""
+    if response.status_code < HTTPStatus.MULTIPLE_CHOICES:
+        return
+    info = {str(key).lower(): str(value) for key, value in response.headers.items()}
+    info["status"] = str(response.status_code)
+    resp = httplib2.Response(info)
+    resp.reason = response.reason
+    raise HttpError(resp, response.content, uri=url)
@@ -1,33 +1,157 @@
 from __future__ import annotations
 
 import logging
-from functools import cached_property
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, partial
 from http import HTTPStatus
-from typing import TYPE_CHECKING, Any, Final, cast
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Final, Self, TypeVar, cast
 
 import google.auth.exceptions
+from google.auth.transport.requests import Request
 from googleapiclient.discovery import Resource, build
 from googleapiclient.errors import HttpError
 from googleapiclient.http import HttpRequest, MediaFileUpload
 from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 
-from stjoseph.api import constants, models, oauth2, resources, utils
+from stjoseph.api import constants, metrics, models, oauth2, quota, resources, retries, utils
 
 if TYPE_CHECKING:
     import datetime
-    from collections.abc import Callable, Iterable
+    from collections.abc import Callable, Iterable, Iterator
+    from concurrent.futures import Future
+    from os import PathLike
+    from types import TracebackType
+
+    import httplib2
+    from google.oauth2.credentials import Credentials
+
+    from stjoseph.api import snapshot, thumbnails, watermark
 
 
 logger = logging.getLogger(__name__)
 
+_T = TypeVar("_T")
+
+
+def _measure_bytes(request: HttpRequest) -> None:
+    """Records the size of the request body and of the (decoded) content of the successful response."""
+    method = request.methodId
+    if request.body:
+        metrics.record_bytes("channel.execute", "sent", len(request.body), method=method)
+
+    postproc = request.postproc
+
+    def measured_postproc(resp: Any, content: bytes) -> Any:  # noqa: ANN401
+        metrics.record_bytes("channel.execute", "received", len(content or b""), method=method)
+        return postproc(resp, content)
+
+    request.postproc = measured_postproc
+
+
+def _chunk(values: list[str], size: int) -> list[list[str]]:
+    return [values[idx : idx + size] for idx in range(0, len(values), size)]
+
 
 class Channel:
     SCOPES: Final[list[str]] = [
         "https://www.googleapis.com/auth/youtube.force-ssl",
     ]
 
-    def __init__(self, creds: oauth2.CredentialsManager) -> None:
+    def __init__(  # noqa: PLR0913
+        self,
+        creds: oauth2.CredentialsManager,
+        broadcast_snapshot: snapshot.BroadcastSnapshot | None = None,
+        max_age: datetime.timedelta | None = None,
+        workers: int = constants.CHANNEL_WORKERS,
+        thumbnail_manager: thumbnails.ThumbnailManager | None = None,
+        defer_category: bool = False,
+        quota_ledger: quota.QuotaLedger | None = None,
+        http_factory: Callable[[], httplib2.Http] | None = None,
+        background_refresh: bool = False,
+        retry_policy: retries.RetryPolicy | None = None,
+    ) -> None:
+        """
+        Args:
+            creds (CredentialsManager): The OAuth 2.0 credentials.
+            broadcast_snapshot (BroadcastSnapshot): The optional local snapshot to list the broadcasts from.
+            max_age (datetime.timedelta): How long the snapshot is served without being revalidated
+                (if not specified, then every listing is revalidated).
+            workers (int): The number of worker threads in the executor, each with its own Resource.
+            thumbnail_manager (ThumbnailManager): The optional record of the thumbnails already uploaded,
+                which skips setting the same image twice and lets update_broadcast replace a thumbnail recorded
+                with another image.
+            defer_category (bool): Whether the category of the videos is set by sync_categories (or close)
+                instead of after each broadcast is scheduled or updated.
+            quota_ledger (QuotaLedger): The optional running total of the quota used, which every call is charged to
+                (and refused with a QuotaExceededError once over its budget).
+            http_factory (Callable): The optional factory of the transport of each Resource, which is then used
+                instead of authorizing one with the credentials (e.g. the FakeYouTube.http of the tests to run offline).
+            background_refresh (bool): Whether the credentials are refreshed by a background thread before they
+                expire (e.g. for long-running processes), instead of ahead of the next call made.
+            retry_policy (RetryPolicy): The policy the failed calls are retried by, whose retry budget and circuit
+                breaker are shared by the calls of the Channel (if not specified, then a default RetryPolicy).
+        """
         self.creds = creds
+        self.broadcast_snapshot = broadcast_snapshot
+        self.max_age = max_age
+        self._workers = workers
+        self.thumbnail_manager = thumbnail_manager
+        self._queued_thumbnails = 0
+        self._thumbnail_failures: dict[str, BaseException] = {}
+        self.defer_category = defer_category
+        self._pending_categories: dict[str, dict[str, Any]] = {}
+        self.quota_ledger = quota_ledger
+        self._http_factory = http_factory
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._credentials: Credentials | None = None
+        self._generation = 0
+        self._background_refresh = background_refresh
+        self._refresher: oauth2.TokenRefresher | None = None
+        self.retry_policy = retry_policy if retry_policy is not None else retries.RetryPolicy()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    @property
+    def workers(self) -> int:
+        """Gets the number of worker threads in the executor."""
+        return self._workers
+
+    @cached_property
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        Gets the executor for running independent calls concurrently.
+
+        A googleapiclient Resource (and its httplib2 connection) is not thread-safe, so each worker
+        thread builds its own Resource which shares the credentials of this Channel.
+        """
+        return ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="channel")
+
+    def submit(self, fn: Callable[..., _T], *args: Any, **kwargs: Any) -> Future[_T]:  # noqa: ANN401
+        """Runs fn on the executor."""
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def close(self) -> None:
+        """Waits for the calls submitted to the executor, syncs the deferred categories and saves the quota used."""
+        executor = self.__dict__.pop("executor", None)
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if self._pending_categories:
+            self.sync_categories()
+        if self.quota_ledger is not None:
+            self.quota_ledger.flush()
+        self._stop_refresher()
 
     def get_channels(self) -> dict[str, Any]:
         return self._execute_with_retry(lambda resource: resource.channels().list(part="snippet", mine=True))
@@ -36,58 +160,133 @@ class Channel:
         self,
         broadcast_status: models.BroadcastStatus,
         broadcast_type: models.BroadcastType,
+        fields: str | None = None,
+        max_results: int = constants.MAX_PAGE_SIZE,
     ) -> Iterable[dict[str, Any]]:
         return self._get_pages(
             "items",
+            fields=fields,
+            max_results=max_results,
             part="id,snippet,status",
             broadcastStatus=broadcast_status.value,
             broadcastType=broadcast_type.value,
         )
 
-    def list_scheduled_livestreams(self) -> Iterable[models.LiveStream]:
-        return map(
-            self._create_live_stream_from_item,
-            self.broadcasts(models.BroadcastStatus.UPCOMING, models.BroadcastType.EVENT),
-        )
-
-    def list_completed_livestreams(self) -> Iterable[models.LiveStream]:
-        return map(
-            self._create_live_stream_from_item,
-            self.broadcasts(models.BroadcastStatus.COMPLETED, models.BroadcastType.EVENT),
-        )
-
-    def list_eligible_for_deletion(self) -> Iterable[models.LiveStream]:
-        """Gets all the scheduled streams that did not broadcast or were too short and can be deleted."""
-        return (sch for sch in self.list_completed_livestreams() if sch.is_eligible_for_deletion())
-
-    def get_scheduled_dates(self) -> dict[datetime.datetime, str]:
+    def build_index(
+        self,
+        broadcast_status: models.BroadcastStatus = models.BroadcastStatus.ALL,
+        fields: str = constants.LIVE_STREAM_FIELDS,
+    ) -> models.BroadcastIndex:
+        """Lists the broadcasts once, returning an index which the query methods can answer from."""
+        return models.BroadcastIndex(self._list_livestreams(broadcast_status, fields), broadcast_status)
+
+    def list_scheduled_livestreams(
+        self, index: models.BroadcastIndex | None = None, fields: str = constants.LIVE_STREAM_FIELDS
+    ) -> Iterable[models.LiveStream]:
+        if index is not None:
+            return index.with_status(models.BroadcastStatus.UPCOMING)
+        return self._list_livestreams(models.BroadcastStatus.UPCOMING, fields)
+
+    def list_completed_livestreams(
+        self, index: models.BroadcastIndex | None = None, fields: str = constants.LIVE_STREAM_FIELDS
+    ) -> Iterable[models.LiveStream]:
+        if index is not None:
+            return index.with_status(models.BroadcastStatus.COMPLETED)
+        return self._list_livestreams(models.BroadcastStatus.COMPLETED, fields)
+
+    def list_eligible_for_deletion(
+        self,
+        index: models.BroadcastIndex | None = None,
+        fields: str = constants.LIVE_STREAM_FIELDS,
+        deletion_watermark: watermark.DeletionWatermark | None = None,
+    ) -> Iterable[models.LiveStream]:
+        """
+        Gets all the scheduled streams that did not broadcast or were too short and can be deleted.
+
+        If a deletion watermark is given, then the completed broadcasts (which are listed newest first) stop being
+        paged at the first one scheduled at or before it, and the ones evaluated are recorded on it.
+        """
+        streams = self.list_completed_livestreams(index, fields)
+        if deletion_watermark is None:
+            return (sch for sch in streams if sch.is_eligible_for_deletion())
+        return _scan_eligible_for_deletion(streams, deletion_watermark)
+
+    def get_scheduled_dates(self, index: models.BroadcastIndex | None = None) -> dict[datetime.datetime, str]:
         """Gets a list of the upcoming scheduled dates to id."""
-        results: dict[datetime.datetime, str] = {}
-        for sch in self.list_scheduled_livestreams():
-            if sch.scheduled_start is None:
-                continue
-            if sch.scheduled_start in results:
-                logger.warning("Duplicate scheduled broadcast on %s.", sch.scheduled_start)
-
-            results[sch.scheduled_start] = sch.id
-        return results
-
-    def get_duplicated_schedules_dates(self) -> dict[datetime.datetime, list[str]]:
+        if index is None:
+            index = self.build_index(models.BroadcastStatus.UPCOMING, constants.SCHEDULED_DATES_FIELDS)
+        duplicated_dates = index.get_duplicated_schedules_dates(models.BroadcastStatus.UPCOMING)
+        for scheduled_start in duplicated_dates:
+            logger.warning("Duplicate scheduled broadcast on %s.", scheduled_start)
+        return index.get_scheduled_dates(models.BroadcastStatus.UPCOMING)
+
+    def get_duplicated_schedules_dates(
+        self, index: models.BroadcastIndex | None = None
+    ) -> dict[datetime.datetime, list[str]]:
         """Gets a map of all the duplicated scheduled streams."""
-        results: dict[datetime.datetime, list[str]] = {}
-        for sch in self.list_scheduled_livestreams():
-            if sch.scheduled_start is None:
-                continue
-            if sch.scheduled_start in results:
-                results[sch.scheduled_start].append(sch.id)
-            else:
-                results[sch.scheduled_start] = [sch.id]
-        return {k: v for k, v in results.items() if len(v) > 1}
+        if index is None:
+            index = self.build_index(models.BroadcastStatus.UPCOMING, constants.SCHEDULED_DATES_FIELDS)
+        return index.get_duplicated_schedules_dates(models.BroadcastStatus.UPCOMING)
 
     def delete_broadcast(self, broadcast_id: str) -> None:
         self._execute_with_retry(lambda resource: resource.liveBroadcasts().delete(id=broadcast_id))
+        self._invalidate_snapshot()
+        if self.thumbnail_manager is not None:
+            self.thumbnail_manager.forget([broadcast_id])
         logger.info("Broadcast with ID %s has been deleted.", broadcast_id)
 
+    def delete_broadcasts(self, broadcast_ids: Iterable[str]) -> dict[str, bool]:
+        """
+        Deletes the broadcasts using batched requests.
+
+        Only the sub-requests that failed are retried.
+
+        Returns:
+            dict of the broadcast id to whether it was deleted.
+        """
+        results = dict.fromkeys(broadcast_ids, False)
+        if results:
+            try:
+                self.retry_policy.retrying_failures("channel.delete_batch")(self._delete_batch, list(results), results)
+            finally:
+                deleted_ids = [broadcast_id for broadcast_id, deleted in results.items() if deleted]
+                if deleted_ids:
+                    self._invalidate_snapshot()
+                    if self.thumbnail_manager is not None:
+                        self.thumbnail_manager.forget(deleted_ids)
+        return results
+
+    def sync_categories(self) -> dict[str, bool]:
+        """
+        Sets the category of the videos deferred by defer_category, in a single pass of batched requests.
+
+        The current categories are read first so that only the videos with the wrong category are updated.
+
+        Returns:
+            dict of the video id to whether it has the category.
+        """
+        with self._lock:
+            pending, self._pending_categories = self._pending_categories, {}
+
+        results = dict.fromkeys(pending, False)
+        if not pending:
+            return results
+
+        categories = self._get_categories(list(pending))
+        to_update = []
+        for video_id, snippet in pending.items():
+            if categories.get(video_id) == snippet["categoryId"]:
+                results[video_id] = True
+            else:
+                to_update.append(video_id)
+
+        logger.info("Updating the category of %d of %d videos", len(to_update), len(pending))
+        if to_update:
+            self.retry_policy.retrying_failures("channel.update_categories_batch")(
+                self._update_categories_batch, to_update, pending, results
+            )
+        return results
+
     def schedule_broadcast(  # noqa: PLR0913
         self,
         title: str,
@@ -98,6 +297,9 @@ class Channel:
         category_id: models.VideoCategory = models.VideoCategory.NONPROFITS_AND_ACTIVISM,
         dry_run: bool = False,
     ) -> str:
+        if not dry_run:
+            self._reserve_insert()
+
         broadcast_id = self._upsert_broadcast(
             None,
             title,
@@ -109,10 +311,11 @@ class Channel:
             category_id=category_id,
         )
 
-        # Upload the thumbnail
-        assert resources.THUMBNAIL.is_file()
-        media = MediaFileUpload(resources.THUMBNAIL.as_posix(), mimetype=resources.THUMBNAIL_MIME_TYPE)
-        self._execute_with_retry(lambda resource: resource.thumbnails().set(videoId=broadcast_id, media_body=media))
+        if dry_run:
+            return broadcast_id
+
+        # Upload the thumbnail, scheduling does not wait for it to finish:
+        self._submit_thumbnail(broadcast_id)
 
         logger.info(
             "Successfully scheduled ID: %s, url: %s",
@@ -141,6 +344,10 @@ class Channel:
             is_public=is_public,
             dry_run=dry_run,
         )
+        if not dry_run and self._has_thumbnail_record(broadcast_id):
+            # Only the broadcasts recorded with another image are uploaded to (see _submit_thumbnail):
+            self._submit_thumbnail(broadcast_id)
+
         logger.info(
             "Successfully updated scheduled ID: %s, url: %s",
             broadcast_id,
@@ -148,6 +355,111 @@ class Channel:
         )
         return broadcast_id
 
+    def set_thumbnail(
+        self, video_id: str, path: PathLike = resources.THUMBNAIL, mime_type: str = resources.THUMBNAIL_MIME_TYPE
+    ) -> None:
+        """
+        Uploads the thumbnail of the video, images larger than a chunk are sent as a resumable upload.
+
+        The image is then recorded by the thumbnail manager as set on the video.
+        """
+        path = Path(path)
+        assert path.is_file()
+        chunk_size = constants.THUMBNAIL_CHUNK_SIZE
+        resumable = path.stat().st_size > chunk_size
+        media = MediaFileUpload(path.as_posix(), mimetype=mime_type, chunksize=chunk_size, resumable=resumable)
+        self._execute_with_retry(lambda resource: resource.thumbnails().set(videoId=video_id, media_body=media))
+        metrics.record_bytes("channel.thumbnail", "sent", media.size())
+        if self.thumbnail_manager is not None:
+            self.thumbnail_manager.record(video_id, self.thumbnail_manager.digest(path))
+
+        logger.debug("Thumbnail %s has been set on %s.", path.name, video_id)
+
+    def _has_thumbnail_record(self, video_id: str) -> bool:
+        """
+        Determines if the thumbnail manager has a record of an image set on the video.
+
+        A video without a record (e.g. a broadcast scheduled before the thumbnails were recorded) is assumed to
+        have the thumbnail it was scheduled with, rather than being uploaded to again.
+        """
+        return self.thumbnail_manager is not None and self.thumbnail_manager.get_digest(video_id) is not None
+
+    @property
+    def thumbnail_failures(self) -> dict[str, BaseException]:
+        """Gets the error of each video whose thumbnail failed to be set by the executor."""
+        with self._lock:
+            return dict(self._thumbnail_failures)
+
+    def resume_thumbnails(self, index: models.BroadcastIndex) -> list[str]:
+        """
+        Sets the thumbnails left pending by a previous run (e.g. stopped by its quota budget) on the executor.
+
+        The pending videos which are not in the index (e.g. deleted or no longer upcoming) are forgotten instead.
+
+        Returns:
+            list of the ids of the videos whose thumbnail was submitted.
+        """
+        if self.thumbnail_manager is None:
+            return []
+
+        pending = self.thumbnail_manager.pending()
+        resumed = [video_id for video_id in pending if video_id in index]
+        self.thumbnail_manager.forget(video_id for video_id in pending if video_id not in index)
+        if resumed:
+            logger.info("Resuming the thumbnails of %d broadcasts", len(resumed))
+        for video_id in resumed:
+            self._submit_thumbnail(video_id)
+        return resumed
+
+    def _reserve_insert(self) -> None:
+        """
+        Refuses an insert whose follow-up calls would not fit in the quota budget, before anything is charged.
+
+        The thumbnails are uploaded in the background, so the ones still queued are counted as well.
+        """
+        if self.quota_ledger is None:
+            return
+
+        method_ids = ["youtube.liveBroadcasts.insert"]
+        if not self.defer_category:
+            method_ids.append("youtube.videos.update")
+        with self._lock:
+            queued = self._queued_thumbnails
+        method_ids.extend(["youtube.thumbnails.set"] * (queued + 1))
+        self.quota_ledger.ensure_available(method_ids)
+
+    def _submit_thumbnail(self, video_id: str, path: PathLike = resources.THUMBNAIL) -> Future[None] | None:
+        """
+        Sets the thumbnail on the executor, close() waits for it to finish.
+
+        A video which the thumbnail manager has recorded with the image is skipped, without a call (or its quota)
+        being spent on it.
+
+        Returns:
+            Future of the upload, None if it was skipped.
+        """
+        if self.thumbnail_manager is not None:
+            if self.thumbnail_manager.has_thumbnail(video_id, self.thumbnail_manager.digest(path)):
+                logger.debug("Thumbnail %s is already set on %s.", Path(path).name, video_id)
+                self.thumbnail_manager.discard_pending(video_id)
+                return None
+            # kept until it is set, so that a later run sets it if this one does not (see resume_thumbnails)
+            self.thumbnail_manager.add_pending(video_id)
+        with self._lock:
+            self._queued_thumbnails += 1
+        future = self.submit(self.set_thumbnail, video_id, path)
+        future.add_done_callback(partial(self._on_thumbnail_done, video_id))
+        return future
+
+    def _on_thumbnail_done(self, video_id: str, future: Future[None]) -> None:
+        e = None if future.cancelled() else future.exception()
+        with self._lock:
+            self._queued_thumbnails -= 1
+            if e is not None:
+                self._thumbnail_failures[video_id] = e
+        if e is not None:
+            logger.error("Failed to set the thumbnail of %s: %s", video_id, e)
+
     def _upsert_broadcast(  # noqa: PLR0913
         self,
         broadcast_id: str | None,
@@ -159,23 +471,11 @@ class Channel:
         category_id: models.VideoCategory = models.VideoCategory.NONPROFITS_AND_ACTIVISM,
         dry_run: bool = False,
     ) -> str:
-        self._assert_description_len(description)
-        privacy_status = "public" if is_public else "private"
-        body: dict[str, Any] = {
-            "snippet": {
-                "title": title,
-                "description": description,
-                "scheduledStartTime": utils.to_gcloud_datetime(scheduled_start_time),
-                "categoryId": str(category_id),
-            },
-            "status": {"privacyStatus": privacy_status, "selfDeclaredMadeForKids": True},
-        }
-
-        if scheduled_end_time is not None:
-            body["snippet"]["scheduledEndTime"] = utils.to_gcloud_datetime(scheduled_end_time)
-
+        body = create_broadcast_body(
+            broadcast_id, title, description, scheduled_start_time, scheduled_end_time, is_public, category_id
+        )
+        privacy_status = body["status"]["privacyStatus"]
         if broadcast_id is not None:
-            body["id"] = broadcast_id
             logger.info("Updating mass%s", " [DRY-RUN]" if dry_run else "")
             logger.info("ID: %s", broadcast_id)
 
@@ -207,32 +507,126 @@ class Channel:
                     body=body,
                 )
             )
+        self._invalidate_snapshot()
 
         video_id = cast("str", broadcast_response["id"])
 
-        # Update the video category
-        request_body = {"id": video_id, "snippet": body["snippet"]}
-        self._execute_with_retry(lambda resource: resource.videos().update(part="snippet", body=request_body))
+        # The category belongs to the video rather than the broadcast (no liveBroadcast part or listing carries it),
+        # so it is synced separately. Reading it first costs an extra round trip on update, but saves the 50 units
+        # of videos().update whenever it is already right (a videos().list costs 1):
+        if self.defer_category:
+            with self._lock:
+                self._pending_categories[video_id] = body["snippet"]
+        elif broadcast_id is None or self._get_categories([video_id]).get(video_id) != body["snippet"]["categoryId"]:
+            # a new video always starts with the default category of the channel
+            self._update_category(video_id, body["snippet"])
 
         return video_id
 
-    @cached_property
+    def _get_categories(self, video_ids: list[str]) -> dict[str, str]:
+        """Gets the current category of each video."""
+        categories: dict[str, str] = {}
+        for batch_ids in _chunk(video_ids, constants.MAX_PAGE_SIZE):
+            response = self._list_videos(",".join(batch_ids), constants.VIDEO_CATEGORY_FIELDS)
+            for item in response.get("items", []):
+                categories[item["id"]] = item["snippet"]["categoryId"]
+        return categories
+
+    def _list_videos(self, video_ids: str, fields: str) -> dict[str, Any]:
+        return self._execute_with_retry(
+            lambda resource: resource.videos().list(part="snippet", id=video_ids, fields=fields)
+        )
+
+    def _update_category(self, video_id: str, snippet: dict[str, Any]) -> None:
+        request_body = {"id": video_id, "snippet": snippet}
+        self._execute_with_retry(lambda resource: resource.videos().update(part="snippet", body=request_body))
+
+    @property
+    def _resource(self) -> Resource:
+        """Gets the Resource of the current thread, building it if needed."""
+        resource: Resource | None = getattr(self._local, "resource", None)
+        if resource is None or getattr(self._local, "generation", None) != self._generation:
+            resource = self._build_resource()
+            self._local.resource = resource
+            self._local.generation = self._generation
+        return resource
+
+    @metrics.instrumented("channel.build_resource")
     @retry(
         retry=retry_if_exception(lambda exception: isinstance(exception, AttributeError)),
         wait=wait_exponential(),
         stop=stop_after_attempt(constants.MAX_RETRIES),
     )
-    def _resource(self) -> Resource:
+    def _build_resource(self) -> Resource:
         logger.debug("Creating Resource")
-        credentials = self.creds.create_oauth_credentials(self.SCOPES)
-        return build("youtube", "v3", credentials=credentials, cache_discovery=False)
+        if self._http_factory is not None:
+            return build("youtube", "v3", http=self._http_factory(), cache_discovery=False, static_discovery=True)
+        return build("youtube", "v3", credentials=self._get_credentials(), cache_discovery=False, static_discovery=True)
+
+    def _get_credentials(self) -> Credentials:
+        """Gets the credentials shared by the Resource of every thread."""
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = self.creds.create_oauth_credentials(self.SCOPES)
+                if self._background_refresh and self._refresher is None:
+                    self._refresher = self.creds.start_refresher(self._credentials)
+            return self._credentials
+
+    def _refresh_expiring_credentials(self) -> None:
+        """Refreshes the shared credentials ahead of the call if they are about to expire."""
+        credentials = self._credentials
+        if credentials is not None:
+            self.creds.refresh_if_expiring(credentials)
+
+    def _refresh_credentials(self) -> None:
+        """
+        Refreshes the shared credentials in place, which the Resource of every thread then uses.
+
+        The Resources are only rebuilt if there are no credentials to refresh, or they failed to be refreshed.
+        """
+        credentials = self._credentials
+        if credentials is None:
+            self._reset_resource()
+            return
+
+        self.creds.invalidate_token()
+        try:
+            credentials.refresh(Request())
+        except google.auth.exceptions.RefreshError:
+            logger.exception("Token failed to be refreshed", exc_info=False)
+            self._reset_resource()
 
     def _reset_resource(self) -> None:
         logger.debug("Resetting resource.")
-        self.__dict__.pop("_resource", None)
+        with self._lock:
+            self._generation += 1
+            self._credentials = None
+        self._stop_refresher()
         self.creds.invalidate_token()
 
-    def _get_pages(self, select_key: str, **kwargs: Any) -> Iterable[Any]:  # noqa: ANN401
+    def _stop_refresher(self) -> None:
+        with self._lock:
+            refresher, self._refresher = self._refresher, None
+        if refresher is not None:
+            refresher.stop()
+
+    def _get_pages(
+        self,
+        select_key: str,
+        fields: str | None = None,
+        max_results: int = constants.MAX_PAGE_SIZE,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> Iterable[Any]:
+        if fields is not None:
+            if "nextPageToken" not in fields:
+                fields = f"nextPageToken,{fields}"
+            kwargs["fields"] = fields
+
+        kwargs["maxResults"] = max_results
+        if self.broadcast_snapshot is not None:
+            yield from self._get_snapshot_pages(self.broadcast_snapshot, select_key, **kwargs)
+            return
+
         next_page_token: str | None = None
         start_idx = 0
         page_count = 1
@@ -247,7 +641,8 @@ class Channel:
                     ),
                 )
 
-            results = self._execute_with_retry(get_request)
+            with metrics.timed("channel.get_page"):
+                results = self._execute_with_retry(get_request)
             values = cast("list[dict[str, Any]]", results.get(select_key, []))
 
             total_len = start_idx + len(values)
@@ -262,43 +657,283 @@ class Channel:
             start_idx = total_len
             page_count += 1
 
-    @retry(
-        retry=retry_if_exception(
-            lambda exception: isinstance(exception, (google.auth.exceptions.RefreshError, HttpError))
-        ),
-        wait=wait_exponential(),
-        stop=stop_after_attempt(constants.MAX_RETRIES),
-    )
+    def _get_snapshot_pages(
+        self,
+        broadcast_snapshot: snapshot.BroadcastSnapshot,
+        select_key: str,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> Iterable[Any]:
+        """Gets the pages from the snapshot, revalidating each page against its ETag once it is stale."""
+        if "fields" in kwargs and "etag" not in kwargs["fields"]:
+            kwargs["fields"] = f"etag,{kwargs['fields']}"
+
+        key = broadcast_snapshot.key(**kwargs)
+        if broadcast_snapshot.is_fresh(key, self.max_age):
+            logger.debug("Listing %s from %s", select_key, broadcast_snapshot.path)
+            for page in broadcast_snapshot.get_pages(key):
+                yield from page["items"]
+            return
+
+        pages: list[dict[str, Any]] = []
+        next_page_token: str | None = None
+        not_modified_count = 0
+        while True:
+            cached_page = broadcast_snapshot.get_page(key, next_page_token)
+
+            def get_request(
+                resource: Resource,
+                next_page_token: str | None = next_page_token,
+                cached_page: dict[str, Any] | None = cached_page,
+            ) -> HttpRequest:
+                request = cast("HttpRequest", resource.liveBroadcasts().list(pageToken=next_page_token, **kwargs))
+                if cached_page is not None and cached_page["etag"]:
+                    request.headers["If-None-Match"] = cached_page["etag"]
+                return request
+
+            try:
+                with metrics.timed("channel.get_page"):
+                    results = self._execute_with_retry(get_request)
+                page = {
+                    "page_token": next_page_token,
+                    "etag": results.get("etag"),
+                    "next_page_token": results.get("nextPageToken"),
+                    "items": results.get(select_key, []),
+                }
+            except HttpError as e:
+                if e.status_code != HTTPStatus.NOT_MODIFIED or cached_page is None:
+                    raise
+                page = cached_page
+                not_modified_count += 1
+
+            pages.append(page)
+            yield from page["items"]
+
+            next_page_token = page["next_page_token"]
+            if next_page_token is None:
+                break
+
+        logger.debug("Refreshed %d pages (%d not modified)", len(pages), not_modified_count)
+        broadcast_snapshot.put_pages(key, pages)
+
+    def _invalidate_snapshot(self) -> None:
+        if self.broadcast_snapshot is not None:
+            self.broadcast_snapshot.invalidate()
+
     def _execute_with_retry(self, request_factory: Callable[[Resource], HttpRequest]) -> dict[str, Any]:
+        return self.retry_policy.retrying("channel.execute")(self._execute, request_factory)
+
+    def _execute(self, request_factory: Callable[[Resource], HttpRequest]) -> dict[str, Any]:
         try:
-            return request_factory(self._resource).execute()
+            with self.retry_policy.guard():
+                self._refresh_expiring_credentials()
+                request = request_factory(self._resource)
+                self._charge(request)
+                if metrics.is_enabled():
+                    _measure_bytes(request)
+                with metrics.timed("channel.execute", method=request.methodId):
+                    return request.execute()
         except HttpError as e:
-            if e.status_code == HTTPStatus.FORBIDDEN:
+            if self.retry_policy.classify(e) is retries.ErrorKind.AUTH:
                 logger.exception("Token failed to be refreshed", exc_info=False)
-                self._reset_resource()
+                self._refresh_credentials()
             raise
         except google.auth.exceptions.RefreshError:
             logger.exception("Token failed to be refreshed", exc_info=False)
             self._reset_resource()
             raise
 
-    @staticmethod
-    def _parse_datetime(date_string: str | None) -> datetime.datetime | None:
-        return utils.parse_gcloud_datetime(date_string) if date_string is not None else None
-
-    @staticmethod
-    def _create_live_stream_from_item(item: dict[str, Any]) -> models.LiveStream:
-        snippet = item["snippet"]
-        scheduled_start = Channel._parse_datetime(snippet.get("scheduledStartTime"))
-        published = Channel._parse_datetime(snippet.get("publishedAt"))
-        actual_start = Channel._parse_datetime(snippet.get("actualStartTime"))
-        actual_end = Channel._parse_datetime(snippet.get("actualEndTime"))
-        return models.LiveStream(
-            item["id"], snippet["title"], snippet["description"], published, scheduled_start, actual_start, actual_end
+    def _charge(self, request: HttpRequest) -> None:
+        """Charges the request to the quota ledger, raising a QuotaExceededError if it is over the budget."""
+        if self.quota_ledger is not None:
+            self.quota_ledger.charge(request.methodId)
+
+    def _list_livestreams(
+        self, broadcast_status: models.BroadcastStatus, fields: str = constants.LIVE_STREAM_FIELDS
+    ) -> Iterable[models.LiveStream]:
+        return map(
+            create_live_stream,
+            self.broadcasts(broadcast_status, models.BroadcastType.EVENT, fields),
         )
 
-    @staticmethod
-    def _assert_description_len(description: str) -> None:
-        if len(description) > constants.MAX_DESCRIPTION_LENGTH:
-            msg = f"Description is larger than {constants.MAX_DESCRIPTION_LENGTH}"
-            raise ValueError(msg)
+    def _delete_batch(self, pending: list[str], results: dict[str, bool]) -> dict[str, BaseException]:
+        """
+        Deletes the pending broadcasts, recording the outcome in results.
+
+        The pending list is replaced with the ids that should be retried, which are returned with their error.
+        """
+        failed: dict[str, BaseException] = {}
+
+        def callback(request_id: str, _response: Any, exception: HttpError | None) -> None:  # noqa: ANN401
+            if exception is None:
+                results[request_id] = True
+                logger.info("Broadcast with ID %s has been deleted.", request_id)
+                return
+
+            logger.warning("Failed to delete broadcast with ID %s: %s", request_id, exception.reason)
+            if self.retry_policy.is_retryable(exception):
+                failed[request_id] = exception
+
+        def delete(resource: Resource, broadcast_id: str) -> HttpRequest:
+            return resource.liveBroadcasts().delete(id=broadcast_id)
+
+        batches = _chunk(pending, constants.MAX_BATCH_SIZE)
+        if len(batches) > 1 and self._workers > 1:
+            for batch_failed in self.executor.map(
+                lambda batch_ids: self._execute_batch(batch_ids, delete, callback), batches
+            ):
+                failed.update(batch_failed)
+        else:
+            for batch_ids in batches:
+                failed.update(self._execute_batch(batch_ids, delete, callback))
+
+        pending[:] = failed
+        return failed
+
+    def _update_categories_batch(
+        self, pending: list[str], snippets: dict[str, dict[str, Any]], results: dict[str, bool]
+    ) -> dict[str, BaseException]:
+        """
+        Updates the snippet, and so the category, of the pending videos, recording the outcome in results.
+
+        The pending list is replaced with the ids that should be retried, which are returned with their error.
+        """
+        failed: dict[str, BaseException] = {}
+
+        def callback(request_id: str, _response: Any, exception: HttpError | None) -> None:  # noqa: ANN401
+            if exception is None:
+                results[request_id] = True
+                return
+
+            logger.warning("Failed to update the category of video with ID %s: %s", request_id, exception.reason)
+            if self.retry_policy.is_retryable(exception):
+                failed[request_id] = exception
+
+        def update(resource: Resource, video_id: str) -> HttpRequest:
+            return resource.videos().update(part="snippet", body={"id": video_id, "snippet": snippets[video_id]})
+
+        for batch_ids in _chunk(pending, constants.MAX_BATCH_SIZE):
+            failed.update(self._execute_batch(batch_ids, update, callback))
+
+        pending[:] = failed
+        return failed
+
+    def _execute_batch(
+        self,
+        batch_ids: list[str],
+        request_factory: Callable[[Resource, str], HttpRequest],
+        callback: Callable[[str, Any, HttpError | None], None],
+    ) -> dict[str, BaseException]:
+        """
+        Executes a single batch request of a request per id, returning the ids with the error if the whole batch
+        failed and is retryable.
+        """
+        self._refresh_expiring_credentials()
+        resource = self._resource
+        batch = resource.new_batch_http_request(callback=callback)
+        quota_exceeded: quota.QuotaExceededError | None = None
+        added_ids: list[str] = []
+        for request_id in batch_ids:
+            request = request_factory(resource, request_id)
+            try:
+                self._charge(request)
+            except quota.QuotaExceededError as e:
+                # the requests which fit in the budget are still sent
+                quota_exceeded = e
+                break
+            batch.add(request, request_id=request_id)
+            added_ids.append(request_id)
+
+        logger.debug("Executing batch of %d requests", len(added_ids))
+        try:
+            if added_ids:
+                with self.retry_policy.guard(), metrics.timed("channel.execute_batch"):
+                    batch.execute()
+        except HttpError as e:
+            if self.retry_policy.classify(e) is retries.ErrorKind.AUTH:
+                logger.exception("Token failed to be refreshed", exc_info=False)
+                self._refresh_credentials()
+            else:
+                logger.warning("Failed to execute batch: %s", e.reason)
+            return dict.fromkeys(batch_ids, e) if self.retry_policy.is_retryable(e) else {}
+        except google.auth.exceptions.RefreshError as e:
+            logger.exception("Token failed to be refreshed", exc_info=False)
+            self._reset_resource()
+            return dict.fromkeys(batch_ids, e)
+
+        if quota_exceeded is not None:
+            raise quota_exceeded
+        return {}
+
+
+def create_broadcast_body(  # noqa: PLR0913
+    broadcast_id: str | None,
+    title: str,
+    description: str,
+    scheduled_start_time: datetime.datetime,
+    scheduled_end_time: datetime.datetime | None = None,
+    is_public: bool = False,
+    category_id: models.VideoCategory = models.VideoCategory.NONPROFITS_AND_ACTIVISM,
+) -> dict[str, Any]:
+    """Creates the liveBroadcast resource sent to liveBroadcasts().insert/update."""
+    if len(description) > constants.MAX_DESCRIPTION_LENGTH:
+        msg = f"Description is larger than {constants.MAX_DESCRIPTION_LENGTH}"
+        raise ValueError(msg)
+
+    body: dict[str, Any] = {
+        "snippet": {
+            "title": title,
+            "description": description,
+            "scheduledStartTime": utils.to_gcloud_datetime(scheduled_start_time),
+            "categoryId": str(category_id),
+        },
+        "status": {"privacyStatus": "public" if is_public else "private", "selfDeclaredMadeForKids": True},
+    }
+
+    if scheduled_end_time is not None:
+        body["snippet"]["scheduledEndTime"] = utils.to_gcloud_datetime(scheduled_end_time)
+
+    if broadcast_id is not None:
+        body["id"] = broadcast_id
+
+    return body
+
+
+def _scan_eligible_for_deletion(
+    streams: Iterable[models.LiveStream], deletion_watermark: watermark.DeletionWatermark
+) -> Iterator[models.LiveStream]:
+    after = deletion_watermark.after
+    for stream in streams:
+        if after is not None and stream.scheduled_start is not None and stream.scheduled_start <= after:
+            logger.debug("Stopping at %s which is at or before the deletion watermark %s", stream.id, after)
+            return
+        deletion_watermark.evaluated(stream)
+        if stream.is_eligible_for_deletion():
+            yield stream
+
+
+def create_live_stream(item: dict[str, Any]) -> models.LiveStream:
+    """Creates a LiveStream from a liveBroadcast resource."""
+    snippet = item.get("snippet", {})
+    scheduled_start = _parse_datetime(snippet.get("scheduledStartTime"))
+    scheduled_end = _parse_datetime(snippet.get("scheduledEndTime"))
+    published = _parse_datetime(snippet.get("publishedAt"))
+    actual_start = _parse_datetime(snippet.get("actualStartTime"))
+    actual_end = _parse_datetime(snippet.get("actualEndTime"))
+    item_status = item.get("status", {})
+    status = models.BroadcastStatus.from_life_cycle_status(item_status.get("lifeCycleStatus"))
+    return models.LiveStream(
+        item["id"],
+        snippet.get("title", ""),
+        snippet.get("description", ""),
+        published,
+        scheduled_start,
+        actual_start,
+        actual_end,
+        status,
+        scheduled_end,
+        item_status.get("privacyStatus"),
+    )
+
+
+def _parse_datetime(date_string: str | None) -> datetime.datetime | None:
+    return utils.parse_gcloud_datetime(date_string) if date_string is not None else None
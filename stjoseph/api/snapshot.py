@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from stjoseph.api import utils
+
+if TYPE_CHECKING:
+    import datetime
+    from collections.abc import Iterable
+    from os import PathLike
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastSnapshot:
+    """
+    A local snapshot of the pages returned from liveBroadcasts().list.
+
+    Each page is stored along with its ETag so that it can be revalidated using If-None-Match,
+    unchanged pages are then answered with a 304 and served from the snapshot.
+    """
+
+    def __init__(self, path: PathLike) -> None:
+        self._path = Path(path)
+        self.__queries: dict[str, dict[str, Any]] | None = None
+        self._lock = threading.RLock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @staticmethod
+    def key(**kwargs: Any) -> str:  # noqa: ANN401
+        """Gets the key of the query identified by the liveBroadcasts().list parameters."""
+        return json.dumps(kwargs, sort_keys=True)
+
+    def is_fresh(self, key: str, max_age: datetime.timedelta | None) -> bool:
+        """Determines if the query was refreshed within max_age."""
+        query = self._queries.get(key)
+        if max_age is None or query is None or query.get("refreshed_at") is None:
+            return False
+        return time.time() - query["refreshed_at"] <= max_age.total_seconds()
+
+    def get_page(self, key: str, page_token: str | None) -> dict[str, Any] | None:
+        """Gets the page previously returned for the page_token."""
+        query = self._queries.get(key)
+        if query is None:
+            return None
+        return next((p for p in query["pages"] if p["page_token"] == page_token), None)
+
+    def get_pages(self, key: str) -> list[dict[str, Any]]:
+        query = self._queries.get(key)
+        return [] if query is None else query["pages"]
+
+    def put_pages(self, key: str, pages: Iterable[dict[str, Any]]) -> None:
+        """Replaces the pages of the query, marking it as refreshed."""
+        with self._lock:
+            self._queries[key] = {"refreshed_at": time.time(), "pages": list(pages)}
+            self._save()
+
+    def invalidate(self) -> None:
+        """
+        Marks every query as stale, the ETags are kept so that the next refresh is still conditional.
+
+        The snapshot is only rewritten if a query was fresh, so invalidating an already stale snapshot is free.
+        """
+        with self._lock:
+            if all(query.get("refreshed_at") is None for query in self._queries.values()):
+                return
+            logger.debug("Invalidating %s", self._path)
+            for query in self._queries.values():
+                query["refreshed_at"] = None
+            self._save()
+
+    @property
+    def _queries(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            if self.__queries is None:
+                self.__queries = {}
+                if self._path.exists():
+                    with contextlib.suppress(ValueError, KeyError):
+                        self.__queries = json.loads(self._path.read_text())["queries"]
+            return self.__queries
+
+    def _save(self) -> None:
+        logger.debug("Saving snapshot to %s", self._path)
+        utils.write_text_atomic(self._path, json.dumps({"queries": self._queries}))
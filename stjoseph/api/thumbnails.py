@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from stjoseph.api import constants, utils
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from os import PathLike
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(path: PathLike, chunk_size: int = constants.THUMBNAIL_CHUNK_SIZE) -> str:
+    """Gets the sha256 hex digest of the contents of the file."""
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ThumbnailManager:
+    """
+    Records which broadcasts already have a thumbnail, keyed by the sha256 of the image.
+
+    Setting the same image on a broadcast again is then skipped rather than re-uploaded. The broadcasts whose
+    thumbnail is still to be set are recorded as pending, so that a later run sets it if this one does not.
+    """
+
+    def __init__(self, path: PathLike) -> None:
+        self._path = Path(path)
+        self.__thumbnails: dict[str, list[str]] | None = None
+        self.__pending: list[str] = []
+        self._digests: dict[tuple[Path, int, int], str] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def digest(self, path: PathLike) -> str:
+        """Gets the sha256 of the image, which is only re-hashed once the file has changed."""
+        path = Path(path).resolve()
+        stat = path.stat()
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._digests.get(key)
+            if digest is None:
+                digest = self._digests[key] = hash_file(path)
+            return digest
+
+    def has_thumbnail(self, video_id: str, digest: str) -> bool:
+        """Determines if the image with the digest has been set on the video."""
+        return video_id in self._thumbnails.get(digest, [])
+
+    def get_digest(self, video_id: str) -> str | None:
+        """Gets the digest of the image recorded as set on the video, None if there is no record of it."""
+        with self._lock:
+            return next((digest for digest, video_ids in self._thumbnails.items() if video_id in video_ids), None)
+
+    def pending(self) -> list[str]:
+        """Gets the videos whose thumbnail is still to be set."""
+        with self._lock:
+            return [*self._pending]
+
+    def add_pending(self, video_id: str) -> None:
+        """Records that the thumbnail of the video is to be set, until it is recorded (or discarded)."""
+        with self._lock:
+            if video_id not in self._pending:
+                self._pending.append(video_id)
+                self._save()
+
+    def discard_pending(self, video_id: str) -> None:
+        """Discards the video from the pending ones, without recording any image as set on it."""
+        with self._lock:
+            if video_id in self._pending:
+                self._pending.remove(video_id)
+                self._save()
+
+    def record(self, video_id: str, digest: str) -> None:
+        """Records that the image with the digest has been set on the video, replacing any previous (or pending) one."""
+        with self._lock:
+            self._discard(video_id)
+            self._thumbnails.setdefault(digest, []).append(video_id)
+            self._save()
+
+    def forget(self, video_ids: Iterable[str]) -> None:
+        """Forgets the thumbnails of the videos (e.g. once they have been deleted), including the pending ones."""
+        with self._lock:
+            discarded = [video_id for video_id in video_ids if self._discard(video_id)]
+            if discarded:
+                self._save()
+
+    def _discard(self, video_id: str) -> bool:
+        discarded = False
+        if video_id in self._pending:
+            self._pending.remove(video_id)
+            discarded = True
+        for digest, video_ids in list(self._thumbnails.items()):
+            if video_id in video_ids:
+                video_ids.remove(video_id)
+                discarded = True
+                if not video_ids:
+                    del self._thumbnails[digest]
+        return discarded
+
+    @property
+    def _thumbnails(self) -> dict[str, list[str]]:
+        return self._load()[0]
+
+    @property
+    def _pending(self) -> list[str]:
+        return self._load()[1]
+
+    def _load(self) -> tuple[dict[str, list[str]], list[str]]:
+        with self._lock:
+            if self.__thumbnails is None:
+                self.__thumbnails = {}
+                if self._path.exists():
+                    with contextlib.suppress(ValueError, KeyError):
+                        data = json.loads(self._path.read_text())
+                        self.__thumbnails = data["thumbnails"]
+                        self.__pending = data.get("pending", [])
+            return self.__thumbnails, self.__pending
+
+    def _save(self) -> None:
+        logger.debug("Saving thumbnails to %s", self._path)
+        data = {"thumbnails": self._thumbnails, "pending": self._pending}
+        utils.write_text_atomic(self._path, json.dumps(data))
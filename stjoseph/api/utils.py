@@ -1,11 +1,40 @@
 from __future__ import annotations
 
+import contextlib
 import datetime
+import os
+import sys
+import threading
+from typing import IO, TYPE_CHECKING, cast
 
 import dateutil.tz
 
 from stjoseph.api import constants, models
 
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+    import pytz
+
+if sys.platform == "win32":
+    import msvcrt
+
+    def _lock_file(file: IO[bytes]) -> None:
+        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(file: IO[bytes]) -> None:
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+else:
+    import fcntl
+
+    def _lock_file(file: IO[bytes]) -> None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(file: IO[bytes]) -> None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
 
 def parse_gcloud_datetime(date_string: str) -> datetime.datetime:
     """Parses a Google Cloud API Date String"""
@@ -63,6 +92,17 @@ def add_months(dt: datetime.date, months_to_add: int) -> datetime.date:
     )
 
 
+def today() -> datetime.date:
+    """Gets today's date in the parish timezone"""
+    return datetime.datetime.now(tz=constants.DEFAULT_TIMEZONE).date()
+
+
+def start_of_day(date: datetime.date) -> datetime.datetime:
+    """Gets the start of the date in the parish timezone"""
+    timezone = cast("pytz.BaseTzInfo", constants.DEFAULT_TIMEZONE)
+    return timezone.localize(datetime.datetime(date.year, date.month, date.day))  # noqa: DTZ001
+
+
 def get_next_christmas_pageant() -> datetime.datetime:
     now = datetime.datetime.now(tz=constants.DEFAULT_TIMEZONE)
     year = now.year
@@ -78,3 +118,44 @@ def get_next_christmas_pageant() -> datetime.datetime:
         0,
         tzinfo=constants.DEFAULT_TIMEZONE,
     )
+
+
+def write_text_atomic(path: Path, data: str) -> None:
+    """Writes the data to a temporary file which then replaces path, so readers never see a partial file."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(data)
+    tmp_path.replace(path)
+
+
+class FileLock:
+    """An exclusive lock, held against the other threads and processes through a file (reentrant within a thread)."""
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @contextlib.contextmanager
+    def hold(self) -> Iterator[None]:
+        with self._thread_lock:
+            if self._depth > 0:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with self._path.open("a+b") as file:
+                _lock_file(file)
+                self._depth = 1
+                try:
+                    yield
+                finally:
+                    self._depth = 0
+                    _unlock_file(file)
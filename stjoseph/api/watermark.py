@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import contextlib
+import datetime
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from stjoseph.api import utils
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from os import PathLike
+
+    from stjoseph.api import models
+
+logger = logging.getLogger(__name__)
+
+_RESOLUTION = datetime.timedelta(microseconds=1)
+
+
+class DeletionWatermark:
+    """
+    Records how far back the completed broadcasts have been settled for deletion.
+
+    A completed broadcast is settled once it has been evaluated and is either not eligible for deletion or
+    has been deleted, so that later scans of the broadcasts (which are listed newest first) stop at the watermark.
+    The watermark never passes a broadcast which was eligible but not deleted, nor the start of today
+    (as a broadcast of today only becomes eligible tomorrow).
+    """
+
+    def __init__(self, path: PathLike, full: bool = False) -> None:
+        """
+        Args:
+            path (PathLike): The file the watermark is stored in.
+            full (bool): Whether the broadcasts are all scanned again, ignoring (then replacing) the stored watermark.
+        """
+        self._path = Path(path)
+        self._full = full
+        self.__stored: datetime.datetime | None = None
+        self.__loaded = False
+        self._newest: datetime.datetime | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def stored(self) -> datetime.datetime | None:
+        """Gets the scheduled start the broadcasts have been settled up to, if any."""
+        if not self.__loaded:
+            with contextlib.suppress(FileNotFoundError, KeyError, ValueError):
+                self.__stored = datetime.datetime.fromisoformat(json.loads(self._path.read_text())["scheduled_start"])
+            self.__loaded = True
+        return self.__stored
+
+    @property
+    def after(self) -> datetime.datetime | None:
+        """Gets the scheduled start the scan stops at, or None to scan every broadcast."""
+        return None if self._full else self.stored
+
+    def evaluated(self, stream: models.LiveStream) -> None:
+        """Records that the completed broadcast has been evaluated by the scan."""
+        if stream.scheduled_start is None:
+            return
+        with self._lock:
+            if self._newest is None or stream.scheduled_start > self._newest:
+                self._newest = stream.scheduled_start
+
+    def advance(self, unsettled: Iterable[models.LiveStream] = ()) -> datetime.datetime | None:
+        """
+        Moves the watermark up to the newest broadcast evaluated, short of the unsettled ones, and saves it.
+
+        Args:
+            unsettled (Iterable[LiveStream]): The evaluated broadcasts which were eligible but not deleted.
+        """
+        with self._lock:
+            if self._newest is None:
+                return self.stored
+
+            limits = [self._newest, utils.start_of_day(utils.today()) - _RESOLUTION]
+            limits.extend(stream.scheduled_start - _RESOLUTION for stream in unsettled if stream.scheduled_start)
+            value = min(limits)
+            if not self._full and self.stored is not None and value < self.stored:
+                return self.stored
+
+            logger.info("Advancing the deletion watermark to %s", value)
+            data = {"scheduled_start": value.isoformat(), "updated": datetime.datetime.now(datetime.UTC).isoformat()}
+            utils.write_text_atomic(self._path, json.dumps(data, indent=1))
+            self.__stored = value
+            self.__loaded = True
+            return value
@@ -1,6 +1,3 @@
-from stjoseph.commands import channel
 from stjoseph.commands.common import cli
 
 __all__ = ["cli"]
-
-del channel
@@ -1,104 +1,125 @@
 from __future__ import annotations
 
-import asyncio
 import datetime
+import functools
 import logging
-from typing import TYPE_CHECKING, Final
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
 import asyncclick as click
-from catholic_mass_readings import USCCB, models
 
-from stjoseph.api import constants, generators, oauth2, services, utils
-from stjoseph.commands.common import cli
+from stjoseph.api import cassette, constants, export, oauth2, quota, services, watermark
+from stjoseph.api.models import BroadcastStatus
+from stjoseph.commands.common import (
+    create_quota_ledger,
+    create_snapshot,
+    create_thumbnail_manager,
+    export_options,
+    export_streams,
+    quota_exceeded,
+)
 
 if TYPE_CHECKING:
     from os import PathLike
 
-    from catholic_mass_readings.models import Mass
+    import httplib2
+
+    from stjoseph.api.services.async_channel import AuthorizedSession
 
 logger = logging.getLogger(__name__)
 
-_TODAY: Final[str] = USCCB.today().strftime(constants.DATE_FMT)
-_TYPES: Final[list[str]] = [t.name for t in models.MassType]
-_CHRISTMAS_PAGENT: Final[str] = utils.get_next_christmas_pageant().strftime(constants.DATE_TIME_FMT)
 
+def create_channel(
+    credentials: PathLike,
+    token: PathLike,
+    quota_budget: int | None = None,
+    **kwargs: Any,  # noqa: ANN401
+) -> services.Channel:
+    """
+    Creates the Channel, with its snapshot, thumbnails and quota usage stored next to the token file,
+    and its credentials refreshed in the background before they expire.
+
+    If a cassette is installed, then the Channel records to (or replays from) it instead, without the files,
+    so that the requests made only depend on the command and a replay leaves the local state untouched.
+    """
+    creds = oauth2.CredentialsManager(credentials, token)
+    active = cassette.get_active()
+    if active is not None:
+        kwargs.setdefault("http_factory", active.http_factory(functools.partial(_create_authorized_http, creds)))
+        return services.Channel(creds, **kwargs)
+
+    return services.Channel(
+        creds,
+        create_snapshot(token),
+        thumbnail_manager=create_thumbnail_manager(token),
+        quota_ledger=create_quota_ledger(token, quota_budget),
+        background_refresh=kwargs.pop("background_refresh", True),
+        **kwargs,
+    )
+
+
+def create_async_channel(
+    credentials: PathLike,
+    token: PathLike,
+    quota_budget: int | None = None,
+    **kwargs: Any,  # noqa: ANN401
+) -> services.AsyncChannel:
+    """
+    Creates the AsyncChannel, sharing the snapshot, thumbnails and quota usage of create_channel.
+
+    If a cassette is installed, then the AsyncChannel records to (or replays from) it instead, without the files.
+    """
+    creds = oauth2.CredentialsManager(credentials, token)
+    active = cassette.get_active()
+    if active is not None:
+        kwargs.setdefault(
+            "session_factory", active.session_factory(functools.partial(_create_authorized_session, creds))
+        )
+        return services.AsyncChannel(creds, **kwargs)
 
-def _get_mass_types(ctx: click.Context, param: click.Option, value: tuple[str, ...]) -> list[models.MassType] | None:
-    return list(map(models.MassType, value)) if value else None
+    return services.AsyncChannel(
+        creds,
+        create_snapshot(token),
+        thumbnail_manager=create_thumbnail_manager(token),
+        quota_ledger=create_quota_ledger(token, quota_budget),
+        **kwargs,
+    )
 
 
-@cli.command()
-@click.option(
-    "-c",
-    "--credentials",
-    type=click.Path(exists=True, dir_okay=False),
-    default=constants.CREDENTIALS_FILE,
-    help="The path to the credentials file",
-)
-@click.option(
-    "--token",
-    type=click.Path(exists=False, dir_okay=False),
-    default=constants.TOKEN_FILE,
-    help="The path to the token file",
-)
-def list_mass_schedules(credentials: PathLike, token: PathLike) -> None:
-    creds = oauth2.CredentialsManager(credentials, token)
-    channel_svc = services.Channel(creds)
-    streams = channel_svc.list_scheduled_livestreams()
-    for stream in streams:
-        print(stream)  # noqa: T201
+def _create_authorized_http(creds: oauth2.CredentialsManager) -> httplib2.Http:
+    from google_auth_httplib2 import AuthorizedHttp  # noqa: PLC0415
+    from googleapiclient.http import build_http  # noqa: PLC0415
 
+    return AuthorizedHttp(creds.create_oauth_credentials(services.Channel.SCOPES), http=build_http())
 
-@cli.command()
-@click.option(
-    "-c",
-    "--credentials",
-    type=click.Path(exists=True, dir_okay=False),
-    default=constants.CREDENTIALS_FILE,
-    help="The path to the credentials file",
-)
-@click.option(
-    "--token",
-    type=click.Path(exists=False, dir_okay=False),
-    default=constants.TOKEN_FILE,
-    help="The path to the token file",
-)
-def list_past_mass_schedules(credentials: PathLike, token: PathLike) -> None:
-    creds = oauth2.CredentialsManager(credentials, token)
-    channel_svc = services.Channel(creds)
-    streams = channel_svc.list_completed_livestreams()
-    for stream in streams:
-        print(stream)  # noqa: T201
 
+def _create_authorized_session(creds: oauth2.CredentialsManager) -> AuthorizedSession:
+    from stjoseph.api.services.async_channel import AuthorizedSession  # noqa: PLC0415
 
-@cli.command()
-@click.option(
-    "-c",
-    "--credentials",
-    type=click.Path(exists=True, dir_okay=False),
-    default=constants.CREDENTIALS_FILE,
-    help="The path to the credentials file",
-)
-@click.option(
-    "--token",
-    type=click.Path(exists=False, dir_okay=False),
-    default=constants.TOKEN_FILE,
-    help="The path to the token file",
+    return AuthorizedSession(creds)
+
+
+def _create_watermark(token: PathLike, full: bool) -> watermark.DeletionWatermark | None:
+    """Creates the deletion watermark stored next to the token file, unless a cassette is installed."""
+    if cassette.get_active() is not None:
+        return None
+    return watermark.DeletionWatermark(Path(token).with_name(constants.WATERMARK_FILE_NAME), full)
+
+
+_full_option = click.option(
+    "--full",
+    is_flag=True,
+    help="Scan every completed broadcast again, rather than only those scheduled after the deletion watermark",
 )
-def list_eligible_for_deletion(credentials: PathLike, token: PathLike) -> None:
-    creds = oauth2.CredentialsManager(credentials, token)
-    channel_svc = services.Channel(creds)
-    streams = channel_svc.list_eligible_for_deletion()
-    any_eligible_for_deletion = False
-    for stream in streams:
-        any_eligible_for_deletion = True
-        print(stream)  # noqa: T201
-    if not any_eligible_for_deletion:
-        logger.info("No eligible broadcasts found.")
-        return
 
 
-@cli.command()
+def _log_failed_deletions(results: dict[str, bool]) -> None:
+    failed = sorted(broadcast_id for broadcast_id, deleted in results.items() if not deleted)
+    if failed:
+        logger.error("Failed to delete %d of %d broadcasts: %s", len(failed), len(results), failed)
+
+
+@click.command()
 @click.option(
     "-c",
     "--credentials",
@@ -113,32 +134,27 @@ def list_eligible_for_deletion(credentials: PathLike, token: PathLike) -> None:
     help="The path to the token file",
 )
 @click.option(
-    "--dry-run",
-    type=bool,
-    is_flag=True,
-    help="Flag indicating whether this is a dry-run",
+    "--max-age",
+    type=click.IntRange(min=0),
+    default=0,
+    help="The number of minutes the local snapshot of the broadcasts is used before being revalidated",
 )
-def delete_eligible(credentials: PathLike, token: PathLike, dry_run: bool) -> None:
-    creds = oauth2.CredentialsManager(credentials, token)
-    channel_svc = services.Channel(creds)
-    streams = channel_svc.list_eligible_for_deletion()
-    any_eligible_for_deletion = False
-    for stream in streams:
-        any_eligible_for_deletion = True
-        if dry_run is False:
-            channel_svc.delete_broadcast(stream.id)
-        else:
-            print(stream)  # noqa: T201
-    if not any_eligible_for_deletion:
-        logger.info("No eligible broadcasts found.")
-        return
+@export_options
+def list_mass_schedules(  # noqa: PLR0913
+    credentials: PathLike,
+    token: PathLike,
+    max_age: int,
+    export_format: export.ExportFormat,
+    limit: int | None,
+    since: datetime.datetime | None,
+    until: datetime.datetime | None,
+) -> None:
+    channel_svc = create_channel(credentials, token, max_age=datetime.timedelta(minutes=max_age))
+    streams = channel_svc.list_scheduled_livestreams()
+    export_streams(streams, export_format, limit, since, until)
 
 
-@cli.command()
-@click.argument(
-    "broadcast_id",
-    type=str,
-)
+@click.command()
 @click.option(
     "-c",
     "--credentials",
@@ -152,13 +168,28 @@ def delete_eligible(credentials: PathLike, token: PathLike, dry_run: bool) -> No
     default=constants.TOKEN_FILE,
     help="The path to the token file",
 )
-def delete_broadcast(broadcast_id: str, credentials: PathLike, token: PathLike) -> None:
-    creds = oauth2.CredentialsManager(credentials, token)
-    channel_svc = services.Channel(creds)
-    channel_svc.delete_broadcast(broadcast_id)
+@click.option(
+    "--max-age",
+    type=click.IntRange(min=0),
+    default=0,
+    help="The number of minutes the local snapshot of the broadcasts is used before being revalidated",
+)
+@export_options
+def list_past_mass_schedules(  # noqa: PLR0913
+    credentials: PathLike,
+    token: PathLike,
+    max_age: int,
+    export_format: export.ExportFormat,
+    limit: int | None,
+    since: datetime.datetime | None,
+    until: datetime.datetime | None,
+) -> None:
+    channel_svc = create_channel(credentials, token, max_age=datetime.timedelta(minutes=max_age))
+    streams = channel_svc.list_completed_livestreams()
+    export_streams(streams, export_format, limit, since, until, newest_first=True)
 
 
-@cli.command()
+@click.command()
 @click.option(
     "-c",
     "--credentials",
@@ -173,53 +204,30 @@ def delete_broadcast(broadcast_id: str, credentials: PathLike, token: PathLike)
     help="The path to the token file",
 )
 @click.option(
-    "--dry-run",
-    type=bool,
-    is_flag=True,
-    help="Flag indicating whether this is a dry-run",
+    "--max-age",
+    type=click.IntRange(min=0),
+    default=0,
+    help="The number of minutes the local snapshot of the broadcasts is used before being revalidated",
 )
-def delete_duplicate_broadcasts(credentials: PathLike, token: PathLike, dry_run: bool) -> None:
-    creds = oauth2.CredentialsManager(credentials, token)
-    channel_svc = services.Channel(creds)
-    duplicate_broadcasts = channel_svc.get_duplicated_schedules_dates()
-    if not duplicate_broadcasts:
-        logger.info("No duplicate broadcasts found.")
-        return
-
-    for date, broadcast_ids in duplicate_broadcasts.items():
-        logger.info(
-            "Date: %s, has the following duplicated broadcast ids: %s",
-            date.strftime("%B %d, %Y - %-I:%M %p"),
-            sorted(broadcast_ids),
-        )
-        if dry_run is False:
-            for broadcast_id in broadcast_ids:
-                channel_svc.delete_broadcast(broadcast_id)
+@_full_option
+@export_options
+def list_eligible_for_deletion(  # noqa: PLR0913
+    credentials: PathLike,
+    token: PathLike,
+    max_age: int,
+    full: bool,
+    export_format: export.ExportFormat,
+    limit: int | None,
+    since: datetime.datetime | None,
+    until: datetime.datetime | None,
+) -> None:
+    channel_svc = create_channel(credentials, token, max_age=datetime.timedelta(minutes=max_age))
+    streams = channel_svc.list_eligible_for_deletion(deletion_watermark=_create_watermark(token, full))
+    if not export_streams(streams, export_format, limit, since, until, newest_first=True):
+        logger.info("No eligible broadcasts found.")
 
 
-@cli.command()
-@click.argument("date", type=click.DateTime([constants.DATE_TIME_FMT]))
-@click.option(
-    "-m",
-    "--mass-date",
-    type=click.DateTime([constants.DATE_FMT]),
-    help="The date of the mass to use for the contents of the liturgy",
-)
-@click.option(
-    "-e",
-    "--schedule-end",
-    type=click.DateTime([constants.DATE_TIME_FMT]),
-    help="The time when the broadcast is complete",
-)
-@click.option(
-    "-t",
-    "--type",
-    "types",
-    type=click.Choice(_TYPES, case_sensitive=False),
-    multiple=True,
-    help="The mass type",
-    callback=_get_mass_types,
-)
+@click.command()
 @click.option(
     "-c",
     "--credentials",
@@ -233,12 +241,6 @@ def delete_duplicate_broadcasts(credentials: PathLike, token: PathLike, dry_run:
     default=constants.TOKEN_FILE,
     help="The path to the token file",
 )
-@click.option(
-    "--public",
-    type=bool,
-    is_flag=True,
-    help="Flag indicating whether this is a public video",
-)
 @click.option(
     "--dry-run",
     type=bool,
@@ -246,77 +248,44 @@ def delete_duplicate_broadcasts(credentials: PathLike, token: PathLike, dry_run:
     help="Flag indicating whether this is a dry-run",
 )
 @click.option(
-    "--force",
-    type=bool,
-    is_flag=True,
-    help="Flag indicating whether to overwrite even if the mass exists.",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=constants.CHANNEL_WORKERS,
+    help="The number of YouTube calls made concurrently",
 )
-@click.pass_context
-async def schedule_mass(  # noqa: PLR0913
-    ctx: click.Context,
-    date: datetime.datetime,
-    schedule_end: datetime.datetime | None,
-    mass_date: datetime.datetime | None,
-    types: list[models.MassType] | None,
-    credentials: PathLike,
-    token: PathLike,
-    public: bool,
-    dry_run: bool,
-    force: bool,
+@click.option(
+    "--quota-budget",
+    type=click.IntRange(min=0),
+    help="The YouTube quota units which may be used today, the run stops before going over it and can be rerun",
+)
+@_full_option
+def delete_eligible(  # noqa: PLR0913
+    credentials: PathLike, token: PathLike, dry_run: bool, workers: int, quota_budget: int | None, full: bool
 ) -> None:
-    if mass_date is None:
-        mass_date = date
-        if utils.is_saturday_pm_mass(date):
-            mass_date = date + datetime.timedelta(days=1)
-            logger.info("Querying for mass on Sunday: %s", mass_date.date())
-
-    if schedule_end is None:
-        schedule_end = date + datetime.timedelta(hours=1)
-
-    creds = oauth2.CredentialsManager(credentials, token)
-    channel_svc = services.Channel(creds)
-
-    # Check if this mass is already scheduled:
-    scheduled_dates = channel_svc.get_scheduled_dates()
-    broadcast_id = scheduled_dates.get(date.astimezone(datetime.UTC))
-    if broadcast_id is not None:
-        if not force:
-            logger.warning("%s is already scheduled under %s.", date, broadcast_id)
+    channel_svc = create_channel(credentials, token, quota_budget, workers=workers)
+    deletion_watermark = _create_watermark(token, full)
+    try:
+        streams = list(channel_svc.list_eligible_for_deletion(deletion_watermark=deletion_watermark))
+        if not streams:
+            logger.info("No eligible broadcasts found.")
+        if dry_run:
+            for stream in streams:
+                print(stream)  # noqa: T201
             return
 
-        logger.info("%s is already scheduled under %s.", date, broadcast_id)
-
-    # Query the mass readings:
-    async with USCCB() as usccb:
-        mass = await usccb.get_mass_from_date(mass_date.date(), types)
+        results = channel_svc.delete_broadcasts(stream.id for stream in streams) if streams else {}
+    except quota.QuotaExceededError as e:
+        raise quota_exceeded(e) from e
 
-    if not mass:
-        logger.error("Failed to find a mass on %s", mass_date)
-        await ctx.aexit(1)
-        return
-
-    # Generate title/description and publish:
-    title = generators.generate_title(date, mass.title)
-    description = generators.generate_description(mass)
-    if broadcast_id is None:
-        channel_svc.schedule_broadcast(title, description, date, schedule_end, is_public=public, dry_run=dry_run)
-    else:
-        channel_svc.update_broadcast(
-            broadcast_id, title, description, date, schedule_end, is_public=public, dry_run=dry_run
-        )
+    _log_failed_deletions(results)
+    if deletion_watermark is not None:
+        deletion_watermark.advance(stream for stream in streams if not results[stream.id])
 
 
-@cli.command()
-@click.option("-s", "--start", type=click.DateTime([constants.DATE_FMT]), default=_TODAY)
-@click.option("-e", "--end", type=click.DateTime([constants.DATE_FMT]))
-@click.option(
-    "-t",
-    "--type",
-    "types",
-    type=click.Choice(_TYPES, case_sensitive=False),
-    multiple=True,
-    help="The mass type",
-    callback=_get_mass_types,
+@click.command()
+@click.argument(
+    "broadcast_id",
+    type=str,
 )
 @click.option(
     "-c",
@@ -331,95 +300,12 @@ async def schedule_mass(  # noqa: PLR0913
     default=constants.TOKEN_FILE,
     help="The path to the token file",
 )
-@click.option(
-    "--public",
-    type=bool,
-    is_flag=True,
-    help="Flag indicating whether this is a public video",
-)
-@click.option(
-    "--dry-run",
-    type=bool,
-    is_flag=True,
-    help="Flag indicating whether this is a dry-run",
-)
-@click.option(
-    "--force",
-    type=bool,
-    is_flag=True,
-    help="Flag indicating whether to overwrite even if the mass exists.",
-)
-async def schedule_masses(  # noqa: PLR0913
-    start: datetime.datetime,
-    end: datetime.datetime | None,
-    types: list[models.MassType] | None,
-    credentials: PathLike,
-    token: PathLike,
-    public: bool,
-    dry_run: bool,
-    force: bool,
-) -> None:
-    creds = oauth2.CredentialsManager(credentials, token)
-    channel_svc = services.Channel(creds)
-
-    start_date = start.date()
-    end_date = None if end is None else end.date()
-
-    # Check if this mass is already scheduled:
-    scheduled_dates = channel_svc.get_scheduled_dates()
-
-    # Query the mass readings:
-    async with USCCB() as usccb:
-        dates = list(usccb.get_sunday_mass_dates(start_date, end_date))
-        # We schedule Sunday masses at 5:30 PM the Saturday before,
-        # if running this on that Sunday, we want to skip dates
-        # that have already passed.
-        dates = [d for d in dates if utils.to_saturday_mass(d).date() >= USCCB.today()]
-        if not force:
-            # Filter out all dates that have already been scheduled:
-            dates = [d for d in dates if utils.to_saturday_mass(d).astimezone(datetime.UTC) not in scheduled_dates]
-
-        if not dates:
-            logger.info("There are no new dates to schedule.")
-            return
+def delete_broadcast(broadcast_id: str, credentials: PathLike, token: PathLike) -> None:
+    channel_svc = create_channel(credentials, token)
+    channel_svc.delete_broadcast(broadcast_id)
 
-        logger.info("Querying for masses for the following dates: [%s]", ", ".join(list(map(str, dates))))
-        masses: list[Mass] = []
-        missing = 0
-        tasks = [usccb.get_mass_from_date(dt, types) for dt in dates]
-        responses = await asyncio.gather(*tasks)
-        masses = [m for m in responses if m]
-        missing = len(tasks) - len(masses)
-
-    if missing:
-        logger.warning("There are %d missing", missing)
-
-    for mass in masses:
-        # Generate title/description and publish:
-        assert mass.date is not None
-        date = utils.to_saturday_mass(mass.date)
-        schedule_end = date + datetime.timedelta(hours=1)
-        title = generators.generate_title(date, mass.title)
-        description = generators.generate_description(mass)
-        if force:
-            broadcast_id = scheduled_dates.get(utils.to_saturday_mass(mass.date).astimezone(datetime.UTC))
-            if broadcast_id is not None:
-                channel_svc.update_broadcast(
-                    broadcast_id, title, description, date, schedule_end, is_public=public, dry_run=dry_run
-                )
-                continue
-
-        channel_svc.schedule_broadcast(title, description, date, schedule_end, is_public=public, dry_run=dry_run)
-
-
-@cli.command()
-@click.argument("date", type=click.DateTime([constants.DATE_TIME_FMT]), default=_CHRISTMAS_PAGENT)
-@click.option(
-    "-e",
-    "--schedule-end",
-    type=click.DateTime([constants.DATE_TIME_FMT]),
-    help="The time when the broadcast is complete",
-)
+
+@click.command()
 @click.option(
     "-c",
     "--credentials",
@@ -433,12 +319,6 @@ async def schedule_masses(  # noqa: PLR0913
     default=constants.TOKEN_FILE,
     help="The path to the token file",
 )
-@click.option(
-    "--public",
-    type=bool,
-    is_flag=True,
-    help="Flag indicating whether this is a public video",
-)
 @click.option(
     "--dry-run",
     type=bool,
@@ -446,49 +326,28 @@ async def schedule_masses(  # noqa: PLR0913
     help="Flag indicating whether this is a dry-run",
 )
 @click.option(
-    "--force",
-    type=bool,
-    is_flag=True,
-    help="Flag indicating whether to overwrite even if the mass exists.",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=constants.CHANNEL_WORKERS,
+    help="The number of YouTube calls made concurrently",
 )
-async def schedule_christmas_pageant(  # noqa: PLR0913
-    date: datetime.datetime,
-    schedule_end: datetime.datetime | None,
-    credentials: PathLike,
-    token: PathLike,
-    public: bool,
-    dry_run: bool,
-    force: bool,
-) -> None:
-    creds = oauth2.CredentialsManager(credentials, token)
-    channel_svc = services.Channel(creds)
-
-    if schedule_end is None:
-        schedule_end = date + datetime.timedelta(minutes=30)
-    else:
-        schedule_end = schedule_end.astimezone(datetime.UTC)
-
-    # Check if this is already scheduled:
-    scheduled_dates = channel_svc.get_scheduled_dates()
-    if date.date() < USCCB.today():
-        logger.error("You cannot schedule in the past.")
+def delete_duplicate_broadcasts(credentials: PathLike, token: PathLike, dry_run: bool, workers: int) -> None:
+    channel_svc = create_channel(credentials, token, workers=workers)
+    index = channel_svc.build_index(BroadcastStatus.UPCOMING, constants.SCHEDULED_DATES_FIELDS)
+    duplicate_broadcasts = channel_svc.get_duplicated_schedules_dates(index)
+    if not duplicate_broadcasts:
+        logger.info("No duplicate broadcasts found.")
         return
 
-    broadcast_id = scheduled_dates.get(date.astimezone(datetime.UTC))
-    if broadcast_id is not None:
-        if force is False:
-            logger.warning("%s is already scheduled under %s.", date, broadcast_id)
-            return
-
-        logger.info("%s is already scheduled under %s.", date, broadcast_id)
-
-    title = generators.generate_christmas_pageant(date)
-    description = generators.generate_description_christmas_pageant()
-    if force and broadcast_id is not None:
-        channel_svc.update_broadcast(
-            broadcast_id, title, description, date, schedule_end, is_public=public, dry_run=dry_run
+    for date, broadcast_ids in duplicate_broadcasts.items():
+        logger.info(
+            "Date: %s, has the following duplicated broadcast ids: %s",
+            date.strftime("%B %d, %Y - %-I:%M %p"),
+            sorted(broadcast_ids),
         )
 
-        return
-
-    channel_svc.schedule_broadcast(title, description, date, schedule_end, is_public=public, dry_run=dry_run)
+    if dry_run is False:
+        results = channel_svc.delete_broadcasts(
+            broadcast_id for broadcast_ids in duplicate_broadcasts.values() for broadcast_id in broadcast_ids
+        )
+        _log_failed_deletions(results)
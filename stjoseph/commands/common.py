@@ -1,6 +1,274 @@
+from __future__ import annotations
+
+import datetime
+import importlib
+import logging
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
 import asyncclick as click
 
+from stjoseph.api import cassette, constants, export, metrics, models, profiling, quota, snapshot, thumbnails, utils
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Mapping
+    from os import PathLike
+
+    from stjoseph.api.services import AsyncChannel, Channel
+
+
+class LazyGroup(click.Group):
+    """
+    A group which only imports the module of a command once that command is invoked.
+
+    The commands are given as a mapping of the command name to "module:attribute", so that listing them
+    (e.g. --help) does not import their dependencies. The listed commands have no short help until loaded.
+    """
+
+    def __init__(self, *args: Any, lazy_commands: Mapping[str, str] | None = None, **kwargs: Any) -> None:  # noqa: ANN401
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands or {})
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted({*super().list_commands(ctx), *self.lazy_commands})
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            self.add_command(self._load_command(cmd_name), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter) -> None:
+        commands = [(name, self.commands.get(name)) for name in self.list_commands(ctx)]
+        commands = [(name, cmd) for name, cmd in commands if cmd is None or not cmd.hidden]
+        if not commands:
+            return
+
+        limit = formatter.width - 6 - max(len(name) for name, _ in commands)
+        rows = [(name, "" if cmd is None else cmd.get_short_help_str(limit)) for name, cmd in commands]
+        with formatter.section("Commands"):
+            formatter.write_dl(rows)
+
+    def _load_command(self, cmd_name: str) -> click.Command:
+        module_name, attr = self.lazy_commands[cmd_name].split(":", 1)
+        cmd = getattr(importlib.import_module(module_name), attr)
+        if not isinstance(cmd, click.Command):
+            msg = f"{self.lazy_commands[cmd_name]} is not a command"
+            raise TypeError(msg)
+        return cmd
+
+
+@click.group(
+    cls=LazyGroup,
+    lazy_commands={
+        "delete-broadcast": "stjoseph.commands.channel:delete_broadcast",
+        "delete-duplicate-broadcasts": "stjoseph.commands.channel:delete_duplicate_broadcasts",
+        "delete-eligible": "stjoseph.commands.channel:delete_eligible",
+        "list-eligible-for-deletion": "stjoseph.commands.channel:list_eligible_for_deletion",
+        "list-mass-schedules": "stjoseph.commands.channel:list_mass_schedules",
+        "list-past-mass-schedules": "stjoseph.commands.channel:list_past_mass_schedules",
+        "quota-usage": "stjoseph.commands.quota:quota_usage",
+        "schedule-christmas-pageant": "stjoseph.commands.schedule:schedule_christmas_pageant",
+        "schedule-mass": "stjoseph.commands.schedule:schedule_mass",
+        "schedule-masses": "stjoseph.commands.schedule:schedule_masses",
+    },
+)
+@click.option(
+    "--metrics",
+    "metrics_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write the latencies, retries and bytes transferred of the command to the file.",
+)
+@click.option(
+    "--metrics-format",
+    type=click.Choice(["json", "prometheus"]),
+    default="json",
+    show_default=True,
+    help="The format of the --metrics file, prometheus for the node exporter textfile collector.",
+)
+@click.option(
+    "--profile",
+    "profile_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Profile the command into the pstats file and print the time spent in each phase.",
+)
+@click.option(
+    "--record",
+    "record_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Record the responses of the YouTube and USCCB requests of the command into the cassette file.",
+)
+@click.option(
+    "--replay",
+    "replay_path",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Replay the responses of the YouTube and USCCB requests from the cassette file, without the network.",
+)
+@click.option(
+    "--replay-latency-scale",
+    type=click.FloatRange(min=0),
+    default=0.0,
+    show_default=True,
+    help="The multiple of the recorded response times which --replay takes, 1 to replay as slowly as recorded.",
+)
+@click.pass_context
+def cli(  # noqa: PLR0913
+    ctx: click.Context,
+    metrics_path: Path | None,
+    metrics_format: metrics.MetricsFormat,
+    profile_path: Path | None,
+    record_path: Path | None,
+    replay_path: Path | None,
+    replay_latency_scale: float,
+) -> None:
+    if metrics_path is not None:
+        ctx.call_on_close(_record_metrics(metrics_path, metrics_format))
+    if profile_path is not None:
+        ctx.call_on_close(_profile(profile_path))
+    if record_path is not None and replay_path is not None:
+        msg = "--record and --replay cannot be used together."
+        raise click.UsageError(msg)
+    if record_path is not None:
+        ctx.call_on_close(_use_cassette(cassette.Cassette(record_path, "record")))
+    if replay_path is not None:
+        ctx.call_on_close(_use_cassette(cassette.Cassette(replay_path, "replay", replay_latency_scale)))
+
+
+def _record_metrics(path: Path, metrics_format: metrics.MetricsFormat) -> Callable[[], None]:
+    recorder = metrics.MetricsRecorder()
+    metrics.add_hook(recorder)
+
+    def write() -> None:
+        metrics.remove_hook(recorder)
+        recorder.write(path, metrics_format)
+
+    return write
+
+
+def _profile(path: Path) -> Callable[[], None]:
+    profiler = profiling.Profiler(path)
+    profiler.start()
+
+    def stop() -> None:
+        profiler.stop()
+        print(f"Wrote the profile to {path}, elapsed time by phase:", file=sys.stderr)  # noqa: T201
+        print(profiler.format(), file=sys.stderr)  # noqa: T201
+
+    return stop
+
+
+def _use_cassette(active: cassette.Cassette) -> Callable[[], None]:
+    cassette.install(active)
+
+    def eject() -> None:
+        cassette.uninstall()
+        if active.mode == "record":
+            active.save()
+
+    return eject
+
+
+def export_options(f: Callable[..., Any]) -> Callable[..., Any]:
+    """Adds the --format, --limit, --since and --until options of the commands listing broadcasts."""
+    options = [
+        click.option(
+            "-f",
+            "--format",
+            "export_format",
+            type=click.Choice(["text", "jsonl", "csv", "ids0"]),
+            default="text",
+            show_default=True,
+            help="The format the broadcasts are written in, ids0 for their ids terminated by NUL (e.g. for xargs -0).",
+        ),
+        click.option("--limit", type=click.IntRange(min=1), help="Stop listing after the number of broadcasts."),
+        click.option(
+            "--since",
+            type=click.DateTime([constants.DATE_FMT]),
+            help="Only the broadcasts scheduled on or after the date, a listing of the completed broadcasts (which are "
+            "newest first) stops at the first one before it.",
+        ),
+        click.option(
+            "--until", type=click.DateTime([constants.DATE_FMT]), help="Only the broadcasts scheduled up to the date."
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def export_streams(  # noqa: PLR0913
+    streams: Iterable[models.LiveStream],
+    export_format: export.ExportFormat,
+    limit: int | None,
+    since: datetime.datetime | None,
+    until: datetime.datetime | None,
+    newest_first: bool = False,
+) -> int:
+    """
+    Writes the streams to stdout as they are listed, returning how many were written.
+
+    Only the streams which are newest first stop being listed at the first one before since.
+    """
+    if export_format != "text":
+        _log_to_stderr()
+    selected = export.select_streams(
+        streams,
+        limit,
+        utils.start_of_day(since.date()) if since is not None else None,
+        utils.start_of_day(until.date() + datetime.timedelta(days=1)) if until is not None else None,
+        newest_first,
+    )
+    return export.write_streams(selected, sys.stdout, export_format)
+
+
+def _log_to_stderr() -> None:
+    """Moves the logging off stdout, which is kept for the machine-readable output."""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+            handler.setStream(sys.stderr)
+
+
+def create_snapshot(token: PathLike) -> snapshot.BroadcastSnapshot:
+    """Creates the local snapshot of the broadcasts, stored next to the token file."""
+    return snapshot.BroadcastSnapshot(Path(token).with_name(constants.SNAPSHOT_FILE_NAME))
+
+
+def create_thumbnail_manager(token: PathLike) -> thumbnails.ThumbnailManager:
+    """Creates the record of the uploaded thumbnails, stored next to the token file."""
+    return thumbnails.ThumbnailManager(Path(token).with_name(constants.THUMBNAILS_FILE_NAME))
+
+
+def create_quota_ledger(token: PathLike, budget: int | None = None) -> quota.QuotaLedger:
+    """
+    Creates the running total of the quota used, stored next to the token file.
+
+    The calls still unsaved are saved once the command finishes, even if its Channel is not closed.
+    """
+    ledger = quota.QuotaLedger(Path(token).with_name(constants.QUOTA_FILE_NAME), budget)
+    ctx = click.get_current_context(silent=True)
+    if ctx is not None:
+        ctx.call_on_close(ledger.flush)
+    return ledger
+
+
+def quota_exceeded(e: quota.QuotaExceededError | ExceptionGroup[quota.QuotaExceededError]) -> click.ClickException:
+    """Gets the error which stops a command cleanly once its quota budget is reached."""
+    return click.ClickException(f"Stopped before going over the quota budget ({e}), rerun to resume.")
+
+
+def check_thumbnails(channel_svc: Channel | AsyncChannel) -> None:
+    """
+    Fails the command if any thumbnail failed to be set, once the channel has been closed.
+
+    The failed thumbnails are left pending, so that the next run of schedule-masses sets them.
+    """
+    failures = channel_svc.thumbnail_failures
+    if not failures:
+        return
+
+    quota_errors = [e for e in failures.values() if isinstance(e, quota.QuotaExceededError)]
+    if quota_errors:
+        raise quota_exceeded(quota_errors[0])
 
-@click.group()
-def cli() -> None:
-    pass
+    msg = f"Failed to set the thumbnail of {len(failures)} broadcasts ({', '.join(failures)}), rerun to retry."
+    raise click.ClickException(msg)
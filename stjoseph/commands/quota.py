@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import datetime
+from typing import TYPE_CHECKING
+
+import asyncclick as click
+
+from stjoseph.api import constants, quota
+from stjoseph.commands.common import create_quota_ledger
+
+if TYPE_CHECKING:
+    from os import PathLike
+
+
+@click.command()
+@click.option(
+    "--token",
+    type=click.Path(exists=False, dir_okay=False),
+    default=constants.TOKEN_FILE,
+    help="The path to the token file, the quota usage is stored next to it",
+)
+@click.option(
+    "--days",
+    type=click.IntRange(min=1, max=constants.QUOTA_HISTORY_DAYS),
+    default=1,
+    help="The number of days (Pacific Time) to report, starting with today",
+)
+@click.option(
+    "--daily-quota",
+    type=click.IntRange(min=1),
+    default=constants.DAILY_QUOTA,
+    help="The daily quota of the project",
+)
+def quota_usage(token: PathLike, days: int, daily_quota: int) -> None:
+    ledger = create_quota_ledger(token)
+    oldest = quota.quota_day() - datetime.timedelta(days=days - 1)
+    recorded_days = [day for day in ledger.days() if day >= oldest]
+    if not recorded_days:
+        print("No quota usage recorded.")  # noqa: T201
+        return
+
+    for day in recorded_days:
+        usage = ledger.usage(day)
+        used = sum(u.units for u in usage.values())
+        print(f"{day} (Pacific Time): {used} of {daily_quota} units used, {max(daily_quota - used, 0)} left")  # noqa: T201
+        for method_id, method_usage in sorted(usage.items(), key=lambda item: (-item[1].units, item[0])):
+            print(f"  {method_id:<40} {method_usage.calls:>6} calls {method_usage.units:>8} units")  # noqa: T201
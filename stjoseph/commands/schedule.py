@@ -0,0 +1,446 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Final
+
+import asyncclick as click
+from catholic_mass_readings import models
+
+from stjoseph.api import cassette, constants, generators, quota, readings, reconcile, utils
+from stjoseph.api.models import BroadcastStatus
+from stjoseph.commands.channel import create_async_channel, create_channel
+from stjoseph.commands.common import check_thumbnails, quota_exceeded
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from concurrent.futures import Executor
+    from os import PathLike
+
+    from catholic_mass_readings.models import Mass
+
+logger = logging.getLogger(__name__)
+
+_TYPES: Final[list[str]] = [t.name for t in models.MassType]
+
+
+def _today() -> str:
+    return utils.today().strftime(constants.DATE_FMT)
+
+
+def _next_christmas_pageant() -> str:
+    return utils.get_next_christmas_pageant().strftime(constants.DATE_TIME_FMT)
+
+
+def _get_mass_types(ctx: click.Context, param: click.Option, value: tuple[str, ...]) -> list[models.MassType] | None:
+    return list(map(models.MassType, value)) if value else None
+
+
+def _create_mass_cache(token: PathLike) -> readings.MassCache | None:
+    """Creates the cache of the mass readings, stored next to the token file, unless a cassette is installed."""
+    if cassette.get_active() is not None:
+        return None  # every reading is then recorded (or replayed)
+    return readings.MassCache(Path(token).with_name(constants.MASS_CACHE_DIR_NAME))
+
+
+@click.command()
+@click.argument("date", type=click.DateTime([constants.DATE_TIME_FMT]))
+@click.option(
+    "-m",
+    "--mass-date",
+    type=click.DateTime([constants.DATE_FMT]),
+    help="The date of the mass to use for the contents of the liturgy",
+)
+@click.option(
+    "-e",
+    "--schedule-end",
+    type=click.DateTime([constants.DATE_TIME_FMT]),
+    help="The time when the broadcast is complete",
+)
+@click.option(
+    "-t",
+    "--type",
+    "types",
+    type=click.Choice(_TYPES, case_sensitive=False),
+    multiple=True,
+    help="The mass type",
+    callback=_get_mass_types,
+)
+@click.option(
+    "-c",
+    "--credentials",
+    type=click.Path(exists=True, dir_okay=False),
+    default=constants.CREDENTIALS_FILE,
+    help="The path to the credentials file",
+)
+@click.option(
+    "--token",
+    type=click.Path(exists=False, dir_okay=False),
+    default=constants.TOKEN_FILE,
+    help="The path to the token file",
+)
+@click.option(
+    "--public",
+    type=bool,
+    is_flag=True,
+    help="Flag indicating whether this is a public video",
+)
+@click.option(
+    "--dry-run",
+    type=bool,
+    is_flag=True,
+    help="Flag indicating whether this is a dry-run",
+)
+@click.option(
+    "--force",
+    type=bool,
+    is_flag=True,
+    help="Flag indicating whether to overwrite even if the mass exists.",
+)
+@click.pass_context
+async def schedule_mass(  # noqa: PLR0913
+    ctx: click.Context,
+    date: datetime.datetime,
+    schedule_end: datetime.datetime | None,
+    mass_date: datetime.datetime | None,
+    types: list[models.MassType] | None,
+    credentials: PathLike,
+    token: PathLike,
+    public: bool,
+    dry_run: bool,
+    force: bool,
+) -> None:
+    if mass_date is None:
+        mass_date = date
+        if utils.is_saturday_pm_mass(date):
+            mass_date = date + datetime.timedelta(days=1)
+            logger.info("Querying for mass on Sunday: %s", mass_date.date())
+
+    if schedule_end is None:
+        schedule_end = date + datetime.timedelta(hours=1)
+
+    # The YouTube calls are made on the event loop of the readings, and the thumbnail upload is waited for on exit:
+    async with create_async_channel(credentials, token) as channel_svc:
+        # Check if this mass is already scheduled, with the fields to compare against if it is to be overwritten:
+        fields = constants.RECONCILE_FIELDS if force else constants.SCHEDULED_DATES_FIELDS
+        index = await channel_svc.build_index(BroadcastStatus.UPCOMING, fields)
+        scheduled_dates = await channel_svc.get_scheduled_dates(index)
+        broadcast_id = scheduled_dates.get(date.astimezone(datetime.UTC))
+        if broadcast_id is not None:
+            if not force:
+                logger.warning("%s is already scheduled under %s.", date, broadcast_id)
+                return
+
+            logger.info("%s is already scheduled under %s.", date, broadcast_id)
+
+        # Query the mass readings:
+        async with readings.create_usccb() as usccb:
+            fetcher = readings.MassFetcher(usccb, _create_mass_cache(token))
+            mass = (await fetcher.get_masses([mass_date.date()], types)).get(mass_date.date())
+
+        if not mass:
+            logger.error("Failed to find a mass on %s", mass_date)
+            await ctx.aexit(1)
+            return
+
+        # Generate title/description and publish what changed:
+        desired = reconcile.DesiredBroadcast(
+            generators.generate_title(date, mass.title),
+            generators.generate_description(mass),
+            date,
+            schedule_end,
+            public,
+        )
+        operation = reconcile.plan_broadcast(desired, index)
+        if dry_run:
+            print(operation)  # noqa: T201
+        await reconcile.async_apply_operation(channel_svc, operation, dry_run)
+    check_thumbnails(channel_svc)
+
+
+@click.command()
+@click.option("-s", "--start", type=click.DateTime([constants.DATE_FMT]), default=_today)
+@click.option("-e", "--end", type=click.DateTime([constants.DATE_FMT]))
+@click.option(
+    "-t",
+    "--type",
+    "types",
+    type=click.Choice(_TYPES, case_sensitive=False),
+    multiple=True,
+    help="The mass type",
+    callback=_get_mass_types,
+)
+@click.option(
+    "-c",
+    "--credentials",
+    type=click.Path(exists=True, dir_okay=False),
+    default=constants.CREDENTIALS_FILE,
+    help="The path to the credentials file",
+)
+@click.option(
+    "--token",
+    type=click.Path(exists=False, dir_okay=False),
+    default=constants.TOKEN_FILE,
+    help="The path to the token file",
+)
+@click.option(
+    "--public",
+    type=bool,
+    is_flag=True,
+    help="Flag indicating whether this is a public video",
+)
+@click.option(
+    "--dry-run",
+    type=bool,
+    is_flag=True,
+    help="Flag indicating whether this is a dry-run",
+)
+@click.option(
+    "--force",
+    type=bool,
+    is_flag=True,
+    help="Flag indicating whether to overwrite even if the mass exists.",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=constants.READINGS_CONCURRENCY,
+    help="The maximum number of mass readings queried at once",
+)
+@click.option(
+    "--rate-limit",
+    type=click.FloatRange(min=0, min_open=True),
+    default=constants.READINGS_RATE_LIMIT,
+    help="The maximum number of requests per second made for the mass readings",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=constants.CHANNEL_WORKERS,
+    help="The number of YouTube calls made concurrently",
+)
+@click.option(
+    "--defer-category",
+    type=bool,
+    is_flag=True,
+    help="Flag indicating whether the video categories are set in a single batched pass at the end",
+)
+@click.option(
+    "--quota-budget",
+    type=click.IntRange(min=0),
+    help="The YouTube quota units which may be used today, the run stops before going over it and can be rerun",
+)
+async def schedule_masses(  # noqa: PLR0913
+    start: datetime.datetime,
+    end: datetime.datetime | None,
+    types: list[models.MassType] | None,
+    credentials: PathLike,
+    token: PathLike,
+    public: bool,
+    dry_run: bool,
+    force: bool,
+    concurrency: int,
+    rate_limit: float,
+    workers: int,
+    defer_category: bool,
+    quota_budget: int | None,
+) -> None:
+    channel_svc = create_channel(credentials, token, quota_budget, workers=workers, defer_category=defer_category)
+
+    start_date = start.date()
+    end_date = None if end is None else end.date()
+
+    plan = reconcile.Plan()
+
+    def publish(mass: Mass) -> None:
+        # Generate title/description and publish what changed:
+        assert mass.date is not None
+        date = utils.to_saturday_mass(mass.date)
+        desired = reconcile.DesiredBroadcast(
+            generators.generate_title(date, mass.title),
+            generators.generate_description(mass),
+            date,
+            date + datetime.timedelta(hours=1),
+            public,
+        )
+        operation = reconcile.plan_broadcast(desired, index)
+        plan.add(operation)
+        if dry_run:
+            print(operation)  # noqa: T201
+        reconcile.apply_operation(channel_svc, operation, dry_run)
+
+    # The blocking Channel calls are made from its executor, which has a Resource per worker thread (rather than
+    # through an AsyncChannel, which has neither the workers nor the batched pass of --defer-category):
+    loop = asyncio.get_running_loop()
+    try:
+        with channel_svc:
+            # Check if this mass is already scheduled:
+            fields = constants.RECONCILE_FIELDS if force else constants.SCHEDULED_DATES_FIELDS
+            index = await loop.run_in_executor(
+                channel_svc.executor, channel_svc.build_index, BroadcastStatus.UPCOMING, fields
+            )
+            scheduled_dates = channel_svc.get_scheduled_dates(index)
+            if not dry_run:
+                # The thumbnails a previous run left unset, e.g. once it went over its quota budget:
+                channel_svc.resume_thumbnails(index)
+
+            # Query the mass readings, publishing each as soon as it arrives:
+            async with readings.create_usccb() as usccb:
+                dates = list(usccb.get_sunday_mass_dates(start_date, end_date))
+                # We schedule Sunday masses at 5:30 PM the Saturday before,
+                # if running this on that Sunday, we want to skip dates
+                # that have already passed.
+                dates = [d for d in dates if utils.to_saturday_mass(d).date() >= utils.today()]
+                if not force:
+                    # Filter out all dates that have already been scheduled:
+                    dates = [
+                        d for d in dates if utils.to_saturday_mass(d).astimezone(datetime.UTC) not in scheduled_dates
+                    ]
+
+                if dates:
+                    logger.info("Querying for masses for the following dates: [%s]", ", ".join(list(map(str, dates))))
+                    fetcher = readings.MassFetcher(usccb, _create_mass_cache(token), concurrency, rate_limit)
+                    queue: asyncio.Queue[Mass | None] = asyncio.Queue()
+                    async with asyncio.TaskGroup() as tg:
+                        producer = tg.create_task(_produce_masses(fetcher, dates, types, queue))
+                        tg.create_task(_consume_masses(queue, publish, channel_svc.executor))
+                else:
+                    logger.info("There are no new dates to schedule.")
+    except* quota.QuotaExceededError as eg:
+        logger.info("Plan: %s", plan.summary())
+        raise quota_exceeded(eg.exceptions[0]) from eg
+
+    if dates:
+        logger.info("Plan: %s", plan.summary())
+        missing, failed = producer.result()
+        if missing:
+            logger.warning("There are %d missing", missing)
+
+        if failed:
+            logger.error("There are %d that failed to be queried", failed)
+
+    # The uploads run in the background, and have finished once the channel is closed:
+    check_thumbnails(channel_svc)
+
+
+async def _produce_masses(
+    fetcher: readings.MassFetcher,
+    dates: list[datetime.date],
+    types: list[models.MassType] | None,
+    queue: asyncio.Queue[Mass | None],
+) -> tuple[int, int]:
+    """
+    Queues each mass as soon as it has been queried, followed by None once all the dates are done.
+
+    Returns:
+        tuple of the number of dates which are missing and the number which failed to be queried.
+    """
+    queried = 0
+    missing = 0
+    try:
+        async for _, mass in fetcher.iter_masses(dates, types):
+            queried += 1
+            if mass is None:
+                missing += 1
+                continue
+            await queue.put(mass)
+    finally:
+        await queue.put(None)
+    return missing, len(dates) - queried
+
+
+async def _consume_masses(
+    queue: asyncio.Queue[Mass | None], publish: Callable[[Mass], None], executor: Executor
+) -> None:
+    """Publishes each queued mass on the executor until None is received."""
+    loop = asyncio.get_running_loop()
+    published: list[asyncio.Future[None]] = []
+    while (mass := await queue.get()) is not None:
+        published.append(loop.run_in_executor(executor, publish, mass))
+    await asyncio.gather(*published)
+
+
+@click.command()
+@click.argument("date", type=click.DateTime([constants.DATE_TIME_FMT]), default=_next_christmas_pageant)
+@click.option(
+    "-e",
+    "--schedule-end",
+    type=click.DateTime([constants.DATE_TIME_FMT]),
+    help="The time when the broadcast is complete",
+)
+@click.option(
+    "-c",
+    "--credentials",
+    type=click.Path(exists=True, dir_okay=False),
+    default=constants.CREDENTIALS_FILE,
+    help="The path to the credentials file",
+)
+@click.option(
+    "--token",
+    type=click.Path(exists=False, dir_okay=False),
+    default=constants.TOKEN_FILE,
+    help="The path to the token file",
+)
+@click.option(
+    "--public",
+    type=bool,
+    is_flag=True,
+    help="Flag indicating whether this is a public video",
+)
+@click.option(
+    "--dry-run",
+    type=bool,
+    is_flag=True,
+    help="Flag indicating whether this is a dry-run",
+)
+@click.option(
+    "--force",
+    type=bool,
+    is_flag=True,
+    help="Flag indicating whether to overwrite even if the mass exists.",
+)
+async def schedule_christmas_pageant(  # noqa: PLR0913
+    date: datetime.datetime,
+    schedule_end: datetime.datetime | None,
+    credentials: PathLike,
+    token: PathLike,
+    public: bool,
+    dry_run: bool,
+    force: bool,
+) -> None:
+    if schedule_end is None:
+        schedule_end = date + datetime.timedelta(minutes=30)
+    else:
+        schedule_end = schedule_end.astimezone(datetime.UTC)
+
+    async with create_async_channel(credentials, token) as channel_svc:
+        # Check if this is already scheduled, with the fields to compare against if it is to be overwritten:
+        fields = constants.RECONCILE_FIELDS if force else constants.SCHEDULED_DATES_FIELDS
+        index = await channel_svc.build_index(BroadcastStatus.UPCOMING, fields)
+        scheduled_dates = await channel_svc.get_scheduled_dates(index)
+        if date.date() < utils.today():
+            logger.error("You cannot schedule in the past.")
+            return
+
+        broadcast_id = scheduled_dates.get(date.astimezone(datetime.UTC))
+        if broadcast_id is not None:
+            if force is False:
+                logger.warning("%s is already scheduled under %s.", date, broadcast_id)
+                return
+
+            logger.info("%s is already scheduled under %s.", date, broadcast_id)
+
+        desired = reconcile.DesiredBroadcast(
+            generators.generate_christmas_pageant(date),
+            generators.generate_description_christmas_pageant(),
+            date,
+            schedule_end,
+            public,
+        )
+        operation = reconcile.plan_broadcast(desired, index)
+        if dry_run:
+            print(operation)  # noqa: T201
+        await reconcile.async_apply_operation(channel_svc, operation, dry_run)
+    check_thumbnails(channel_svc)
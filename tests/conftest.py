@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import functools
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import pytest
+
+from stjoseph.api import oauth2
+from stjoseph.api.services.async_channel import AsyncChannel
+from stjoseph.api.services.channel import Channel
+from stjoseph.commands import channel, schedule
+from tests import fakes
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+
+@pytest.fixture
+def youtube() -> fakes.FakeYouTube:
+    return fakes.FakeYouTube()
+
+
+@pytest.fixture
+def creds(tmp_path: Path) -> oauth2.CredentialsManager:
+    return oauth2.CredentialsManager(tmp_path / "credentials.json", tmp_path / "token.json")
+
+
+@pytest.fixture
+def channel_svc(creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> Iterator[Channel]:
+    with Channel(creds, http_factory=youtube.http) as channel_svc:
+        yield channel_svc
+
+
+@pytest.fixture
+def async_channel_svc(creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> AsyncChannel:
+    """An AsyncChannel calling the fake YouTube, which each test closes on its own event loop."""
+    return AsyncChannel(creds, session_factory=youtube.session)
+
+
+@pytest.fixture
+def cli_args(tmp_path: Path) -> list[str]:
+    """The credentials and token options of the commands, with the files next to each other in tmp_path."""
+    credentials = tmp_path / "credentials.json"
+    credentials.write_text("{}")
+    return ["--credentials", str(credentials), "--token", str(tmp_path / "token.json")]
+
+
+@pytest.fixture
+def patched_create_channel(youtube: fakes.FakeYouTube) -> Iterator[None]:
+    """Makes the commands create their Channel (or AsyncChannel) calling the fake YouTube instead of the API."""
+    create_channel = functools.partial(channel.create_channel, http_factory=youtube.http)
+    create_async_channel = functools.partial(channel.create_async_channel, session_factory=youtube.session)
+    with (
+        mock.patch.object(channel, "create_channel", create_channel),
+        mock.patch.object(schedule, "create_channel", create_channel),
+        mock.patch.object(schedule, "create_async_channel", create_async_channel),
+    ):
+        yield
@@ -0,0 +1,677 @@
+"""
+An in-process fake of the YouTube Data API, for running Channel offline.
+
+The fake serves the liveBroadcasts, videos, thumbnails and channels endpoints used by Channel, including
+paging, partial responses, ETags and batch requests, through an httplib2.Http compatible transport
+(or a curl_cffi AsyncSession compatible session for an AsyncChannel):
+
+    youtube = FakeYouTube(latency=0.05)
+    youtube.populate(10_000, datetime.datetime(2015, 1, 4, 15, tzinfo=datetime.UTC))
+    youtube.inject_error(HTTPStatus.SERVICE_UNAVAILABLE, "backendError")
+    with Channel(creds, http_factory=youtube.http) as channel:
+        ...
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import collections
+import datetime
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import urllib.parse
+from email.parser import FeedParser
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Any, Final, NamedTuple, cast
+
+import httplib2
+from curl_cffi.requests import Headers, Request, Response
+
+from stjoseph.api import models, utils
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from email.message import Message
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_ID: Final[str] = "UCfakeStJosephChurch000"
+DEFAULT_CATEGORY_ID: Final[str] = "22"  # People & Blogs, the default category of a new channel
+DEFAULT_PAGE_SIZE: Final[int] = 5
+MAX_PAGE_SIZE: Final[int] = 50
+
+_ID_ALPHABET: Final[str] = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+_FIELD_NAME: Final[re.Pattern[str]] = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_CONTENT_RANGE: Final[re.Pattern[str]] = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+# The liveBroadcast lifeCycleStatus values listed for each broadcastStatus
+_LIFE_CYCLE_STATUSES: Final[dict[models.BroadcastStatus, tuple[str, ...]]] = {
+    models.BroadcastStatus.ACTIVE: ("testStarting", "testing", "liveStarting", "live"),
+    models.BroadcastStatus.COMPLETED: ("complete",),
+    models.BroadcastStatus.UPCOMING: ("created", "ready"),
+}
+
+# The API method of each (HTTP method, path) served by the fake
+_METHODS: Final[dict[tuple[str, str], str]] = {
+    ("GET", "/youtube/v3/channels"): "youtube.channels.list",
+    ("GET", "/youtube/v3/liveBroadcasts"): "youtube.liveBroadcasts.list",
+    ("POST", "/youtube/v3/liveBroadcasts"): "youtube.liveBroadcasts.insert",
+    ("PUT", "/youtube/v3/liveBroadcasts"): "youtube.liveBroadcasts.update",
+    ("DELETE", "/youtube/v3/liveBroadcasts"): "youtube.liveBroadcasts.delete",
+    ("GET", "/youtube/v3/videos"): "youtube.videos.list",
+    ("PUT", "/youtube/v3/videos"): "youtube.videos.update",
+    ("POST", "/youtube/v3/thumbnails/set"): "youtube.thumbnails.set",
+    ("POST", "/upload/youtube/v3/thumbnails/set"): "youtube.thumbnails.set",
+}
+
+_BATCH_PATH: Final[str] = "/batch"
+
+
+class FakeResponse(NamedTuple):
+    status: int
+    headers: dict[str, str]
+    content: bytes
+
+
+class InjectedError(NamedTuple):
+    """An error returned instead of the response of the next matching call."""
+
+    status: int
+    reason: str
+    method_id: str | None = None
+    retry_after: float | None = None
+
+
+class FakeYouTube:
+    """
+    The state of a fake YouTube channel, shared by every transport created with http().
+
+    Every HTTP round trip is delayed by latency seconds (a batch request is a single round trip),
+    and the calls made to each API method are counted in calls.
+    """
+
+    def __init__(self, latency: float = 0.0, seed: int = 0) -> None:
+        """
+        Args:
+            latency (float): The number of seconds each HTTP round trip takes.
+            seed (int): The seed of the generated broadcast ids.
+        """
+        self.latency = latency
+        self._random = random.Random(seed)  # noqa: S311
+        self._lock = threading.RLock()
+        self._broadcasts: dict[str, dict[str, Any]] = {}
+        self._videos: dict[str, dict[str, Any]] = {}
+        self._thumbnails: dict[str, int] = {}
+        self._uploads: dict[str, tuple[str, bytearray]] = {}
+        self._errors: list[InjectedError] = []
+        self._listings: dict[models.BroadcastStatus, list[dict[str, Any]]] = {}
+        self.calls: collections.Counter[str] = collections.Counter()
+        self.round_trips = 0
+
+    def __len__(self) -> int:
+        return len(self._broadcasts)
+
+    def http(self) -> FakeHttp:
+        """Creates a transport serving the requests from this fake, e.g. as the http_factory of a Channel."""
+        return FakeHttp(self)
+
+    def session(self) -> FakeSession:
+        """Creates a session serving the requests from this fake, e.g. as the session_factory of an AsyncChannel."""
+        return FakeSession(self)
+
+    @property
+    def broadcasts(self) -> dict[str, dict[str, Any]]:
+        """Gets a copy of the liveBroadcast resources, by id."""
+        with self._lock:
+            return {broadcast_id: _copy(broadcast) for broadcast_id, broadcast in self._broadcasts.items()}
+
+    def get_category(self, video_id: str) -> str | None:
+        with self._lock:
+            video = self._videos.get(video_id)
+            return None if video is None else video["snippet"]["categoryId"]
+
+    def get_thumbnail_size(self, video_id: str) -> int | None:
+        """Gets the size of the thumbnail set on the video, if any."""
+        with self._lock:
+            return self._thumbnails.get(video_id)
+
+    def add_broadcast(  # noqa: PLR0913
+        self,
+        title: str,
+        scheduled_start: datetime.datetime,
+        life_cycle_status: str = "created",
+        actual_start: datetime.datetime | None = None,
+        actual_end: datetime.datetime | None = None,
+        description: str = "",
+        privacy_status: str = "private",
+        category_id: str = DEFAULT_CATEGORY_ID,
+        broadcast_id: str | None = None,
+        scheduled_end: datetime.datetime | None = None,
+    ) -> str:
+        """Adds a broadcast (and its video) to the channel, returning its id."""
+        snippet = {
+            "publishedAt": utils.to_gcloud_datetime(scheduled_start - datetime.timedelta(days=7)),
+            "channelId": CHANNEL_ID,
+            "title": title,
+            "description": description,
+            "scheduledStartTime": utils.to_gcloud_datetime(scheduled_start),
+        }
+        if scheduled_end is not None:
+            snippet["scheduledEndTime"] = utils.to_gcloud_datetime(scheduled_end)
+        if actual_start is not None:
+            snippet["actualStartTime"] = utils.to_gcloud_datetime(actual_start)
+        if actual_end is not None:
+            snippet["actualEndTime"] = utils.to_gcloud_datetime(actual_end)
+
+        with self._lock:
+            broadcast_id = broadcast_id or self._new_id()
+            self._listings.clear()
+            self._broadcasts[broadcast_id] = {
+                "kind": "youtube#liveBroadcast",
+                "id": broadcast_id,
+                "snippet": snippet,
+                "status": {
+                    "lifeCycleStatus": life_cycle_status,
+                    "privacyStatus": privacy_status,
+                    "selfDeclaredMadeForKids": True,
+                },
+            }
+            self._videos[broadcast_id] = {
+                "kind": "youtube#video",
+                "id": broadcast_id,
+                "snippet": {"title": title, "description": description, "categoryId": category_id},
+            }
+        return broadcast_id
+
+    def populate(
+        self,
+        count: int,
+        start: datetime.datetime,
+        interval: datetime.timedelta = datetime.timedelta(days=7),
+        life_cycle_status: str = "complete",
+        duration: datetime.timedelta | None = datetime.timedelta(hours=1),
+    ) -> list[str]:
+        """
+        Adds count broadcasts scheduled every interval from start, returning their ids.
+
+        The completed broadcasts ran for duration, a None duration is a broadcast which never went live.
+        """
+        broadcast_ids = []
+        for idx in range(count):
+            scheduled_start = start + idx * interval
+            actual_start = actual_end = None
+            if life_cycle_status == "complete" and duration is not None:
+                actual_start, actual_end = scheduled_start, scheduled_start + duration
+            broadcast_ids.append(
+                self.add_broadcast(
+                    f"Mass {scheduled_start:%Y-%m-%d %H:%M}",
+                    scheduled_start,
+                    life_cycle_status,
+                    actual_start=actual_start,
+                    actual_end=actual_end,
+                )
+            )
+        return broadcast_ids
+
+    def inject_error(
+        self,
+        status: int,
+        reason: str,
+        method_id: str | None = None,
+        count: int = 1,
+        retry_after: float | None = None,
+    ) -> None:
+        """
+        Returns the error instead of the response of the next count calls to the API method.
+
+        Args:
+            status (int): The HTTP status of the error, e.g. 403 or 503.
+            reason (str): The reason of the error, e.g. quotaExceeded, rateLimitExceeded or backendError.
+            method_id (str): The API method which fails, e.g. youtube.liveBroadcasts.list (if not specified, any).
+            count (int): The number of calls which fail.
+            retry_after (float): The optional Retry-After, in seconds, of the error response.
+        """
+        with self._lock:
+            self._errors.extend([InjectedError(status, reason, method_id, retry_after)] * count)
+
+    def clear_errors(self) -> None:
+        with self._lock:
+            self._errors.clear()
+
+    def request(self, method: str, uri: str, body: bytes | str | None, headers: dict[str, str]) -> FakeResponse:
+        """Serves a single HTTP round trip."""
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        with self._lock:
+            self.round_trips += 1
+
+        parsed = urllib.parse.urlsplit(uri)
+        if method == "POST" and parsed.path == _BATCH_PATH:
+            return self._batch(_to_text(body), headers)
+        if method == "PUT" and parsed.path.startswith("/upload/"):
+            return self._upload_chunk(parsed, _to_bytes(body), headers)
+        return self._call(method, parsed, body, headers)
+
+    def _call(  # noqa: PLR0911
+        self, method: str, parsed: urllib.parse.SplitResult, body: bytes | str | None, headers: dict[str, str]
+    ) -> FakeResponse:
+        method_id = _METHODS.get((method, parsed.path))
+        if method_id is None:
+            return _error_response(HTTPStatus.NOT_FOUND, "notFound", f"{method} {parsed.path} is not served")
+
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+        with self._lock:
+            if params.get("uploadType") == "resumable":
+                # the upload is only counted as a call once its last chunk has been received
+                return self._start_upload(parsed, params)
+
+            self.calls[method_id] += 1
+            error = self._pop_error(method_id)
+            if error is not None:
+                logger.debug("Injecting %d %s into %s", error.status, error.reason, method_id)
+                return _error_response(error.status, error.reason, retry_after=error.retry_after)
+
+            try:
+                response = self._dispatch(method_id, params, body)
+            except _ApiError as e:
+                return _error_response(e.status, e.reason, str(e))
+
+        if response is None:
+            return FakeResponse(HTTPStatus.NO_CONTENT, {}, b"")
+
+        if "fields" in params:
+            try:
+                response = _select(response, parse_fields(params["fields"]))
+            except ValueError as e:
+                return _error_response(HTTPStatus.BAD_REQUEST, "invalidParameter", str(e))
+
+        content = json.dumps(response).encode()
+        etag = response.get("etag")
+        if etag is not None and _get_header(headers, "if-none-match") == etag:
+            return FakeResponse(HTTPStatus.NOT_MODIFIED, {"etag": etag}, b"")
+        return FakeResponse(HTTPStatus.OK, {"content-type": "application/json; charset=UTF-8"}, content)
+
+    def _dispatch(self, method_id: str, params: dict[str, str], body: bytes | str | None) -> dict[str, Any] | None:
+        handlers: dict[str, Callable[[dict[str, str], bytes | str | None], dict[str, Any] | None]] = {
+            "youtube.channels.list": self._list_channels,
+            "youtube.liveBroadcasts.list": self._list_broadcasts,
+            "youtube.liveBroadcasts.insert": self._insert_broadcast,
+            "youtube.liveBroadcasts.update": self._update_broadcast,
+            "youtube.liveBroadcasts.delete": self._delete_broadcast,
+            "youtube.videos.list": self._list_videos,
+            "youtube.videos.update": self._update_video,
+            "youtube.thumbnails.set": self._set_thumbnail,
+        }
+        return handlers[method_id](params, body)
+
+    def _list_channels(self, _params: dict[str, str], _body: bytes | str | None) -> dict[str, Any]:
+        items = [{"kind": "youtube#channel", "id": CHANNEL_ID, "snippet": {"title": "St. Joseph Church"}}]
+        return _list_response("youtube#channelListResponse", items)
+
+    def _list_broadcasts(self, params: dict[str, str], _body: bytes | str | None) -> dict[str, Any]:
+        if "id" in params:
+            broadcast_ids = params["id"].split(",")
+            items = [self._broadcasts[i] for i in broadcast_ids if i in self._broadcasts]
+        else:
+            try:
+                broadcast_status = models.BroadcastStatus(params.get("broadcastStatus", "all"))
+            except ValueError as e:
+                raise _ApiError(HTTPStatus.BAD_REQUEST, "invalidValue", str(e)) from e
+            items = self._get_listing(broadcast_status)
+
+        max_results = int(params.get("maxResults", DEFAULT_PAGE_SIZE))
+        if not 0 <= max_results <= MAX_PAGE_SIZE:
+            msg = f"maxResults must be between 0 and {MAX_PAGE_SIZE}"
+            raise _ApiError(HTTPStatus.BAD_REQUEST, "invalidValue", msg)
+
+        offset = _decode_page_token(params.get("pageToken"))
+        page = [_copy(item) for item in items[offset : offset + max_results]]
+        next_offset = offset + max_results
+        return _list_response(
+            "youtube#liveBroadcastListResponse",
+            page,
+            total_results=len(items),
+            next_page_token=_encode_page_token(next_offset) if next_offset < len(items) else None,
+            prev_page_token=_encode_page_token(max(offset - max_results, 0)) if offset > 0 else None,
+        )
+
+    def _get_listing(self, broadcast_status: models.BroadcastStatus) -> list[dict[str, Any]]:
+        """Gets the broadcasts with the status, newest first, which are kept until the broadcasts change."""
+        items = self._listings.get(broadcast_status)
+        if items is None:
+            life_cycle_statuses = _LIFE_CYCLE_STATUSES.get(broadcast_status)
+            items = self._listings[broadcast_status] = sorted(
+                (
+                    broadcast
+                    for broadcast in self._broadcasts.values()
+                    if life_cycle_statuses is None or broadcast["status"]["lifeCycleStatus"] in life_cycle_statuses
+                ),
+                key=lambda broadcast: broadcast["snippet"]["scheduledStartTime"],
+                reverse=True,
+            )
+        return items
+
+    def _insert_broadcast(self, _params: dict[str, str], body: bytes | str | None) -> dict[str, Any]:
+        resource = _loads(body)
+        snippet = resource.get("snippet", {})
+        if "title" not in snippet or "scheduledStartTime" not in snippet:
+            raise _ApiError(HTTPStatus.BAD_REQUEST, "invalidValue", "The snippet requires a title and start time")
+
+        broadcast_id = self.add_broadcast(
+            snippet["title"],
+            utils.parse_gcloud_datetime(snippet["scheduledStartTime"]),
+            description=snippet.get("description", ""),
+            privacy_status=resource.get("status", {}).get("privacyStatus", "private"),
+        )
+        broadcast = self._broadcasts[broadcast_id]
+        broadcast["snippet"]["publishedAt"] = utils.to_gcloud_datetime(datetime.datetime.now(tz=datetime.UTC))
+        if "scheduledEndTime" in snippet:
+            broadcast["snippet"]["scheduledEndTime"] = snippet["scheduledEndTime"]
+        return _copy(broadcast)
+
+    def _update_broadcast(self, _params: dict[str, str], body: bytes | str | None) -> dict[str, Any]:
+        resource = _loads(body)
+        broadcast = self._get_broadcast(resource.get("id"))
+        snippet = resource.get("snippet", {})
+        for key in ("title", "description", "scheduledStartTime", "scheduledEndTime"):
+            if key in snippet:
+                broadcast["snippet"][key] = snippet[key]
+            elif key == "scheduledEndTime":
+                broadcast["snippet"].pop(key, None)
+        if "privacyStatus" in resource.get("status", {}):
+            broadcast["status"]["privacyStatus"] = resource["status"]["privacyStatus"]
+        self._listings.clear()
+        return _copy(broadcast)
+
+    def _delete_broadcast(self, params: dict[str, str], _body: bytes | str | None) -> None:
+        broadcast_id = self._get_broadcast(params.get("id"))["id"]
+        del self._broadcasts[broadcast_id]
+        self._listings.clear()
+        self._videos.pop(broadcast_id, None)
+        self._thumbnails.pop(broadcast_id, None)
+
+    def _list_videos(self, params: dict[str, str], _body: bytes | str | None) -> dict[str, Any]:
+        video_ids = params.get("id", "").split(",")
+        if len(video_ids) > MAX_PAGE_SIZE:
+            raise _ApiError(HTTPStatus.BAD_REQUEST, "invalidValue", f"At most {MAX_PAGE_SIZE} ids can be listed")
+        items = [_copy(self._videos[video_id]) for video_id in video_ids if video_id in self._videos]
+        return _list_response("youtube#videoListResponse", items)
+
+    def _update_video(self, _params: dict[str, str], body: bytes | str | None) -> dict[str, Any]:
+        resource = _loads(body)
+        video = self._videos.get(resource.get("id", ""))
+        if video is None:
+            raise _ApiError(HTTPStatus.NOT_FOUND, "videoNotFound", f"Video {resource.get('id')} not found")
+        snippet = resource.get("snippet", {})
+        if "categoryId" not in snippet or "title" not in snippet:
+            raise _ApiError(HTTPStatus.BAD_REQUEST, "invalidCategoryId", "The snippet requires a title and category")
+        video["snippet"].update(snippet)
+        return _copy(video)
+
+    def _set_thumbnail(self, params: dict[str, str], body: bytes | str | None) -> dict[str, Any]:
+        video_id = params.get("videoId", "")
+        if video_id not in self._videos:
+            raise _ApiError(HTTPStatus.NOT_FOUND, "videoNotFound", f"Video {video_id} not found")
+        self._thumbnails[video_id] = len(_to_bytes(body))
+        url = f"https://i.ytimg.com/vi/{video_id}/default.jpg"
+        return {"kind": "youtube#thumbnailSetResponse", "items": [{"default": {"url": url}}]}
+
+    def _start_upload(self, parsed: urllib.parse.SplitResult, params: dict[str, str]) -> FakeResponse:
+        upload_id = self._new_id()
+        self._uploads[upload_id] = (params.get("videoId", ""), bytearray())
+        location = urllib.parse.urlunsplit(parsed._replace(query=urllib.parse.urlencode({"upload_id": upload_id})))
+        return FakeResponse(HTTPStatus.OK, {"location": location}, b"")
+
+    def _upload_chunk(self, parsed: urllib.parse.SplitResult, body: bytes, headers: dict[str, str]) -> FakeResponse:
+        upload_id = dict(urllib.parse.parse_qsl(parsed.query)).get("upload_id", "")
+        match = _CONTENT_RANGE.fullmatch(_get_header(headers, "content-range") or "")
+        with self._lock:
+            if upload_id not in self._uploads or match is None:
+                return _error_response(HTTPStatus.BAD_REQUEST, "badContent", "Unknown upload or Content-Range")
+
+            video_id, received = self._uploads[upload_id]
+            received.extend(body)
+            total = match.group(3)
+            if total == "*" or len(received) < int(total):
+                return FakeResponse(HTTPStatus.PERMANENT_REDIRECT, {"range": f"bytes=0-{len(received) - 1}"}, b"")
+
+            del self._uploads[upload_id]
+        query = urllib.parse.urlencode({"videoId": video_id})
+        return self._call("POST", parsed._replace(query=query), bytes(received), {})
+
+    def _batch(self, body: str, headers: dict[str, str]) -> FakeResponse:
+        """Serves each part of a multipart/mixed batch request, answering with a part per request."""
+        parser = FeedParser()
+        parser.feed(f"content-type: {_get_header(headers, 'content-type')}\r\n\r\n{body}")
+        message = parser.close()
+        if not message.is_multipart():
+            return _error_response(HTTPStatus.BAD_REQUEST, "badRequest", "The batch is not multipart/mixed")
+
+        boundary = f"batch_{self._new_id()}"
+        parts = []
+        for part in cast("list[Message]", message.get_payload()):
+            request_line, _, serialized = cast("str", part.get_payload()).partition("\n")
+            method, path, _version = request_line.split(" ", 2)
+            part_parser = FeedParser()
+            part_parser.feed(serialized)
+            part_message = part_parser.close()
+            part_headers = {key.lower(): value for key, value in part_message.items()}
+            part_body = cast("str", part_message.get_payload()) or None
+            response = self._call(method, urllib.parse.urlsplit(path), part_body, part_headers)
+
+            content_id = part["Content-ID"].replace("<", "<response-", 1)
+            status_line = f"HTTP/1.1 {response.status} {HTTPStatus(response.status).phrase}"
+            response_headers = {**response.headers, "content-length": str(len(response.content))}
+            response_headers_text = "".join(f"{key}: {value}\r\n" for key, value in response_headers.items())
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                f"{status_line}\r\n{response_headers_text}\r\n{response.content.decode()}\r\n"
+            )
+
+        content = "".join(parts) + f"--{boundary}--\r\n"
+        return FakeResponse(HTTPStatus.OK, {"content-type": f"multipart/mixed; boundary={boundary}"}, content.encode())
+
+    def _get_broadcast(self, broadcast_id: str | None) -> dict[str, Any]:
+        broadcast = self._broadcasts.get(broadcast_id or "")
+        if broadcast is None:
+            raise _ApiError(HTTPStatus.NOT_FOUND, "liveBroadcastNotFound", f"Broadcast {broadcast_id} not found")
+        return broadcast
+
+    def _pop_error(self, method_id: str) -> InjectedError | None:
+        for idx, error in enumerate(self._errors):
+            if error.method_id is None or error.method_id == method_id:
+                return self._errors.pop(idx)
+        return None
+
+    def _new_id(self) -> str:
+        while True:
+            new_id = "".join(self._random.choice(_ID_ALPHABET) for _ in range(11))
+            if new_id not in self._broadcasts and new_id not in self._uploads:
+                return new_id
+
+
+class FakeHttp:
+    """An httplib2.Http compatible transport which serves the requests from a FakeYouTube."""
+
+    def __init__(self, youtube: FakeYouTube) -> None:
+        self.youtube = youtube
+
+    def request(  # noqa: PLR0913
+        self,
+        uri: str,
+        method: str = "GET",
+        body: bytes | str | None = None,
+        headers: dict[str, str] | None = None,
+        redirections: int = httplib2.DEFAULT_MAX_REDIRECTS,
+        connection_type: Any = None,  # noqa: ANN401
+    ) -> tuple[httplib2.Response, bytes]:
+        response = self.youtube.request(method, uri, body, headers or {})
+        return httplib2.Response({"status": str(response.status), **response.headers}), response.content
+
+    def close(self) -> None:
+        pass
+
+
+class FakeSession:
+    """A curl_cffi AsyncSession compatible session which serves the requests from a FakeYouTube."""
+
+    def __init__(self, youtube: FakeYouTube) -> None:
+        self.youtube = youtube
+        self.closed = False
+
+    async def request(
+        self, method: str, url: str, *, data: bytes | None = None, headers: dict[str, str] | None = None
+    ) -> Response:
+        # served from a thread, so that the latency of concurrent requests overlaps as it would over the network
+        response = await asyncio.to_thread(self.youtube.request, method, url, data, headers or {})
+        result = Response(request=Request(url, Headers(headers), method))
+        result.url = url
+        result.status_code = response.status
+        result.reason = HTTPStatus(response.status).phrase
+        result.ok = response.status < HTTPStatus.BAD_REQUEST
+        result.content = response.content
+        result.headers.update(response.headers)
+        return result
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def parse_fields(fields: str) -> dict[str, Any]:
+    """
+    Parses a partial response field mask into a tree of the selected keys, an empty subtree selects the whole value.
+
+    >>> parse_fields("nextPageToken,items(id,snippet/title)")
+    {'nextPageToken': {}, 'items': {'id': {}, 'snippet': {'title': {}}}}
+    """
+    tree, idx = _parse_field_list(fields, 0)
+    if idx != len(fields):
+        msg = f"Invalid fields {fields!r} at {idx}"
+        raise ValueError(msg)
+    return tree
+
+
+def _parse_field_list(fields: str, idx: int) -> tuple[dict[str, Any], int]:
+    tree: dict[str, Any] = {}
+    while True:
+        node = tree
+        while True:
+            match = _FIELD_NAME.match(fields, idx)
+            if match is None:
+                msg = f"Invalid fields {fields!r} at {idx}"
+                raise ValueError(msg)
+            node = node.setdefault(match.group(), {})
+            idx = match.end()
+            if not fields.startswith("/", idx):
+                break
+            idx += 1
+
+        if fields.startswith("(", idx):
+            subtree, idx = _parse_field_list(fields, idx + 1)
+            if not fields.startswith(")", idx):
+                msg = f"Unbalanced parentheses in fields {fields!r}"
+                raise ValueError(msg)
+            node.update(subtree)
+            idx += 1
+
+        if not fields.startswith(",", idx):
+            return tree, idx
+        idx += 1
+
+
+def _select(value: Any, tree: dict[str, Any]) -> Any:  # noqa: ANN401
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [_select(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: _select(value[key], subtree) for key, subtree in tree.items() if key in value}
+    return value
+
+
+def _list_response(
+    kind: str,
+    items: list[dict[str, Any]],
+    total_results: int | None = None,
+    next_page_token: str | None = None,
+    prev_page_token: str | None = None,
+) -> dict[str, Any]:
+    response: dict[str, Any] = {"kind": kind}
+    if next_page_token is not None:
+        response["nextPageToken"] = next_page_token
+    if prev_page_token is not None:
+        response["prevPageToken"] = prev_page_token
+    response["pageInfo"] = {
+        "totalResults": len(items) if total_results is None else total_results,
+        "resultsPerPage": len(items),
+    }
+    response["items"] = items
+    # the ETag changes whenever the contents of the page change
+    response["etag"] = base64.urlsafe_b64encode(
+        hashlib.sha1(json.dumps(response, sort_keys=True).encode()).digest()  # noqa: S324
+    ).decode()[:27]
+    return response
+
+
+def _error_response(
+    status: int, reason: str, message: str | None = None, retry_after: float | None = None
+) -> FakeResponse:
+    message = message or HTTPStatus(status).phrase
+    errors = [{"message": message, "domain": "youtube", "reason": reason}]
+    error = {"code": status, "message": message, "errors": errors}
+    headers = {"content-type": "application/json; charset=UTF-8"}
+    if retry_after is not None:
+        headers["retry-after"] = f"{retry_after:g}"
+    return FakeResponse(status, headers, json.dumps({"error": error}).encode())
+
+
+class _ApiError(Exception):
+    def __init__(self, status: int, reason: str, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+def _encode_page_token(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).decode()
+
+
+def _decode_page_token(page_token: str | None) -> int:
+    if not page_token:
+        return 0
+    try:
+        return int(base64.urlsafe_b64decode(page_token).decode().removeprefix("offset:"))
+    except ValueError as e:
+        raise _ApiError(HTTPStatus.BAD_REQUEST, "invalidPageToken", f"Invalid pageToken {page_token}") from e
+
+
+def _get_header(headers: dict[str, str], name: str) -> str | None:
+    return next((value for key, value in headers.items() if key.lower() == name), None)
+
+
+def _loads(body: bytes | str | None) -> dict[str, Any]:
+    try:
+        return json.loads(body or "{}")
+    except ValueError as e:
+        raise _ApiError(HTTPStatus.BAD_REQUEST, "parseError", "The request body is not valid JSON") from e
+
+
+def _copy(resource: dict[str, Any]) -> dict[str, Any]:
+    return json.loads(json.dumps(resource))
+
+
+def _to_bytes(body: bytes | bytearray | str | None) -> bytes:
+    if body is None:
+        return b""
+    return body.encode() if isinstance(body, str) else bytes(body)
+
+
+def _to_text(body: bytes | str | None) -> str:
+    return _to_bytes(body).decode()
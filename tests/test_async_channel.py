@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import time
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Any
+from unittest import mock
+
+import pytest
+from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+from tenacity import RetryError
+
+from stjoseph.api import constants, models, oauth2, quota, resources, retries, snapshot, thumbnails
+from stjoseph.api.services.async_channel import AsyncChannel, AuthorizedSession
+from stjoseph.api.services.channel import Channel
+from tests import fakes
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from curl_cffi.requests import Response
+
+START = datetime.datetime(2020, 1, 5, 15, tzinfo=datetime.UTC)
+
+
+def test_list_pages(async_channel_svc: AsyncChannel, youtube: fakes.FakeYouTube) -> None:
+    broadcast_ids = youtube.populate(120, START)
+    youtube.populate(3, START + datetime.timedelta(weeks=1000), life_cycle_status="created")
+
+    async def build_indexes() -> tuple[models.BroadcastIndex, models.BroadcastIndex]:
+        async with async_channel_svc:
+            completed = await async_channel_svc.build_index(models.BroadcastStatus.COMPLETED)
+            upcoming = await async_channel_svc.build_index(models.BroadcastStatus.UPCOMING)
+        return completed, upcoming
+
+    completed, upcoming = asyncio.run(build_indexes())
+
+    assert sorted(stream.id for stream in completed) == sorted(broadcast_ids)
+    assert youtube.calls["youtube.liveBroadcasts.list"] == 4
+    assert len(upcoming) == 3
+
+
+def test_snapshot_shared(tmp_path: Path, creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    youtube.populate(75, START)
+    broadcast_snapshot = snapshot.BroadcastSnapshot(tmp_path / "broadcasts.json")
+
+    async def list_twice() -> tuple[list[str], list[str]]:
+        async with AsyncChannel(creds, broadcast_snapshot, session_factory=youtube.session) as channel:
+            items = channel.broadcasts(models.BroadcastStatus.COMPLETED, models.BroadcastType.EVENT)
+            first = [item["id"] async for item in items]
+            items = channel.broadcasts(models.BroadcastStatus.COMPLETED, models.BroadcastType.EVENT)
+            return first, [item["id"] async for item in items]
+
+    first, second = asyncio.run(list_twice())
+
+    # the second listing is not modified
+    assert first == second
+    assert len(second) == 75
+    assert youtube.calls["youtube.liveBroadcasts.list"] == 4
+
+    # and is served to a Channel sharing the snapshot
+    with Channel(creds, broadcast_snapshot, datetime.timedelta(days=1), http_factory=youtube.http) as channel:
+        items = channel.broadcasts(models.BroadcastStatus.COMPLETED, models.BroadcastType.EVENT)
+        assert [item["id"] for item in items] == first
+    assert youtube.calls["youtube.liveBroadcasts.list"] == 4
+
+
+def test_schedule_and_update(async_channel_svc: AsyncChannel, youtube: fakes.FakeYouTube) -> None:
+    async def schedule() -> str:
+        async with async_channel_svc:
+            return await async_channel_svc.schedule_broadcast("Mass", "The readings", START, is_public=True)
+
+    broadcast_id = asyncio.run(schedule())
+
+    broadcast = youtube.broadcasts[broadcast_id]
+    assert broadcast["snippet"]["title"] == "Mass"
+    assert broadcast["status"]["privacyStatus"] == "public"
+    assert youtube.get_category(broadcast_id) == str(models.VideoCategory.NONPROFITS_AND_ACTIVISM)
+    assert youtube.get_thumbnail_size(broadcast_id) == resources.THUMBNAIL.stat().st_size
+
+    async def update() -> None:
+        async with async_channel_svc:
+            await async_channel_svc.update_broadcast(broadcast_id, "Mass", "Other readings", START)
+
+    asyncio.run(update())
+
+    # the category is only updated once, the video already has it (which is read at 1 unit instead)
+    assert youtube.broadcasts[broadcast_id]["snippet"]["description"] == "Other readings"
+    assert youtube.calls["youtube.videos.update"] == 1
+    assert youtube.calls["youtube.videos.list"] == 1
+
+
+def test_concurrent_schedule(async_channel_svc: AsyncChannel, youtube: fakes.FakeYouTube) -> None:
+    youtube.latency = 0.05
+    starts = [START + datetime.timedelta(weeks=idx) for idx in range(5)]
+
+    async def schedule_all() -> list[str]:
+        async with async_channel_svc:
+            return await asyncio.gather(
+                *(async_channel_svc.schedule_broadcast("Mass", "The readings", start) for start in starts)
+            )
+
+    start = time.monotonic()
+    broadcast_ids = asyncio.run(schedule_all())
+
+    # the round trips of the broadcasts overlap on the event loop, rather than adding up
+    assert time.monotonic() - start < youtube.round_trips * youtube.latency / 2
+    assert len(set(broadcast_ids)) == len(youtube) == len(starts)
+    assert youtube.calls["youtube.thumbnails.set"] == len(starts)
+
+
+def test_delete_broadcast(tmp_path: Path, creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    deleted_id, kept_id = youtube.populate(2, START)
+    manager = thumbnails.ThumbnailManager(tmp_path / "thumbnails.json")
+    manager.record(deleted_id, "digest")
+    manager.record(kept_id, "digest")
+
+    async def delete() -> None:
+        async with AsyncChannel(creds, thumbnail_manager=manager, session_factory=youtube.session) as channel:
+            await channel.delete_broadcast(deleted_id)
+
+    asyncio.run(delete())
+
+    assert list(youtube.broadcasts) == [kept_id]
+    assert manager.get_digest(deleted_id) is None
+    assert manager.get_digest(kept_id) == "digest"
+
+
+def test_fields(async_channel_svc: AsyncChannel, youtube: fakes.FakeYouTube) -> None:
+    youtube.populate(1, START)
+
+    async def list_items() -> list[dict[str, Any]]:
+        async with async_channel_svc:
+            items = async_channel_svc.broadcasts(
+                models.BroadcastStatus.COMPLETED, models.BroadcastType.EVENT, "items(id,snippet/title)"
+            )
+            return [item async for item in items]
+
+    (item,) = asyncio.run(list_items())
+
+    assert set(item) == {"id", "snippet"}
+    assert set(item["snippet"]) == {"title"}
+
+
+def get_channels(channel: AsyncChannel) -> None:
+    async def get() -> None:
+        async with channel:
+            await channel.get_channels()
+
+    asyncio.run(get())
+
+
+@pytest.mark.parametrize("status", [HTTPStatus.FORBIDDEN, HTTPStatus.SERVICE_UNAVAILABLE])
+def test_retry_injected_error(async_channel_svc: AsyncChannel, youtube: fakes.FakeYouTube, status: HTTPStatus) -> None:
+    youtube.inject_error(status, "backendError", "youtube.channels.list")
+
+    get_channels(async_channel_svc)
+
+    assert youtube.calls["youtube.channels.list"] == 2
+
+
+def test_injected_error_exhausts_retries(creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    policy = retries.RetryPolicy(backoff=0.01)
+    youtube.inject_error(HTTPStatus.SERVICE_UNAVAILABLE, "backendError", count=10)
+
+    with pytest.raises(RetryError):
+        get_channels(AsyncChannel(creds, session_factory=youtube.session, retry_policy=policy))
+
+    assert youtube.calls["youtube.channels.list"] == retries.DEFAULT_ATTEMPTS[retries.ErrorKind.TRANSIENT]
+    assert policy.budget.remaining == constants.RETRY_BUDGET - youtube.calls["youtube.channels.list"] + 1
+
+
+def test_quota_exceeded_not_retried(async_channel_svc: AsyncChannel, youtube: fakes.FakeYouTube) -> None:
+    youtube.inject_error(HTTPStatus.FORBIDDEN, "quotaExceeded", count=5)
+
+    with pytest.raises(HttpError):
+        get_channels(async_channel_svc)
+
+    assert youtube.calls["youtube.channels.list"] == 1
+
+
+def test_retry_after(async_channel_svc: AsyncChannel, youtube: fakes.FakeYouTube) -> None:
+    youtube.inject_error(HTTPStatus.TOO_MANY_REQUESTS, "rateLimitExceeded", count=2, retry_after=0.2)
+
+    start = time.monotonic()
+    get_channels(async_channel_svc)
+
+    assert time.monotonic() - start >= 0.4
+    assert youtube.calls["youtube.channels.list"] == 3
+
+
+def test_circuit_breaker(creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    policy = retries.RetryPolicy(backoff=0.01, breaker=retries.CircuitBreaker(threshold=3))
+    youtube.inject_error(HTTPStatus.SERVICE_UNAVAILABLE, "backendError", count=100)
+    channel = AsyncChannel(creds, session_factory=youtube.session, retry_policy=policy)
+
+    # the retries stop as soon as the circuit opens
+    with pytest.raises(retries.CircuitOpenError):
+        get_channels(channel)
+    assert youtube.calls["youtube.channels.list"] == 3
+
+    with pytest.raises(retries.CircuitOpenError):
+        get_channels(channel)
+    assert youtube.calls["youtube.channels.list"] == 3
+
+
+def test_quota_charged_as_channel(tmp_path: Path, creds: oauth2.CredentialsManager) -> None:
+    youtube = fakes.FakeYouTube()
+    (video_id,) = youtube.populate(1, START, life_cycle_status="created")
+    ledger = quota.QuotaLedger(tmp_path / "quota.json")
+    with Channel(creds, quota_ledger=ledger, http_factory=youtube.http) as channel:
+        channel.build_index(models.BroadcastStatus.UPCOMING)
+        channel.schedule_broadcast("Mass", "The readings", START + datetime.timedelta(weeks=1))
+        channel.update_broadcast(video_id, "Mass", "The readings", START)
+
+    async_youtube = fakes.FakeYouTube()
+    (video_id,) = async_youtube.populate(1, START, life_cycle_status="created")
+    async_ledger = quota.QuotaLedger(tmp_path / "async_quota.json")
+
+    async def run() -> None:
+        async with AsyncChannel(creds, quota_ledger=async_ledger, session_factory=async_youtube.session) as channel:
+            await channel.build_index(models.BroadcastStatus.UPCOMING)
+            await channel.schedule_broadcast("Mass", "The readings", START + datetime.timedelta(weeks=1))
+            await channel.update_broadcast(video_id, "Mass", "The readings", START)
+
+    asyncio.run(run())
+
+    assert async_ledger.usage() == ledger.usage()
+    assert async_youtube.calls == youtube.calls
+    assert quota.QuotaLedger(tmp_path / "async_quota.json").used() == ledger.used()
+
+
+def test_quota_refused(tmp_path: Path, creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    path = tmp_path / "quota.json"
+    channel = AsyncChannel(creds, quota_ledger=quota.QuotaLedger(path, budget=1), session_factory=youtube.session)
+
+    get_channels(channel)
+    with pytest.raises(quota.QuotaExceededError):
+        get_channels(channel)
+
+    # the refused call is neither made nor charged, and the usage is saved on close
+    assert youtube.calls["youtube.channels.list"] == 1
+    assert quota.QuotaLedger(path).used() == 1
+
+
+@pytest.fixture
+def manager(tmp_path: Path) -> thumbnails.ThumbnailManager:
+    return thumbnails.ThumbnailManager(tmp_path / "thumbnails.json")
+
+
+@pytest.fixture
+def thumbnail_channel(
+    creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube, manager: thumbnails.ThumbnailManager
+) -> AsyncChannel:
+    return AsyncChannel(creds, thumbnail_manager=manager, session_factory=youtube.session)
+
+
+def test_update_skips_recorded(
+    thumbnail_channel: AsyncChannel, youtube: fakes.FakeYouTube, manager: thumbnails.ThumbnailManager
+) -> None:
+    (video_id,) = youtube.populate(1, START, life_cycle_status="created")
+    manager.record(video_id, "digest of a previous image")
+
+    async def update(description: str) -> None:
+        async with thumbnail_channel:
+            await thumbnail_channel.update_broadcast(video_id, "Mass", description, START)
+
+    asyncio.run(update("The readings"))
+    assert youtube.calls["youtube.thumbnails.set"] == 1
+
+    # the image is now recorded as set on the video, so updating it again does not upload it
+    asyncio.run(update("Other readings"))
+
+    assert youtube.calls["youtube.thumbnails.set"] == 1
+    assert youtube.calls["youtube.liveBroadcasts.update"] == 2
+    assert manager.has_thumbnail(video_id, manager.digest(resources.THUMBNAIL))
+
+
+def test_thumbnail_failure(
+    thumbnail_channel: AsyncChannel, youtube: fakes.FakeYouTube, manager: thumbnails.ThumbnailManager
+) -> None:
+    youtube.inject_error(HTTPStatus.BAD_REQUEST, "invalidImage", "youtube.thumbnails.set")
+
+    async def schedule() -> str:
+        async with thumbnail_channel:
+            return await thumbnail_channel.schedule_broadcast("Mass", "The readings", START)
+
+    video_id = asyncio.run(schedule())
+
+    assert list(thumbnail_channel.thumbnail_failures) == [video_id]
+    assert manager.pending() == [video_id]
+
+
+def test_resume_thumbnails(
+    thumbnail_channel: AsyncChannel, youtube: fakes.FakeYouTube, manager: thumbnails.ThumbnailManager
+) -> None:
+    (video_id,) = youtube.populate(1, START, life_cycle_status="created")
+    (completed_id,) = youtube.populate(1, START - datetime.timedelta(weeks=1))
+    manager.add_pending(video_id)
+    manager.add_pending(completed_id)
+
+    async def resume() -> list[str]:
+        async with thumbnail_channel:
+            index = await thumbnail_channel.build_index(models.BroadcastStatus.UPCOMING)
+            return thumbnail_channel.resume_thumbnails(index)
+
+    assert asyncio.run(resume()) == [video_id]
+
+    # the pending video which is no longer upcoming is forgotten
+    assert youtube.calls["youtube.thumbnails.set"] == 1
+    assert manager.get_digest(video_id) == manager.digest(resources.THUMBNAIL)
+    assert not manager.pending()
+
+
+class RecordingSession(fakes.FakeSession):
+    """Records the Authorization header of each request."""
+
+    def __init__(self, youtube: fakes.FakeYouTube) -> None:
+        super().__init__(youtube)
+        self.authorizations: list[str | None] = []
+
+    async def request(
+        self, method: str, url: str, *, data: bytes | None = None, headers: dict[str, str] | None = None
+    ) -> Response:
+        self.authorizations.append((headers or {}).get("Authorization"))
+        return await super().request(method, url, data=data, headers=headers)
+
+
+def _utcnow() -> datetime.datetime:
+    # google-auth compares naive UTC datetimes
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+def test_authorized_session(tmp_path: Path, youtube: fakes.FakeYouTube) -> None:
+    token_file = tmp_path / "token.json"
+    expiry = _utcnow() + datetime.timedelta(hours=1)
+    info = {"token": "token", "refresh_token": "refresh", "client_id": "client", "client_secret": "secret"}
+    token_file.write_text(json.dumps({**info, "expiry": expiry.isoformat() + "Z"}))
+    creds = oauth2.CredentialsManager(tmp_path / "credentials.json", token_file)
+    session = RecordingSession(youtube)
+    youtube.inject_error(HTTPStatus.UNAUTHORIZED, "authError")
+
+    def refresh(self: Credentials, _request: object) -> None:
+        self.token = "refreshed"
+        self.expiry = _utcnow() + datetime.timedelta(hours=1)
+
+    with mock.patch.object(Credentials, "refresh", refresh):
+        get_channels(AsyncChannel(creds, session_factory=lambda: AuthorizedSession(creds, session)))
+
+    # the rejected token is refreshed before the call is retried
+    assert session.authorizations == ["Bearer token", "Bearer refreshed"]
+    assert json.loads(token_file.read_text())["token"] == "refreshed"
+    assert session.closed
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+from http import HTTPStatus
+from typing import TYPE_CHECKING
+
+import pytest
+from curl_cffi.requests.exceptions import HTTPError
+
+from stjoseph.api import cassette, oauth2
+from stjoseph.api.services.channel import Channel
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+    import httplib2
+
+    from tests import fakes
+
+START = datetime.datetime(2020, 1, 5, 15, tzinfo=datetime.UTC)
+
+
+def _list_completed(creds: oauth2.CredentialsManager, http_factory: Callable[[], httplib2.Http]) -> list[str]:
+    with Channel(creds, http_factory=http_factory) as channel:
+        return [stream.id for stream in channel.list_completed_livestreams()]
+
+
+def test_record_replay_channel(tmp_path: Path, creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    youtube.populate(120, START)
+    youtube.inject_error(HTTPStatus.SERVICE_UNAVAILABLE, "backendError")
+    path = tmp_path / "cassette.json"
+
+    recorder = cassette.Cassette(path, "record")
+    recorded = _list_completed(creds, recorder.http_factory(youtube.http))
+    recorder.save()
+
+    player = cassette.Cassette(path, "replay")
+    assert _list_completed(creds, player.http_factory()) == recorded
+    assert youtube.round_trips == 4
+
+    with pytest.raises(cassette.CassetteError):
+        _list_completed(creds, player.http_factory())
+
+
+def test_replay_session(tmp_path: Path) -> None:
+    url = "https://bible.usccb.org/bible/readings/010525.cfm"
+    path = tmp_path / "cassette.json"
+    recorder = cassette.Cassette(path, "record")
+    recorder.record(cassette.Interaction("GET", url, HTTPStatus.NOT_FOUND, {}, b"", 0.0))
+    recorder.record(cassette.Interaction("GET", url, HTTPStatus.OK, {"content-type": "text/html"}, b"<html/>", 0.5))
+    recorder.save()
+
+    session = cassette.Cassette(path, "replay").session()
+    response = asyncio.run(session.get(url))
+    with pytest.raises(HTTPError) as exc_info:
+        response.raise_for_status()
+    assert exc_info.value.response.status_code == HTTPStatus.NOT_FOUND
+
+    response = asyncio.run(session.get(url))
+    assert response.text == "<html/>"
+    assert response.headers["content-type"] == "text/html"
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import datetime
+import threading
+import time
+from http import HTTPStatus
+from typing import TYPE_CHECKING, NamedTuple
+
+import pytest
+from googleapiclient.errors import HttpError
+from tenacity import RetryError
+
+from stjoseph.api import constants, models, oauth2, quota, retries, snapshot
+from stjoseph.api.services.channel import Channel
+from tests import fakes
+
+if TYPE_CHECKING:
+    import collections
+    from pathlib import Path
+
+START = datetime.datetime(2020, 1, 5, 15, tzinfo=datetime.UTC)
+
+
+def test_list_pages(channel_svc: Channel, youtube: fakes.FakeYouTube) -> None:
+    broadcast_ids = youtube.populate(120, START)
+    youtube.populate(3, START + datetime.timedelta(weeks=1000), life_cycle_status="created")
+
+    completed = list(channel_svc.list_completed_livestreams())
+
+    assert sorted(stream.id for stream in completed) == sorted(broadcast_ids)
+    assert youtube.calls["youtube.liveBroadcasts.list"] == 3
+    assert len(list(channel_svc.list_scheduled_livestreams())) == 3
+
+
+def test_list_eligible_for_deletion(channel_svc: Channel, youtube: fakes.FakeYouTube) -> None:
+    youtube.populate(10, START)
+    short_ids = youtube.populate(2, START, duration=datetime.timedelta(minutes=5))
+    never_live_ids = youtube.populate(2, START, duration=None)
+
+    eligible = {stream.id for stream in channel_svc.list_eligible_for_deletion()}
+
+    assert eligible == {*short_ids, *never_live_ids}
+
+
+def test_snapshot_not_modified(tmp_path: Path, creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    youtube.populate(75, START)
+    broadcast_snapshot = snapshot.BroadcastSnapshot(tmp_path / "broadcasts.json")
+    with Channel(creds, broadcast_snapshot, http_factory=youtube.http) as channel:
+        first = list(channel.list_completed_livestreams())
+        second = list(channel.list_completed_livestreams())
+
+    assert first == second
+    assert len(second) == 75
+    assert youtube.calls["youtube.liveBroadcasts.list"] == 4
+
+
+def test_schedule_and_update(channel_svc: Channel, youtube: fakes.FakeYouTube) -> None:
+    broadcast_id = channel_svc.schedule_broadcast("Mass", "The readings", START, is_public=True)
+    channel_svc.close()
+
+    broadcast = youtube.broadcasts[broadcast_id]
+    assert broadcast["snippet"]["title"] == "Mass"
+    assert broadcast["status"]["privacyStatus"] == "public"
+    assert youtube.get_category(broadcast_id) == str(models.VideoCategory.NONPROFITS_AND_ACTIVISM)
+    assert youtube.get_thumbnail_size(broadcast_id)
+
+    youtube.round_trips = 0
+    channel_svc.update_broadcast(broadcast_id, "Mass", "Other readings", START)
+
+    # the category is read rather than written again, which saves quota but not a round trip
+    assert youtube.broadcasts[broadcast_id]["snippet"]["description"] == "Other readings"
+    assert youtube.calls["youtube.videos.update"] == 1
+    assert youtube.calls["youtube.videos.list"] == 1
+    assert youtube.round_trips == 2
+
+
+def test_delete_broadcasts(channel_svc: Channel, youtube: fakes.FakeYouTube) -> None:
+    broadcast_ids = youtube.populate(60, START)
+
+    results = channel_svc.delete_broadcasts([*broadcast_ids, "missing"])
+
+    assert results == {**dict.fromkeys(broadcast_ids, True), "missing": False}
+    assert len(youtube) == 0
+    assert youtube.round_trips == 2
+
+
+class DeleteRun(NamedTuple):
+    results: dict[str, bool]
+    calls: collections.Counter[str]
+    usage: dict[str, quota.MethodUsage]
+    transports: list[str]  # the name of the thread which created each transport, and so Resource
+
+
+def run_delete_broadcasts(tmp_path: Path, creds: oauth2.CredentialsManager, workers: int) -> DeleteRun:
+    # the latency keeps each worker busy with a batch, while the others are picked up by the other workers
+    youtube = fakes.FakeYouTube(latency=0.05)
+    broadcast_ids = youtube.populate(4 * constants.MAX_BATCH_SIZE, START)
+    ledger = quota.QuotaLedger(tmp_path / f"quota-{workers}.json")
+    transports: list[str] = []
+
+    def http_factory() -> fakes.FakeHttp:
+        transports.append(threading.current_thread().name)
+        return youtube.http()
+
+    with Channel(creds, workers=workers, quota_ledger=ledger, http_factory=http_factory) as channel:
+        results = channel.delete_broadcasts([*broadcast_ids, "missing"])
+
+    assert quota.QuotaLedger(ledger.path).usage() == ledger.usage()
+    return DeleteRun(results, youtube.calls, ledger.usage(), transports)
+
+
+def test_delete_broadcasts_workers(tmp_path: Path, creds: oauth2.CredentialsManager) -> None:
+    serial = run_delete_broadcasts(tmp_path, creds, workers=1)
+    concurrent = run_delete_broadcasts(tmp_path, creds, workers=4)
+
+    # the batches were fanned out to the workers, each building its own Resource over its own transport
+    assert len(serial.transports) == 1
+    assert len(concurrent.transports) == len(set(concurrent.transports)) == 4
+    assert all(name.startswith("channel") for name in concurrent.transports)
+
+    # with the same outcome, and every call charged once to the ledger shared by the workers
+    assert concurrent.results == serial.results
+    assert concurrent.results["missing"] is False
+    assert sum(concurrent.results.values()) == 4 * constants.MAX_BATCH_SIZE
+    assert concurrent.calls == serial.calls
+    assert concurrent.usage == serial.usage
+    assert concurrent.usage["youtube.liveBroadcasts.delete"].calls == len(concurrent.results)
+
+
+@pytest.mark.parametrize("status", [HTTPStatus.FORBIDDEN, HTTPStatus.SERVICE_UNAVAILABLE])
+def test_retry_injected_error(channel_svc: Channel, youtube: fakes.FakeYouTube, status: HTTPStatus) -> None:
+    youtube.populate(5, START)
+    youtube.inject_error(status, "backendError", "youtube.liveBroadcasts.list")
+
+    assert len(list(channel_svc.list_completed_livestreams())) == 5
+    assert youtube.calls["youtube.liveBroadcasts.list"] == 2
+
+
+def test_injected_error_exhausts_retries(creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    policy = retries.RetryPolicy(backoff=0.01)
+    youtube.inject_error(HTTPStatus.SERVICE_UNAVAILABLE, "backendError", count=10)
+
+    with Channel(creds, http_factory=youtube.http, retry_policy=policy) as channel, pytest.raises(RetryError):
+        channel.get_channels()
+
+    assert youtube.calls["youtube.channels.list"] == retries.DEFAULT_ATTEMPTS[retries.ErrorKind.TRANSIENT]
+    assert policy.budget.remaining == constants.RETRY_BUDGET - youtube.calls["youtube.channels.list"] + 1
+
+
+def test_quota_exceeded_not_retried(channel_svc: Channel, youtube: fakes.FakeYouTube) -> None:
+    youtube.inject_error(HTTPStatus.FORBIDDEN, "quotaExceeded", count=5)
+
+    with pytest.raises(HttpError):
+        channel_svc.get_channels()
+
+    assert youtube.calls["youtube.channels.list"] == 1
+
+
+def test_retry_after(channel_svc: Channel, youtube: fakes.FakeYouTube) -> None:
+    youtube.inject_error(HTTPStatus.TOO_MANY_REQUESTS, "rateLimitExceeded", count=2, retry_after=0.2)
+
+    start = time.monotonic()
+    channel_svc.get_channels()
+
+    assert time.monotonic() - start >= 0.4
+    assert youtube.calls["youtube.channels.list"] == 3
+
+
+def test_circuit_breaker(creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    policy = retries.RetryPolicy(backoff=0.01, breaker=retries.CircuitBreaker(threshold=3))
+    youtube.inject_error(HTTPStatus.SERVICE_UNAVAILABLE, "backendError", count=100)
+
+    with Channel(creds, http_factory=youtube.http, retry_policy=policy) as channel:
+        # the retries stop as soon as the circuit opens
+        with pytest.raises(retries.CircuitOpenError):
+            channel.get_channels()
+        assert youtube.calls["youtube.channels.list"] == 3
+
+        with pytest.raises(retries.CircuitOpenError):
+            channel.get_channels()
+        assert youtube.calls["youtube.channels.list"] == 3
+
+
+def test_fields(channel_svc: Channel, youtube: fakes.FakeYouTube) -> None:
+    youtube.populate(1, START)
+
+    (item,) = channel_svc.broadcasts(
+        models.BroadcastStatus.COMPLETED, models.BroadcastType.EVENT, "items(id,snippet/title)"
+    )
+
+    assert set(item) == {"id", "snippet"}
+    assert set(item["snippet"]) == {"title"}
+
+
+def create_deferred_channel(
+    creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube, retry_policy: retries.RetryPolicy | None = None
+) -> Channel:
+    return Channel(creds, defer_category=True, http_factory=youtube.http, retry_policy=retry_policy)
+
+
+def test_sync_categories(creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    category_id = str(models.VideoCategory.NONPROFITS_AND_ACTIVISM)
+    unchanged_id = youtube.add_broadcast("Mass", START, category_id=category_id)
+    with create_deferred_channel(creds, youtube) as channel:
+        inserted_ids = [
+            channel.schedule_broadcast("Mass", "The readings", START + datetime.timedelta(weeks=idx))
+            for idx in range(1, 3)
+        ]
+        channel.update_broadcast(unchanged_id, "Mass", "The readings", START)
+        assert youtube.calls["youtube.videos.update"] == 0
+
+        results = channel.sync_categories()
+
+    # only the videos with another category were updated
+    assert results == dict.fromkeys([*inserted_ids, unchanged_id], True)
+    assert youtube.calls["youtube.videos.update"] == len(inserted_ids)
+    assert all(youtube.get_category(video_id) == category_id for video_id in results)
+
+
+def test_close_syncs_categories(creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    with create_deferred_channel(creds, youtube) as channel:
+        broadcast_id = channel.schedule_broadcast("Mass", "The readings", START)
+        assert youtube.get_category(broadcast_id) == fakes.DEFAULT_CATEGORY_ID
+
+    assert youtube.get_category(broadcast_id) == str(models.VideoCategory.NONPROFITS_AND_ACTIVISM)
+
+
+def test_sync_categories_failed(creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    with create_deferred_channel(creds, youtube) as channel:
+        deleted_id = channel.schedule_broadcast("Mass", "The readings", START)
+        broadcast_id = channel.schedule_broadcast("Mass", "The readings", START + datetime.timedelta(weeks=1))
+        channel.delete_broadcast(deleted_id)
+
+        results = channel.sync_categories()
+
+        # the sub-request which failed is reported, the other one is still updated
+        assert results == {deleted_id: False, broadcast_id: True}
+        assert youtube.get_category(broadcast_id) == str(models.VideoCategory.NONPROFITS_AND_ACTIVISM)
+        youtube.calls.clear()
+
+    # nothing is left pending for close
+    assert youtube.calls["youtube.videos.update"] == 0
+
+
+def test_sync_categories_retried(creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    policy = retries.RetryPolicy(backoff=0.01)
+    with create_deferred_channel(creds, youtube, retry_policy=policy) as channel:
+        broadcast_ids = [
+            channel.schedule_broadcast("Mass", "The readings", START + datetime.timedelta(weeks=idx))
+            for idx in range(2)
+        ]
+        youtube.inject_error(HTTPStatus.SERVICE_UNAVAILABLE, "backendError", "youtube.videos.update")
+
+        results = channel.sync_categories()
+
+    # only the sub-request which failed is sent again
+    assert results == dict.fromkeys(broadcast_ids, True)
+    assert youtube.calls["youtube.videos.update"] == len(broadcast_ids) + 1
+
+
+def test_delete_broadcasts_retry_after(channel_svc: Channel, youtube: fakes.FakeYouTube) -> None:
+    broadcast_ids = youtube.populate(3, START)
+    youtube.inject_error(HTTPStatus.TOO_MANY_REQUESTS, "rateLimitExceeded", "youtube.liveBroadcasts.delete", 2, 0.2)
+
+    start = time.monotonic()
+    results = channel_svc.delete_broadcasts(broadcast_ids)
+
+    assert time.monotonic() - start >= 0.2
+    assert results == dict.fromkeys(broadcast_ids, True)
+    assert youtube.calls["youtube.liveBroadcasts.delete"] == len(broadcast_ids) + 2
+
+
+@pytest.mark.parametrize(
+    ("status", "reason"), [(HTTPStatus.FORBIDDEN, "quotaExceeded"), (HTTPStatus.BAD_REQUEST, "invalidValue")]
+)
+def test_delete_broadcasts_not_retried(
+    channel_svc: Channel, youtube: fakes.FakeYouTube, status: HTTPStatus, reason: str
+) -> None:
+    failed_id, *deleted_ids = youtube.populate(3, START)
+    youtube.inject_error(status, reason, "youtube.liveBroadcasts.delete")
+
+    results = channel_svc.delete_broadcasts([failed_id, *deleted_ids])
+
+    # the sub-request which failed is dropped rather than sent again
+    assert results == {failed_id: False, **dict.fromkeys(deleted_ids, True)}
+    assert youtube.calls["youtube.liveBroadcasts.delete"] == len(deleted_ids) + 1
+    assert list(youtube.broadcasts) == [failed_id]
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import datetime
+import json
+import threading
+import time
+from typing import TYPE_CHECKING, Any
+from unittest import mock
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from stjoseph.api import oauth2
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+SCOPES = ["https://www.googleapis.com/auth/youtube"]
+
+
+def _utcnow() -> datetime.datetime:
+    # google-auth compares naive UTC datetimes
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+@pytest.fixture
+def token_file(tmp_path: Path) -> Path:
+    token_file = tmp_path / "token.json"
+    token_file.write_text(
+        json.dumps(
+            {
+                "token": "stale",
+                "refresh_token": "refresh",
+                "client_id": "client",
+                "client_secret": "secret",
+                "expiry": (_utcnow() - datetime.timedelta(hours=1)).isoformat() + "Z",
+            }
+        )
+    )
+    return token_file
+
+
+@pytest.fixture
+def refreshes() -> Any:  # noqa: ANN401
+    calls = []
+
+    def refresh(self: Credentials, _request: object) -> None:
+        calls.append(self.token)
+        time.sleep(0.05)
+        self.token = f"fresh-{len(calls)}"
+        self.expiry = _utcnow() + datetime.timedelta(hours=1)
+
+    with mock.patch.object(Credentials, "refresh", refresh):
+        yield calls
+
+
+def test_create_cached(tmp_path: Path, token_file: Path, refreshes: list[str]) -> None:
+    manager = oauth2.CredentialsManager(tmp_path / "credentials.json", token_file)
+
+    first = manager.create_oauth_credentials(SCOPES)
+    second = manager.create_oauth_credentials(SCOPES)
+
+    assert first is second
+    assert first.token == "fresh-1"
+    assert refreshes == ["stale"]
+    assert json.loads(token_file.read_text())["token"] == "fresh-1"
+
+
+def test_concurrent_refresh_shared(tmp_path: Path, token_file: Path, refreshes: list[str]) -> None:
+    # each manager stands for another process using the token
+    managers = [oauth2.CredentialsManager(tmp_path / "credentials.json", token_file) for _ in range(4)]
+    tokens: list[str] = []
+
+    def create(manager: oauth2.CredentialsManager) -> None:
+        tokens.append(manager.create_oauth_credentials(SCOPES).token)
+
+    threads = [threading.Thread(target=create, args=(manager,)) for manager in managers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert refreshes == ["stale"]
+    assert tokens == ["fresh-1"] * 4
+
+
+def test_refresh_uses_refreshed_token(tmp_path: Path, token_file: Path, refreshes: list[str]) -> None:
+    first = oauth2.CredentialsManager(tmp_path / "credentials.json", token_file).create_oauth_credentials(SCOPES)
+    second = oauth2.CredentialsManager(tmp_path / "credentials.json", token_file).create_oauth_credentials(SCOPES)
+    first.token = "rejected"
+
+    second.refresh(mock.Mock())
+    first.refresh(mock.Mock())
+
+    assert refreshes == ["stale", "fresh-1"]
+    assert first.token == second.token == "fresh-2"
+
+
+def test_invalidate_keeps_refresh_token(tmp_path: Path, token_file: Path, refreshes: list[str]) -> None:
+    manager = oauth2.CredentialsManager(tmp_path / "credentials.json", token_file)
+    manager.create_oauth_credentials(SCOPES)
+
+    assert manager.invalidate_token()
+
+    info = json.loads(token_file.read_text())
+    assert info["refresh_token"] == "refresh"
+    assert "expiry" not in info
+    assert manager.create_oauth_credentials(SCOPES).token == "fresh-2"
+    assert len(refreshes) == 2
+
+
+def test_invalidate_keeps_changed_token(tmp_path: Path, token_file: Path, refreshes: list[str]) -> None:
+    manager = oauth2.CredentialsManager(tmp_path / "credentials.json", token_file)
+    other = oauth2.CredentialsManager(tmp_path / "credentials.json", token_file)
+    manager.create_oauth_credentials(SCOPES)
+    other.write_token(token_file.read_text().replace("fresh-1", "other"))
+
+    assert not manager.invalidate_token()
+
+    assert json.loads(token_file.read_text())["token"] == "other"
+    assert refreshes == ["stale"]
+
+
+def test_refresh_if_expiring(tmp_path: Path, token_file: Path, refreshes: list[str]) -> None:
+    manager = oauth2.CredentialsManager(tmp_path / "credentials.json", token_file)
+    creds = manager.create_oauth_credentials(SCOPES)
+
+    assert not manager.refresh_if_expiring(creds, datetime.timedelta(minutes=5))
+    assert manager.refresh_if_expiring(creds, datetime.timedelta(hours=2))
+    assert refreshes == ["stale", "fresh-1"]
+
+
+def test_background_refresh(tmp_path: Path, token_file: Path, refreshes: list[str]) -> None:
+    manager = oauth2.CredentialsManager(tmp_path / "credentials.json", token_file)
+    creds = manager.create_oauth_credentials(SCOPES)
+
+    refresher = manager.start_refresher(creds, datetime.timedelta(hours=1, seconds=-0.1))
+    deadline = time.monotonic() + 5
+    while len(refreshes) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    refresher.stop()
+
+    assert refreshes[:3] == ["stale", "fresh-1", "fresh-2"]
+    assert json.loads(token_file.read_text())["token"] == creds.token
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import datetime
+import io
+import json
+from typing import TYPE_CHECKING, Any
+from unittest import mock
+
+import pytest
+
+from stjoseph.api import constants, export, models, utils
+from stjoseph.api.services.channel import Channel, create_live_stream
+from stjoseph.commands import channel
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from tests import fakes
+
+START = datetime.datetime(2020, 1, 5, 15, tzinfo=datetime.UTC)
+
+
+@pytest.fixture
+def youtube(youtube: fakes.FakeYouTube) -> fakes.FakeYouTube:
+    youtube.populate(200, START, datetime.timedelta(days=1))
+    return youtube
+
+
+def test_select_streams(youtube: fakes.FakeYouTube) -> None:
+    streams = [create_live_stream(item) for item in youtube.broadcasts.values()]
+    streams.sort(key=lambda stream: stream.scheduled_start or START, reverse=True)
+    iterated: list[models.LiveStream] = []
+
+    def iterate() -> Iterator[models.LiveStream]:
+        for stream in streams:
+            iterated.append(stream)
+            yield stream
+
+    selected = list(
+        export.select_streams(
+            iterate(),
+            since=START + datetime.timedelta(days=100),
+            until=START + datetime.timedelta(days=110),
+            newest_first=True,
+        )
+    )
+
+    assert [stream.scheduled_start for stream in selected] == [
+        START + datetime.timedelta(days=days) for days in range(109, 99, -1)
+    ]
+    assert len(iterated) == 101  # stopped at the first stream before since
+
+
+def test_select_streams_unordered(youtube: fakes.FakeYouTube) -> None:
+    streams = [create_live_stream(item) for item in youtube.broadcasts.values()]
+    streams.sort(key=lambda stream: stream.scheduled_start or START)
+
+    selected = list(export.select_streams(streams, limit=5, since=START + datetime.timedelta(days=100)))
+
+    # the streams before since are skipped rather than ending the selection
+    assert [stream.scheduled_start for stream in selected] == [
+        START + datetime.timedelta(days=days) for days in range(100, 105)
+    ]
+
+
+@pytest.mark.parametrize("export_format", ["jsonl", "csv", "ids0", "text"])
+def test_write_streams(youtube: fakes.FakeYouTube, export_format: export.ExportFormat) -> None:
+    streams = [create_live_stream(item) for item in youtube.broadcasts.values()][:3]
+    file = io.StringIO()
+
+    assert export.write_streams(streams, file, export_format) == 3
+
+    output = file.getvalue()
+    if export_format == "jsonl":
+        assert [json.loads(line)["id"] for line in output.splitlines()] == [stream.id for stream in streams]
+        assert json.loads(output.splitlines()[0])["status"] == "completed"
+    elif export_format == "csv":
+        rows = list(csv.DictReader(io.StringIO(output)))
+        assert [row["id"] for row in rows] == [stream.id for stream in streams]
+        assert rows[0]["scheduled_start"] == streams[0].to_dict()["scheduled_start"]
+    elif export_format == "ids0":
+        assert output.split("\0") == [*(stream.id for stream in streams), ""]
+    else:
+        assert output.splitlines() == [str(stream) for stream in streams]
+
+
+def to_jsonl(streams: Iterable[models.LiveStream]) -> str:
+    file = io.StringIO()
+    export.write_streams(streams, file, "jsonl")
+    return file.getvalue()
+
+
+@pytest.mark.parametrize(
+    ("listing", "broadcast_status"),
+    [
+        ("list_scheduled_livestreams", models.BroadcastStatus.UPCOMING),
+        ("list_completed_livestreams", models.BroadcastStatus.COMPLETED),
+        ("list_eligible_for_deletion", models.BroadcastStatus.COMPLETED),
+    ],
+)
+def test_masked_output(
+    channel_svc: Channel, youtube: fakes.FakeYouTube, listing: str, broadcast_status: models.BroadcastStatus
+) -> None:
+    later = START + datetime.timedelta(weeks=1000)
+    youtube.add_broadcast("Mass", later, description="The readings", privacy_status="public", scheduled_end=later)
+    short_end = START + datetime.timedelta(minutes=5)
+    youtube.add_broadcast("Mass", START, "complete", START, short_end, "The readings", scheduled_end=short_end)
+    unmasked = [
+        create_live_stream(item) for item in channel_svc.broadcasts(broadcast_status, models.BroadcastType.EVENT)
+    ]
+    if listing == "list_eligible_for_deletion":
+        unmasked = [stream for stream in unmasked if stream.is_eligible_for_deletion()]
+
+    masked = list(getattr(channel_svc, listing)())
+
+    # the masks keep every field which the list commands output
+    assert to_jsonl(masked) == to_jsonl(unmasked)
+    assert any(stream.description and stream.scheduled_end and stream.privacy_status for stream in masked)
+
+
+@pytest.mark.parametrize(("limit", "pages"), [(50, 1), (60, 2), (100, 2)])
+@pytest.mark.usefixtures("patched_create_channel")
+def test_list_limit_stops_paging(
+    cli_args: list[str], youtube: fakes.FakeYouTube, capsys: pytest.CaptureFixture[str], limit: int, pages: int
+) -> None:
+    args = [*cli_args, "--format", "jsonl", "--limit", str(limit)]
+
+    asyncio.run(channel.list_past_mass_schedules.main(args, standalone_mode=False))
+
+    # a limit which is a multiple of the page size does not list the next page
+    assert len(capsys.readouterr().out.splitlines()) == limit
+    assert youtube.calls["youtube.liveBroadcasts.list"] == pages
+
+
+@pytest.mark.usefixtures("patched_create_channel")
+def test_list_mass_schedules_since(
+    cli_args: list[str], youtube: fakes.FakeYouTube, capsys: pytest.CaptureFixture[str]
+) -> None:
+    start = datetime.datetime.combine(utils.today(), datetime.time(15), tzinfo=datetime.UTC)
+    youtube.populate(10, start + datetime.timedelta(days=1), datetime.timedelta(days=1), life_cycle_status="created")
+    since = start + datetime.timedelta(days=6)
+    args = [*cli_args, "--format", "ids0", "--since", since.strftime(constants.DATE_FMT)]
+    get_listing = youtube._get_listing  # noqa: SLF001
+
+    def oldest_first(broadcast_status: models.BroadcastStatus) -> list[dict[str, Any]]:
+        # the upcoming broadcasts are not guaranteed to be listed newest first
+        return get_listing(broadcast_status)[::-1]
+
+    with mock.patch.object(youtube, "_get_listing", oldest_first):
+        asyncio.run(channel.list_mass_schedules.main(args, standalone_mode=False))
+
+    listed = capsys.readouterr().out.split("\0")[:-1]
+    expected = [
+        broadcast_id
+        for broadcast_id, broadcast in youtube.broadcasts.items()
+        if utils.parse_gcloud_datetime(broadcast["snippet"]["scheduledStartTime"]) >= utils.start_of_day(since.date())
+    ]
+    assert sorted(listed) == sorted(expected)
+    assert len(listed) == 5
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING
+
+import pytest
+
+from stjoseph.api import metrics
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+BUCKETS = (0.1, 1.0, 10.0)
+
+
+@pytest.fixture
+def recorder() -> Iterator[metrics.MetricsRecorder]:
+    recorder = metrics.MetricsRecorder(BUCKETS)
+    metrics.add_hook(recorder)
+    try:
+        yield recorder
+    finally:
+        metrics.remove_hook(recorder)
+
+
+def test_histogram_quantile() -> None:
+    histogram = metrics.Histogram(BUCKETS)
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+
+    assert histogram.counts == [1, 2, 1, 0]
+    assert histogram.cumulative_counts() == [1, 3, 4, 4]
+    assert histogram.quantile(0.25) == 0.1
+    assert histogram.quantile(0.5) == 1.0
+    # the upper bound is capped by the largest value observed
+    assert histogram.quantile(0.95) == 5.0
+
+
+def test_histogram_over_buckets() -> None:
+    histogram = metrics.Histogram(BUCKETS)
+    histogram.observe(0.5)
+    histogram.observe(20.0)
+
+    assert histogram.cumulative_counts() == [0, 1, 1, 2]
+    assert histogram.quantile(1.0) == 20.0
+    assert histogram.to_dict() == {"count": 2, "sum": 20.5, "mean": 10.25, "p50": 1.0, "p95": 20.0, "max": 20.0}
+
+
+def test_histogram_empty() -> None:
+    assert metrics.Histogram(BUCKETS).to_dict() == {
+        "count": 0,
+        "sum": 0.0,
+        "mean": 0.0,
+        "p50": 0.0,
+        "p95": 0.0,
+        "max": 0.0,
+    }
+
+
+def test_disabled() -> None:
+    assert not metrics.is_enabled()
+    with metrics.timed("noop"):
+        pass
+
+
+def test_to_json(recorder: metrics.MetricsRecorder) -> None:
+    metrics.record_timing("call", 0.5, method="list")
+    metrics.record_timing("call", 5.0, method="list")
+    metrics.record_retry("call", exception="HttpError")
+    metrics.record_bytes("call", "sent", 10, method="list")
+    metrics.record_bytes("call", "sent", 5, method="list")
+
+    assert recorder.to_json() == {
+        "timings": [
+            {
+                "name": "call",
+                "labels": {"method": "list"},
+                "count": 2,
+                "sum": 5.5,
+                "mean": 2.75,
+                "p50": 1.0,
+                "p95": 5.0,
+                "max": 5.0,
+            }
+        ],
+        "retries": [{"name": "call", "labels": {"exception": "HttpError"}, "count": 1}],
+        "bytes": [{"name": "call", "labels": {"direction": "sent", "method": "list"}, "total": 15}],
+    }
+
+
+def test_to_prometheus(recorder: metrics.MetricsRecorder) -> None:
+    metrics.record_timing("call", 0.5)
+    metrics.record_retry("call", exception='Quoted "error"')
+    metrics.record_bytes("call", "received", 42)
+
+    assert recorder.to_prometheus("test").splitlines() == [
+        "# HELP test_duration_seconds The latency of the instrumented calls.",
+        "# TYPE test_duration_seconds histogram",
+        'test_duration_seconds_bucket{name="call",le="0.1"} 0',
+        'test_duration_seconds_bucket{name="call",le="1.0"} 1',
+        'test_duration_seconds_bucket{name="call",le="10.0"} 1',
+        'test_duration_seconds_bucket{name="call",le="+Inf"} 1',
+        'test_duration_seconds_sum{name="call"} 0.5',
+        'test_duration_seconds_count{name="call"} 1',
+        "# HELP test_retries_total The retries of the instrumented calls.",
+        "# TYPE test_retries_total counter",
+        'test_retries_total{name="call",exception="Quoted \\"error\\""} 1',
+        "# HELP test_bytes_total The bytes transferred by the instrumented calls.",
+        "# TYPE test_bytes_total counter",
+        'test_bytes_total{name="call",direction="received"} 42',
+    ]
+
+
+def test_instrumented(recorder: metrics.MetricsRecorder) -> None:
+    @metrics.instrumented("sync")
+    def sync() -> int:
+        return 1
+
+    assert sync() == 1
+    assert sync() == 1
+
+    (timing,) = recorder.to_json()["timings"]
+    assert (timing["name"], timing["count"]) == ("sync", 2)
+
+
+def test_write(recorder: metrics.MetricsRecorder, tmp_path: Path) -> None:
+    metrics.record_retry("call")
+
+    recorder.write(tmp_path / "metrics.json")
+    recorder.write(tmp_path / "metrics.prom", "prometheus")
+
+    assert json.loads((tmp_path / "metrics.json").read_text()) == recorder.to_json()
+    assert (tmp_path / "metrics.prom").read_text() == recorder.to_prometheus()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import pstats
+from typing import TYPE_CHECKING
+from unittest import mock
+
+import pytest
+
+from stjoseph.api import constants, metrics, profiling
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+@pytest.mark.parametrize(
+    ("intervals", "expected"),
+    [
+        ([], 0.0),
+        ([(0.0, 1.0)], 1.0),
+        ([(0.0, 1.0), (2.0, 3.0)], 2.0),
+        # the overlapping and the nested intervals are counted once
+        ([(2.0, 4.0), (0.0, 3.0)], 4.0),
+        ([(0.0, 4.0), (1.0, 2.0), (3.0, 5.0)], 5.0),
+        ([(0.0, 1.0), (1.0, 2.0)], 2.0),
+    ],
+)
+def test_merge_intervals(intervals: list[tuple[float, float]], expected: float) -> None:
+    assert profiling.merge_intervals(intervals) == expected
+
+
+@pytest.mark.parametrize(
+    ("name", "labels", "expected"),
+    [
+        ("channel.get_page", {}, "listing"),
+        ("usccb.get_mass", {}, "readings"),
+        ("channel.execute", {"method": "youtube.liveBroadcasts.insert"}, constants.PROFILE_PUBLISHING_PHASE),
+        # the listings are timed per page instead
+        ("channel.execute", {"method": "youtube.liveBroadcasts.list"}, None),
+        ("channel.unknown", {}, None),
+    ],
+)
+def test_get_phase(name: str, labels: dict[str, str], expected: str | None) -> None:
+    assert profiling.get_phase(name, labels) == expected
+
+
+def time_call(timer: profiling.PhaseTimer, name: str, start: float, end: float, **labels: str) -> None:
+    with mock.patch.object(profiling.time, "perf_counter", return_value=end):
+        timer.on_timing(name, end - start, labels)
+
+
+def test_phase_totals() -> None:
+    timer = profiling.PhaseTimer()
+    # two pages listed concurrently, then the readings
+    time_call(timer, "channel.get_page", 0.0, 2.0)
+    time_call(timer, "channel.get_page", 1.0, 3.0)
+    time_call(timer, "usccb.get_mass", 3.0, 4.0)
+    time_call(timer, "channel.execute", 0.0, 10.0, method="youtube.liveBroadcasts.list")
+
+    assert timer.calls("listing") == 2
+    assert timer.wall_time("listing") == 3.0
+    assert timer.wall_time("readings") == 1.0
+    assert timer.wall_time() == 4.0
+    assert timer.calls(constants.PROFILE_PUBLISHING_PHASE) == 0
+
+
+def test_format() -> None:
+    timer = profiling.PhaseTimer()
+    time_call(timer, "channel.get_page", 0.0, 2.0)
+
+    lines = timer.format(8.0).splitlines()
+
+    assert lines[0].split() == ["phase", "calls", "seconds", "share"]
+    assert next(line for line in lines if line.startswith("listing")).split() == ["listing", "1", "2.000", "25.0%"]
+    assert next(line for line in lines if line.startswith("other")).split() == ["other", "0", "6.000", "75.0%"]
+    assert lines[-1].split() == ["total", "8.000"]
+
+
+def test_profiler(tmp_path: Path) -> None:
+    profiler = profiling.Profiler(tmp_path / "profile" / "run.pstats")
+
+    profiler.start()
+    metrics.record_timing("usccb.get_mass", 0.0)
+    profiler.stop()
+
+    assert not metrics.is_enabled()
+    assert profiler.phases.calls("readings") == 1
+    assert profiler.elapsed > 0
+    assert pstats.Stats(str(profiler.path)).stats  # type: ignore[attr-defined]
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+from typing import TYPE_CHECKING
+
+import pytest
+
+from stjoseph.api import constants, oauth2, quota
+from stjoseph.api.services.channel import Channel
+from stjoseph.commands.quota import quota_usage
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from tests import fakes
+
+INSERT = "youtube.liveBroadcasts.insert"
+LIST = "youtube.liveBroadcasts.list"
+
+
+def test_charge(tmp_path: Path) -> None:
+    ledger = quota.QuotaLedger(tmp_path / "quota.json")
+
+    assert ledger.charge(INSERT) == constants.QUOTA_COSTS[INSERT]
+    assert ledger.charge(LIST) == constants.QUOTA_COSTS[LIST]
+    ledger.charge(LIST)
+
+    assert ledger.usage() == {INSERT: quota.MethodUsage(1, 50), LIST: quota.MethodUsage(2, 2)}
+    assert ledger.used() == 52
+    assert ledger.days() == [quota.quota_day()]
+    assert ledger.remaining() is None
+
+
+def test_charge_batched(tmp_path: Path) -> None:
+    path = tmp_path / "quota.json"
+    ledger = quota.QuotaLedger(path, flush_every=3)
+
+    ledger.charge(LIST)
+    ledger.charge(LIST)
+    assert not path.exists()
+
+    ledger.charge(LIST)
+    assert quota.QuotaLedger(path).used() == 3
+
+    ledger.charge(INSERT)
+    ledger.flush()
+    assert quota.QuotaLedger(path).used() == 53
+
+
+def test_flush_merges(tmp_path: Path) -> None:
+    # two processes charging the same file add up, rather than overwriting each other
+    path = tmp_path / "quota.json"
+    first = quota.QuotaLedger(path)
+    second = quota.QuotaLedger(path)
+
+    first.charge(INSERT)
+    second.charge(INSERT)
+    second.charge(LIST)
+    first.flush()
+    second.flush()
+
+    assert quota.QuotaLedger(path).usage() == {INSERT: quota.MethodUsage(2, 100), LIST: quota.MethodUsage(1, 1)}
+    # what the other one saved counts against the budget
+    assert first.used() == 101
+
+
+def test_budget(tmp_path: Path) -> None:
+    path = tmp_path / "quota.json"
+    ledger = quota.QuotaLedger(path, budget=100)
+    ledger.charge(INSERT)
+    # another process uses what is left of the budget in the meantime
+    other = quota.QuotaLedger(path)
+    other.charge(INSERT)
+    other.flush()
+
+    with pytest.raises(quota.QuotaExceededError, match="100 of the budget of 100"):
+        ledger.charge(LIST)
+
+    assert ledger.used() == 100
+    assert ledger.remaining() == 0
+
+
+def test_ensure_available(tmp_path: Path) -> None:
+    ledger = quota.QuotaLedger(tmp_path / "quota.json", budget=100)
+    ledger.charge(LIST)
+
+    ledger.ensure_available([INSERT])
+    with pytest.raises(quota.QuotaExceededError):
+        ledger.ensure_available([INSERT, INSERT])
+
+    # nothing is charged by the check
+    assert ledger.used() == 1
+
+
+def test_pruned(tmp_path: Path) -> None:
+    path = tmp_path / "quota.json"
+    today = quota.quota_day()
+    old = today - datetime.timedelta(days=constants.QUOTA_HISTORY_DAYS + 1)
+    recent = today - datetime.timedelta(days=1)
+    days = {day.isoformat(): {LIST: {"calls": 1, "units": 1}} for day in (old, recent)}
+    path.write_text(json.dumps({"days": days}))
+    ledger = quota.QuotaLedger(path)
+
+    ledger.charge(LIST)
+    ledger.flush()
+
+    assert quota.QuotaLedger(path).days() == [today, recent]
+
+
+def test_channel_refused(tmp_path: Path, creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube) -> None:
+    path = tmp_path / "quota.json"
+    ledger = quota.QuotaLedger(path, budget=1)
+    with Channel(creds, quota_ledger=ledger, http_factory=youtube.http) as channel:
+        channel.get_channels()
+        with pytest.raises(quota.QuotaExceededError):
+            channel.get_channels()
+
+    # the refused call is neither made nor charged, and the usage is saved on close
+    assert youtube.calls["youtube.channels.list"] == 1
+    assert quota.QuotaLedger(path).used() == 1
+
+
+def test_quota_usage(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    token = tmp_path / "token.json"
+    ledger = quota.QuotaLedger(tmp_path / constants.QUOTA_FILE_NAME)
+    ledger.charge(LIST)
+    ledger.charge(INSERT)
+    ledger.charge(LIST)
+    ledger.flush()
+
+    asyncio.run(quota_usage.main(["--token", str(token), "--daily-quota", "100"], standalone_mode=False))
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == f"{quota.quota_day()} (Pacific Time): 52 of 100 units used, 48 left"
+    assert lines[1].split() == [INSERT, "1", "calls", "50", "units"]
+    assert lines[2].split() == [LIST, "2", "calls", "2", "units"]
+
+
+def test_quota_usage_empty(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    asyncio.run(quota_usage.main(["--token", str(tmp_path / "token.json")], standalone_mode=False))
+
+    assert capsys.readouterr().out == "No quota usage recorded.\n"
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import os
+import time
+import types
+from http import HTTPStatus
+from typing import TYPE_CHECKING, cast
+
+import pytest
+from catholic_mass_readings import USCCB
+from catholic_mass_readings.models import Mass, MassType
+from curl_cffi.requests.exceptions import RequestException
+from tenacity import wait_none
+
+from stjoseph.api import constants, readings
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+DATE = datetime.date(2025, 1, 5)
+
+
+def create_mass(date: datetime.date, type_: MassType = MassType.DAY) -> Mass:
+    return Mass(date, type_, f"https://bible.usccb.org/bible/readings/{date:%m%d%y}.cfm", f"Mass of {date}", [])
+
+
+def request_error(status: HTTPStatus) -> RequestException:
+    return RequestException(f"{status.value} {status.phrase}", response=types.SimpleNamespace(status_code=status))
+
+
+class FakeUSCCB:
+    """Answers get_mass from the results given for each date, an exception being raised instead of returned."""
+
+    DEFAULT_MASS_TYPES = USCCB.DEFAULT_MASS_TYPES
+
+    def __init__(self, results: Callable[[datetime.date, MassType], Mass | None], delay: float = 0.0) -> None:
+        self._results = results
+        self._delay = delay
+        self.calls: list[tuple[datetime.date, MassType]] = []
+        self.active = 0
+        self.max_active = 0
+
+    async def get_mass(self, date: datetime.date, type_: MassType) -> Mass | None:
+        self.calls.append((date, type_))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self._delay)
+            return self._results(date, type_)
+        finally:
+            self.active -= 1
+
+
+def create_fetcher(
+    usccb: FakeUSCCB, mass_cache: readings.MassCache | None = None, concurrency: int = constants.READINGS_CONCURRENCY
+) -> readings.MassFetcher:
+    return readings.MassFetcher(cast("USCCB", usccb), mass_cache, concurrency, rate_limit=1000.0)
+
+
+@pytest.fixture
+def no_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(readings.MassFetcher._query_mass.retry, "wait", wait_none())  # noqa: SLF001
+
+
+def test_cache_roundtrip(tmp_path: Path) -> None:
+    cache = readings.MassCache(tmp_path)
+    mass = create_mass(DATE)
+
+    cache.put(DATE, [MassType.DAY], mass)
+
+    assert cache.get(DATE, [MassType.DAY]) == mass
+    assert cache.get(DATE, None) is None
+    assert list(cache.masses()) == [mass]
+
+
+def test_cache_ttl(tmp_path: Path) -> None:
+    cache = readings.MassCache(tmp_path, ttl=datetime.timedelta(hours=1))
+    cache.put(DATE, None, create_mass(DATE))
+    (entry,) = tmp_path.glob("*.json")
+
+    expired = time.time() - datetime.timedelta(hours=2).total_seconds()
+    os.utime(entry, (expired, expired))
+
+    assert cache.get(DATE, None) is None
+    assert not entry.exists()
+
+
+def test_cache_eviction(tmp_path: Path) -> None:
+    cache = readings.MassCache(tmp_path, max_entries=2)
+    dates = [DATE + datetime.timedelta(weeks=idx) for idx in range(3)]
+    for idx, date in enumerate(dates):
+        cache.put(date, None, create_mass(date))
+        written = time.time() - 100 + idx
+        os.utime(next(tmp_path.glob(f"{date:%Y%m%d}-*.json")), (written, written))
+
+    cache.put(dates[0], None, create_mass(dates[0]))
+
+    # the least recently written entry was evicted
+    assert cache.get(dates[1], None) is None
+    assert [mass.date for mass in cache.masses()] == [dates[0], dates[2]]
+
+
+def test_fetch_uses_cache(tmp_path: Path) -> None:
+    usccb = FakeUSCCB(lambda date, type_: create_mass(date, type_))
+    cache = readings.MassCache(tmp_path)
+
+    first = asyncio.run(create_fetcher(usccb, cache).get_masses([DATE]))
+    second = asyncio.run(create_fetcher(usccb, cache).get_masses([DATE]))
+
+    assert first == second == {DATE: create_mass(DATE, USCCB.DEFAULT_MASS_TYPES[0])}
+    assert len(usccb.calls) == 1
+
+
+@pytest.mark.usefixtures("no_backoff")
+def test_fetch_retries_server_error() -> None:
+    errors = [request_error(HTTPStatus.SERVICE_UNAVAILABLE)]
+
+    def results(date: datetime.date, type_: MassType) -> Mass:
+        if errors:
+            raise errors.pop()
+        return create_mass(date, type_)
+
+    usccb = FakeUSCCB(results)
+
+    masses = asyncio.run(create_fetcher(usccb).get_masses([DATE], [MassType.DAY]))
+
+    assert masses == {DATE: create_mass(DATE)}
+    assert usccb.calls == [(DATE, MassType.DAY)] * 2
+
+
+@pytest.mark.usefixtures("no_backoff")
+def test_fetch_not_found_not_retried() -> None:
+    def results(_date: datetime.date, _type: MassType) -> Mass:
+        raise request_error(HTTPStatus.NOT_FOUND)
+
+    usccb = FakeUSCCB(results)
+
+    masses = asyncio.run(create_fetcher(usccb).get_masses([DATE], [MassType.DAY, MassType.YEARA]))
+
+    # each type is tried once, then the date is missing
+    assert masses == {DATE: None}
+    assert usccb.calls == [(DATE, MassType.DAY), (DATE, MassType.YEARA)]
+
+
+@pytest.mark.usefixtures("no_backoff")
+def test_fetch_server_error_exhausts_retries() -> None:
+    def results(_date: datetime.date, _type: MassType) -> Mass:
+        raise request_error(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    usccb = FakeUSCCB(results)
+
+    # the date which failed is left out
+    assert asyncio.run(create_fetcher(usccb).get_masses([DATE], [MassType.DAY])) == {}
+    assert len(usccb.calls) == constants.READINGS_MAX_RETRIES
+
+
+def test_fetch_concurrency_bound() -> None:
+    usccb = FakeUSCCB(lambda date, type_: create_mass(date, type_), delay=0.02)
+    dates = [DATE + datetime.timedelta(weeks=idx) for idx in range(8)]
+
+    masses = asyncio.run(create_fetcher(usccb, concurrency=3).get_masses(dates, [MassType.DAY]))
+
+    assert sorted(masses) == dates
+    assert usccb.max_active == 3
+
+
+def test_rate_limiter() -> None:
+    async def acquire_all(limiter: readings.RateLimiter, count: int) -> float:
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.acquire() for _ in range(count)))
+        return time.monotonic() - start
+
+    # the first call proceeds at once, the others are spaced out by 1 / rate
+    elapsed = asyncio.run(acquire_all(readings.RateLimiter(50.0), 6))
+
+    assert 0.1 <= elapsed < 0.5
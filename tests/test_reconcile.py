@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import datetime
+from typing import TYPE_CHECKING
+
+import pytest
+
+from stjoseph.api import constants, models, oauth2, reconcile
+from stjoseph.api.services.channel import Channel
+
+if TYPE_CHECKING:
+    from tests import fakes
+
+START = datetime.datetime(2020, 1, 5, 15, tzinfo=datetime.UTC)
+END = START + datetime.timedelta(hours=1)
+
+
+def create_stream(
+    broadcast_id: str = "id",
+    description: str = "The readings",
+    scheduled_end: datetime.datetime | None = END,
+    privacy_status: str | None = "private",
+) -> models.LiveStream:
+    return models.LiveStream(
+        broadcast_id,
+        "Mass",
+        description,
+        START - datetime.timedelta(days=7),
+        START,
+        None,
+        None,
+        models.BroadcastStatus.UPCOMING,
+        scheduled_end,
+        privacy_status,
+    )
+
+
+def create_index(*streams: models.LiveStream) -> models.BroadcastIndex:
+    return models.BroadcastIndex(streams, models.BroadcastStatus.UPCOMING)
+
+
+DESIRED = reconcile.DesiredBroadcast("Mass", "The readings", START, END)
+
+
+def test_plan_insert() -> None:
+    operation = reconcile.plan_broadcast(DESIRED, create_index())
+
+    assert operation == reconcile.Operation(reconcile.Action.INSERT, DESIRED)
+
+
+def test_plan_noop() -> None:
+    # the line endings and the surrounding whitespace are not significant
+    stream = create_stream(description="  The readings\r\n")
+
+    operation = reconcile.plan_broadcast(DESIRED, create_index(stream))
+
+    assert operation == reconcile.Operation(reconcile.Action.NOOP, DESIRED, "id")
+
+
+@pytest.mark.parametrize(
+    ("stream", "desired", "changes"),
+    [
+        (create_stream(description="Other readings"), DESIRED, ("description",)),
+        (create_stream(scheduled_end=None), DESIRED, ("scheduled_end",)),
+        (create_stream(), DESIRED._replace(scheduled_end=None), ("scheduled_end",)),
+        (create_stream(), DESIRED._replace(is_public=True), ("privacy_status",)),
+        # a privacy status which was not listed is treated as changed
+        (create_stream(privacy_status=None), DESIRED, ("privacy_status",)),
+        (create_stream(description="", scheduled_end=None), DESIRED, ("description", "scheduled_end")),
+    ],
+)
+def test_plan_update(stream: models.LiveStream, desired: reconcile.DesiredBroadcast, changes: tuple[str, ...]) -> None:
+    operation = reconcile.plan_broadcast(desired, create_index(stream))
+
+    assert operation == reconcile.Operation(reconcile.Action.UPDATE, desired, "id", changes)
+
+
+def test_plan_last_listed() -> None:
+    index = create_index(create_stream("first", description="Other"), create_stream("last"))
+
+    assert reconcile.plan_broadcast(DESIRED, index).broadcast_id == "last"
+
+
+def test_plan_summary() -> None:
+    later = DESIRED._replace(scheduled_start=START + datetime.timedelta(weeks=1))
+    plan = reconcile.create_plan([DESIRED, later], create_index(create_stream()))
+
+    assert [operation.action for operation in plan] == [reconcile.Action.NOOP, reconcile.Action.INSERT]
+    assert plan.summary() == "1 to insert, 0 to update, 1 to noop"
+
+
+@pytest.mark.parametrize("dry_run", [False, True])
+def test_apply_plan(creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube, dry_run: bool) -> None:
+    updated_id = youtube.add_broadcast("Mass", START, description="Old readings")
+    unchanged_id = youtube.add_broadcast("Mass", START + datetime.timedelta(weeks=1), description="The readings")
+    desired = [
+        reconcile.DesiredBroadcast("Mass", "The readings", START),
+        reconcile.DesiredBroadcast("Mass", "The readings", START + datetime.timedelta(weeks=1)),
+        reconcile.DesiredBroadcast("Mass", "The readings", START + datetime.timedelta(weeks=2)),
+    ]
+    with Channel(creds, http_factory=youtube.http) as channel:
+        index = channel.build_index(models.BroadcastStatus.UPCOMING, constants.RECONCILE_FIELDS)
+        plan = reconcile.create_plan(desired, index)
+        youtube.calls.clear()
+
+        broadcast_ids = reconcile.apply_plan(channel, plan, dry_run)
+
+    assert plan.summary() == "1 to insert, 1 to update, 1 to noop"
+    if dry_run:
+        assert broadcast_ids == [constants.NO_OP, unchanged_id, constants.NO_OP]
+        assert not youtube.calls
+        assert youtube.broadcasts[updated_id]["snippet"]["description"] == "Old readings"
+        return
+
+    assert broadcast_ids[:2] == [updated_id, unchanged_id]
+    assert youtube.calls["youtube.liveBroadcasts.update"] == 1
+    assert youtube.calls["youtube.liveBroadcasts.insert"] == 1
+    assert youtube.broadcasts[updated_id]["snippet"]["description"] == "The readings"
+    assert len(youtube) == len(desired)
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import datetime
+import email.utils
+import json
+
+import httplib2
+import pytest
+from curl_cffi.requests import exceptions as curl_exceptions
+from googleapiclient.errors import HttpError
+
+from stjoseph.api import quota, retries
+
+
+def _http_error(status: int, reason: str = "", headers: dict[str, str] | None = None) -> HttpError:
+    content = json.dumps({"error": {"code": status, "message": reason, "errors": [{"reason": reason}]}})
+    return HttpError(httplib2.Response({"status": str(status), **(headers or {})}), content.encode())
+
+
+@pytest.mark.parametrize(
+    ("exception", "kind"),
+    [
+        (_http_error(403, "quotaExceeded"), retries.ErrorKind.QUOTA),
+        (quota.QuotaExceededError("over budget"), retries.ErrorKind.QUOTA),
+        (_http_error(403, "rateLimitExceeded"), retries.ErrorKind.RATE_LIMIT),
+        (_http_error(429), retries.ErrorKind.RATE_LIMIT),
+        (_http_error(401, "authError"), retries.ErrorKind.AUTH),
+        (_http_error(403, "insufficientPermissions"), retries.ErrorKind.AUTH),
+        (_http_error(503, "backendError"), retries.ErrorKind.TRANSIENT),
+        (ConnectionResetError(), retries.ErrorKind.TRANSIENT),
+        (curl_exceptions.Timeout("timed out"), retries.ErrorKind.TRANSIENT),
+        (_http_error(404, "liveBroadcastNotFound"), retries.ErrorKind.PERMANENT),
+        (_http_error(304), retries.ErrorKind.PERMANENT),
+        (FileNotFoundError(), retries.ErrorKind.PERMANENT),
+    ],
+)
+def test_classify(exception: BaseException, kind: retries.ErrorKind) -> None:
+    assert retries.classify(exception) is kind
+
+
+def test_get_retry_after() -> None:
+    later = datetime.datetime.now(datetime.UTC) + datetime.timedelta(seconds=30)
+
+    assert retries.get_retry_after(_http_error(503, headers={"retry-after": "7"})) == 7
+    assert (
+        25
+        < (retries.get_retry_after(_http_error(503, headers={"retry-after": email.utils.format_datetime(later)})) or 0)
+        <= 30
+    )
+    assert retries.get_retry_after(_http_error(503)) is None
+
+
+def test_get_wait_jitter() -> None:
+    policy = retries.RetryPolicy(backoff=1.0, max_backoff=4.0)
+
+    waits = [policy.get_wait(_http_error(503), attempt) for attempt in range(1, 6) for _ in range(20)]
+
+    assert all(0 <= wait <= 4.0 for wait in waits)
+    assert len(set(waits)) > 1
+    assert 7 <= policy.get_wait(_http_error(429, headers={"retry-after": "7"}), 1) <= 8
+
+
+def test_budget() -> None:
+    budget = retries.RetryBudget(2)
+
+    assert [budget.acquire() for _ in range(3)] == [True, True, False]
+    assert budget.remaining == 0
+
+
+def test_circuit_breaker_half_open() -> None:
+    breaker = retries.CircuitBreaker(threshold=2, cooldown=datetime.timedelta(0))
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.is_open
+
+    breaker.before_call()  # the trial call
+    with pytest.raises(retries.CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+
+    assert not breaker.is_open
+    breaker.before_call()
+
+
+def test_retrying_failures() -> None:
+    policy = retries.RetryPolicy(backoff=0.01)
+    failures = [
+        {"a": _http_error(503, "backendError"), "b": _http_error(503, "backendError")},
+        {"b": _http_error(503, "backendError")},
+        {},
+    ]
+    calls: list[int] = []
+
+    def call() -> dict[str, BaseException]:
+        calls.append(len(calls))
+        return failures[len(calls) - 1]
+
+    assert policy.retrying_failures("call")(call) == {}
+    assert len(calls) == 3
+    assert policy.budget.remaining == retries.RetryBudget().remaining - 2
+
+
+@pytest.mark.parametrize(
+    ("exception", "attempts"),
+    [
+        (_http_error(503, "backendError"), retries.DEFAULT_ATTEMPTS[retries.ErrorKind.TRANSIENT]),
+        (_http_error(403, "rateLimitExceeded"), retries.DEFAULT_ATTEMPTS[retries.ErrorKind.RATE_LIMIT]),
+    ],
+)
+def test_retrying_failures_stops(exception: BaseException, attempts: int) -> None:
+    policy = retries.RetryPolicy(backoff=0.0)
+    calls: list[int] = []
+
+    def call() -> dict[str, BaseException]:
+        calls.append(len(calls))
+        return {"a": exception}
+
+    # the failures of the last attempt are returned
+    assert policy.retrying_failures("call")(call) == {"a": exception}
+    assert len(calls) == attempts
+
+
+@pytest.mark.parametrize(
+    ("exception", "retryable"),
+    [
+        (_http_error(503, "backendError"), True),
+        (_http_error(401, "authError"), True),
+        (_http_error(429, headers={"retry-after": "7"}), True),
+        (_http_error(429, headers={"retry-after": "3600"}), False),
+        (_http_error(403, "quotaExceeded"), False),
+        (_http_error(404, "liveBroadcastNotFound"), False),
+    ],
+)
+def test_is_retryable(exception: BaseException, retryable: bool) -> None:
+    assert retries.RetryPolicy().is_retryable(exception) is retryable
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+import types
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Any, Self, cast
+from unittest import mock
+
+import asyncclick as click
+import pytest
+from catholic_mass_readings import USCCB
+from catholic_mass_readings.models import Mass, MassType
+from curl_cffi.requests.exceptions import RequestException
+from tenacity import wait_none
+
+from stjoseph.api import constants, quota, readings, thumbnails, utils
+from stjoseph.commands import schedule
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from pathlib import Path
+
+    from tests import fakes
+
+START = utils.today() + datetime.timedelta(weeks=1)
+END = START + datetime.timedelta(weeks=4)
+
+
+class StubUSCCB:
+    """Answers the readings of every Sunday, except the dates which are missing or fail with a 500."""
+
+    DEFAULT_MASS_TYPES = USCCB.DEFAULT_MASS_TYPES
+
+    def __init__(self, missing: Iterable[datetime.date] = (), failed: Iterable[datetime.date] = ()) -> None:
+        self._missing = set(missing)
+        self._failed = set(failed)
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        pass
+
+    @staticmethod
+    def get_sunday_mass_dates(start: datetime.date, end: datetime.date | None = None) -> Iterator[datetime.date]:
+        assert end is not None
+        date = start + datetime.timedelta(days=(6 - start.weekday()) % 7)
+        while date < end:
+            yield date
+            date += datetime.timedelta(weeks=1)
+
+    async def get_mass(self, date: datetime.date, type_: MassType) -> Mass | None:
+        status = HTTPStatus.NOT_FOUND if date in self._missing else HTTPStatus.INTERNAL_SERVER_ERROR
+        if date in self._missing or date in self._failed:
+            raise RequestException(status.phrase, response=types.SimpleNamespace(status_code=status))
+        return Mass(date, type_, f"https://bible.usccb.org/{date:%m%d%y}.cfm", f"Sunday {date}", [])
+
+
+def sundays() -> list[datetime.date]:
+    return list(StubUSCCB.get_sunday_mass_dates(START, END))
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(readings.MassFetcher._query_mass.retry, "wait", wait_none())  # noqa: SLF001
+
+
+def run_schedule_masses(cli_args: list[str], usccb: StubUSCCB, *args: str) -> None:
+    default_args = [
+        *cli_args,
+        *("--start", START.strftime(constants.DATE_FMT), "--end", END.strftime(constants.DATE_FMT)),
+        *("--rate-limit", "1000"),
+    ]
+    with mock.patch.object(readings, "create_usccb", return_value=usccb):
+        asyncio.run(schedule.schedule_masses.main([*default_args, *args], standalone_mode=False))
+
+
+def run_schedule_mass(cli_args: list[str], usccb: StubUSCCB, *args: str) -> None:
+    date = utils.to_saturday_mass(sundays()[0])
+    with mock.patch.object(readings, "create_usccb", return_value=usccb):
+        asyncio.run(
+            schedule.schedule_mass.main(
+                [date.strftime(constants.DATE_TIME_FMT), *cli_args, *args], standalone_mode=False
+            )
+        )
+
+
+def test_produce_masses() -> None:
+    ok, missing, failed = sundays()[:3]
+    fetcher = readings.MassFetcher(cast("USCCB", StubUSCCB({missing}, {failed})), rate_limit=1000.0)
+
+    async def produce() -> tuple[tuple[int, int], list[Mass | None]]:
+        queue: asyncio.Queue[Mass | None] = asyncio.Queue()
+        counts = await schedule._produce_masses(fetcher, [ok, missing, failed], None, queue)  # noqa: SLF001
+        return counts, [queue.get_nowait() for _ in range(queue.qsize())]
+
+    counts, queued = asyncio.run(produce())
+
+    assert counts == (1, 1)
+    assert [mass.date if mass is not None else None for mass in queued] == [ok, None]
+
+
+def test_consume_masses() -> None:
+    published: list[Any] = []
+
+    async def consume() -> None:
+        queue: asyncio.Queue[Any] = asyncio.Queue()
+        for item in ("first", "second", None):
+            queue.put_nowait(item)
+        with ThreadPoolExecutor(2) as executor:
+            await schedule._consume_masses(queue, published.append, executor)  # noqa: SLF001
+
+    asyncio.run(consume())
+
+    assert sorted(published) == ["first", "second"]
+
+
+@pytest.mark.usefixtures("patched_create_channel")
+def test_schedule_masses(
+    tmp_path: Path, cli_args: list[str], youtube: fakes.FakeYouTube, caplog: pytest.LogCaptureFixture
+) -> None:
+    dates = sundays()
+    caplog.set_level(logging.INFO)
+
+    run_schedule_masses(cli_args, StubUSCCB({dates[1]}, {dates[2]}))
+
+    scheduled = {broadcast["snippet"]["scheduledStartTime"] for broadcast in youtube.broadcasts.values()}
+    expected = {dates[0], *dates[3:]}
+    assert scheduled == {utils.to_gcloud_datetime(utils.to_saturday_mass(date)) for date in expected}
+    assert all(youtube.get_thumbnail_size(broadcast_id) for broadcast_id in youtube.broadcasts)
+    assert "There are 1 missing" in caplog.text
+    assert "There are 1 that failed to be queried" in caplog.text
+    assert f"Plan: {len(expected)} to insert, 0 to update, 0 to noop" in caplog.text
+
+    # the dates already scheduled are skipped on the next run
+    youtube.calls.clear()
+    run_schedule_masses(cli_args, StubUSCCB())
+
+    assert youtube.calls["youtube.liveBroadcasts.insert"] == 2
+    assert len(youtube) == len(dates)
+
+
+@pytest.mark.usefixtures("patched_create_channel")
+def test_schedule_mass(tmp_path: Path, cli_args: list[str], youtube: fakes.FakeYouTube) -> None:
+    run_schedule_mass(cli_args, StubUSCCB())
+
+    (broadcast_id,) = youtube.broadcasts
+    assert youtube.get_thumbnail_size(broadcast_id)
+    assert thumbnails.ThumbnailManager(tmp_path / constants.THUMBNAILS_FILE_NAME).get_digest(broadcast_id)
+    assert quota.QuotaLedger(tmp_path / constants.QUOTA_FILE_NAME).used() == sum(
+        constants.QUOTA_COSTS[method_id] * count for method_id, count in youtube.calls.items()
+    )
+
+    # the mass is already scheduled, and overwriting it with the same readings changes nothing
+    youtube.calls.clear()
+    run_schedule_mass(cli_args, StubUSCCB())
+    run_schedule_mass(cli_args, StubUSCCB(), "--force")
+
+    assert youtube.calls["youtube.liveBroadcasts.insert"] == 0
+    assert youtube.calls["youtube.liveBroadcasts.update"] == 0
+    assert list(youtube.broadcasts) == [broadcast_id]
+
+
+def get_pending_thumbnails(tmp_path: Path) -> list[str]:
+    return thumbnails.ThumbnailManager(tmp_path / constants.THUMBNAILS_FILE_NAME).pending()
+
+
+@pytest.mark.usefixtures("patched_create_channel")
+def test_schedule_masses_resumed_after_quota_budget(
+    tmp_path: Path, cli_args: list[str], youtube: fakes.FakeYouTube
+) -> None:
+    dates = sundays()
+
+    with pytest.raises(click.ClickException, match="rerun to resume"):
+        run_schedule_masses(cli_args, StubUSCCB(), "--quota-budget", "500", "--workers", "1")
+
+    # the run stopped before an insert whose thumbnail would not have fitted in the budget
+    assert 0 < len(youtube) < len(dates)
+    assert all(youtube.get_thumbnail_size(broadcast_id) for broadcast_id in youtube.broadcasts)
+    assert not get_pending_thumbnails(tmp_path)
+
+    run_schedule_masses(cli_args, StubUSCCB())
+
+    assert len(youtube) == len(dates)
+    assert all(youtube.get_thumbnail_size(broadcast_id) for broadcast_id in youtube.broadcasts)
+
+
+@pytest.mark.usefixtures("patched_create_channel")
+def test_schedule_masses_resumes_thumbnails(tmp_path: Path, cli_args: list[str], youtube: fakes.FakeYouTube) -> None:
+    dates = sundays()
+    youtube.inject_error(HTTPStatus.BAD_REQUEST, "invalidImage", "youtube.thumbnails.set")
+
+    with pytest.raises(click.ClickException, match="Failed to set the thumbnail of 1 broadcasts"):
+        run_schedule_masses(cli_args, StubUSCCB())
+
+    assert len(youtube) == len(dates)
+    (pending_id,) = get_pending_thumbnails(tmp_path)
+    assert not youtube.get_thumbnail_size(pending_id)
+
+    # every date is already scheduled, the thumbnail left pending is still set
+    youtube.calls.clear()
+    run_schedule_masses(cli_args, StubUSCCB())
+
+    assert youtube.calls["youtube.liveBroadcasts.insert"] == 0
+    assert youtube.calls["youtube.thumbnails.set"] == 1
+    assert youtube.get_thumbnail_size(pending_id)
+    assert not get_pending_thumbnails(tmp_path)
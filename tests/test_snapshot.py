@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import datetime
+import json
+from http import HTTPStatus
+from typing import TYPE_CHECKING
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from stjoseph.api import oauth2, snapshot
+from stjoseph.api.services.channel import Channel
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from tests import fakes
+
+START = datetime.datetime(2020, 1, 5, 15, tzinfo=datetime.UTC)
+
+
+def test_invalidate_stale_is_noop(tmp_path: Path) -> None:
+    broadcast_snapshot = snapshot.BroadcastSnapshot(tmp_path / "broadcasts.json")
+    key = broadcast_snapshot.key(broadcastStatus="completed")
+    broadcast_snapshot.put_pages(key, [{"page_token": None, "etag": "etag", "next_page_token": None, "items": []}])
+
+    broadcast_snapshot.invalidate()
+    mtime = broadcast_snapshot.path.stat().st_mtime_ns
+    broadcast_snapshot.invalidate()
+
+    assert not broadcast_snapshot.is_fresh(key, datetime.timedelta(days=1))
+    assert broadcast_snapshot.path.stat().st_mtime_ns == mtime
+
+
+def test_invalidated_after_successful_write(
+    tmp_path: Path, creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube
+) -> None:
+    youtube.populate(3, START)
+    broadcast_snapshot = snapshot.BroadcastSnapshot(tmp_path / "broadcasts.json")
+    max_age = datetime.timedelta(days=1)
+    with Channel(creds, broadcast_snapshot, max_age, http_factory=youtube.http) as channel:
+        list(channel.list_completed_livestreams())
+        (key,) = json.loads(broadcast_snapshot.path.read_text())["queries"]
+
+        youtube.inject_error(HTTPStatus.BAD_REQUEST, "invalidValue", "youtube.liveBroadcasts.insert")
+        with pytest.raises(HttpError):
+            channel.schedule_broadcast("Mass", "The readings", START)
+        assert broadcast_snapshot.is_fresh(key, max_age)
+
+        channel.delete_broadcasts(["missing"])
+        assert broadcast_snapshot.is_fresh(key, max_age)
+
+        channel.schedule_broadcast("Mass", "The readings", START)
+        assert not broadcast_snapshot.is_fresh(key, max_age)
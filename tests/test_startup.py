@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import re
+import subprocess
+import sys
+from typing import Final
+
+import pytest
+
+# The cumulative time, in seconds, spent importing stjoseph for `python -m stjoseph --help`
+IMPORT_TIME_BUDGET: Final[float] = 0.25
+
+HEAVY_MODULES: Final[tuple[str, ...]] = (
+    "catholic_mass_readings",
+    "curl_cffi",
+    "googleapiclient",
+    "jinja2",
+)
+
+_IMPORT_TIME_LINE: Final[re.Pattern[str]] = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)$")
+
+
+def _import_times(*args: str) -> dict[str, tuple[int, float]]:
+    """Runs the CLI with -X importtime and returns the nesting level and cumulative seconds of each import."""
+    process = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-m", "stjoseph", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times: dict[str, tuple[int, float]] = {}
+    for line in process.stderr.splitlines():
+        if match := _IMPORT_TIME_LINE.match(line):
+            times[match.group(4)] = (len(match.group(3)) // 2, int(match.group(2)) / 1_000_000)
+    return times
+
+
+def test_help_import_time_budget() -> None:
+    times = _import_times("--help")
+    elapsed = sum(t for name, (level, t) in times.items() if level == 0 and name.split(".")[0] == "stjoseph")
+    assert elapsed < IMPORT_TIME_BUDGET, f"importing stjoseph took {elapsed:.3f}s: {times}"
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ("--help",),
+        ("delete-broadcast", "--help"),
+        ("list-mass-schedules", "--help"),
+    ],
+)
+def test_help_skips_heavy_modules(args: tuple[str, ...]) -> None:
+    imported = {name.split(".")[0] for name in _import_times(*args)}
+    assert not imported.intersection(HEAVY_MODULES)
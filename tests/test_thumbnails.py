@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import datetime
+from http import HTTPStatus
+from typing import TYPE_CHECKING
+
+import pytest
+
+from stjoseph.api import models, oauth2, resources, thumbnails
+from stjoseph.api.services.channel import Channel
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+    from tests import fakes
+
+START = datetime.datetime(2020, 1, 5, 15, tzinfo=datetime.UTC)
+
+
+@pytest.fixture
+def manager(tmp_path: Path) -> thumbnails.ThumbnailManager:
+    return thumbnails.ThumbnailManager(tmp_path / "thumbnails.json")
+
+
+@pytest.fixture
+def channel_svc(
+    creds: oauth2.CredentialsManager, youtube: fakes.FakeYouTube, manager: thumbnails.ThumbnailManager
+) -> Iterator[Channel]:
+    with Channel(creds, thumbnail_manager=manager, http_factory=youtube.http) as channel_svc:
+        yield channel_svc
+
+
+def test_digest(tmp_path: Path, manager: thumbnails.ThumbnailManager) -> None:
+    image = tmp_path / "image.jpg"
+    image.write_bytes(b"first")
+    first = manager.digest(image)
+
+    assert manager.digest(image) == first == thumbnails.hash_file(image)
+
+    image.write_bytes(b"second image")
+
+    assert manager.digest(image) == thumbnails.hash_file(image) != first
+
+
+def test_record_and_forget(tmp_path: Path, manager: thumbnails.ThumbnailManager) -> None:
+    manager.record("a", "old")
+    manager.record("b", "old")
+    manager.record("a", "new")
+
+    assert manager.has_thumbnail("a", "new")
+    assert not manager.has_thumbnail("a", "old")
+    assert manager.get_digest("b") == "old"
+
+    manager.forget(["b", "missing"])
+
+    reloaded = thumbnails.ThumbnailManager(tmp_path / "thumbnails.json")
+    assert reloaded.get_digest("a") == "new"
+    assert reloaded.get_digest("b") is None
+
+
+def test_pending(tmp_path: Path, manager: thumbnails.ThumbnailManager) -> None:
+    for video_id in ("a", "b", "c", "d"):
+        manager.add_pending(video_id)
+
+    manager.record("a", "digest")
+    manager.forget(["b"])
+    manager.discard_pending("c")
+
+    assert thumbnails.ThumbnailManager(tmp_path / "thumbnails.json").pending() == ["d"]
+    assert manager.get_digest("a") == "digest"
+
+
+def test_resume_thumbnails(
+    channel_svc: Channel, youtube: fakes.FakeYouTube, manager: thumbnails.ThumbnailManager
+) -> None:
+    (video_id,) = youtube.populate(1, START, life_cycle_status="created")
+    (completed_id,) = youtube.populate(1, START - datetime.timedelta(weeks=1))
+    manager.add_pending(video_id)
+    manager.add_pending(completed_id)
+
+    index = channel_svc.build_index(models.BroadcastStatus.UPCOMING)
+    assert channel_svc.resume_thumbnails(index) == [video_id]
+    channel_svc.close()
+
+    # the pending video which is no longer upcoming is forgotten
+    assert youtube.calls["youtube.thumbnails.set"] == 1
+    assert manager.get_digest(video_id) == manager.digest(resources.THUMBNAIL)
+    assert not manager.pending()
+
+
+def test_thumbnail_failure(
+    channel_svc: Channel, youtube: fakes.FakeYouTube, manager: thumbnails.ThumbnailManager
+) -> None:
+    youtube.inject_error(HTTPStatus.BAD_REQUEST, "invalidImage", "youtube.thumbnails.set")
+
+    video_id = channel_svc.schedule_broadcast("Mass", "The readings", START)
+    channel_svc.close()
+
+    assert list(channel_svc.thumbnail_failures) == [video_id]
+    assert manager.pending() == [video_id]
+
+
+def test_update_skips_recorded(
+    channel_svc: Channel, youtube: fakes.FakeYouTube, manager: thumbnails.ThumbnailManager
+) -> None:
+    (video_id,) = youtube.populate(1, START, life_cycle_status="created")
+    manager.record(video_id, "digest of a previous image")
+
+    channel_svc.update_broadcast(video_id, "Mass", "The readings", START)
+    channel_svc.close()
+    assert youtube.calls["youtube.thumbnails.set"] == 1
+
+    # the image is now recorded as set on the video, so updating it again does not upload it
+    channel_svc.update_broadcast(video_id, "Mass", "Other readings", START)
+    channel_svc.close()
+
+    assert youtube.calls["youtube.thumbnails.set"] == 1
+    assert youtube.calls["youtube.liveBroadcasts.update"] == 2
+    assert manager.has_thumbnail(video_id, manager.digest(resources.THUMBNAIL))
+
+
+def test_update_without_record_not_uploaded(
+    channel_svc: Channel, youtube: fakes.FakeYouTube, manager: thumbnails.ThumbnailManager
+) -> None:
+    # a broadcast scheduled before the thumbnails were recorded
+    (video_id,) = youtube.populate(1, START, life_cycle_status="created")
+
+    channel_svc.update_broadcast(video_id, "Mass", "The readings", START)
+    channel_svc.close()
+
+    assert youtube.calls["youtube.thumbnails.set"] == 0
+    assert manager.get_digest(video_id) is None
+
+
+def test_update_with_changed_image_uploaded(
+    channel_svc: Channel, youtube: fakes.FakeYouTube, manager: thumbnails.ThumbnailManager
+) -> None:
+    video_id, unchanged_id = youtube.populate(2, START, life_cycle_status="created")
+    manager.record(video_id, "digest of a previous image")
+    manager.record(unchanged_id, manager.digest(resources.THUMBNAIL))
+
+    channel_svc.update_broadcast(video_id, "Mass", "The readings", START)
+    channel_svc.update_broadcast(unchanged_id, "Mass", "The readings", START)
+    channel_svc.close()
+
+    assert youtube.calls["youtube.thumbnails.set"] == 1
+    assert youtube.get_thumbnail_size(video_id)
+    assert manager.get_digest(video_id) == manager.digest(resources.THUMBNAIL)
+
+
+def test_delete_forgets(channel_svc: Channel, youtube: fakes.FakeYouTube, manager: thumbnails.ThumbnailManager) -> None:
+    first_id, second_id, kept_id = youtube.populate(3, START)
+    for video_id in (first_id, second_id, kept_id):
+        manager.record(video_id, "digest")
+
+    channel_svc.delete_broadcast(first_id)
+    channel_svc.delete_broadcasts([second_id, "missing"])
+
+    assert manager.get_digest(first_id) is None
+    assert manager.get_digest(second_id) is None
+    assert manager.get_digest(kept_id) == "digest"
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import datetime
+from typing import TYPE_CHECKING
+
+import pytest
+
+from stjoseph.api import watermark
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from stjoseph.api.services.channel import Channel
+    from tests import fakes
+
+START = datetime.datetime(2020, 1, 5, 15, tzinfo=datetime.UTC)
+SHORT = datetime.timedelta(minutes=5)
+
+
+@pytest.fixture
+def youtube(youtube: fakes.FakeYouTube) -> fakes.FakeYouTube:
+    youtube.populate(480, START, datetime.timedelta(days=1))
+    youtube.populate(20, START + datetime.timedelta(hours=1), datetime.timedelta(days=10), duration=SHORT)
+    return youtube
+
+
+def _delete_eligible(channel: Channel, deletion_watermark: watermark.DeletionWatermark) -> list[str]:
+    streams = list(channel.list_eligible_for_deletion(deletion_watermark=deletion_watermark))
+    results = channel.delete_broadcasts(stream.id for stream in streams) if streams else {}
+    deletion_watermark.advance(stream for stream in streams if not results[stream.id])
+    return [stream.id for stream in streams]
+
+
+def test_incremental_scan(tmp_path: Path, channel_svc: Channel, youtube: fakes.FakeYouTube) -> None:
+    path = tmp_path / "watermark.json"
+
+    assert len(_delete_eligible(channel_svc, watermark.DeletionWatermark(path))) == 20
+    assert youtube.calls["youtube.liveBroadcasts.list"] == 10
+
+    newest = START + datetime.timedelta(days=600)
+    new_ids = youtube.populate(3, newest, datetime.timedelta(days=1), duration=SHORT)
+    youtube.populate(2, newest + datetime.timedelta(days=3), datetime.timedelta(days=1))
+
+    assert sorted(_delete_eligible(channel_svc, watermark.DeletionWatermark(path))) == sorted(new_ids)
+    assert youtube.calls["youtube.liveBroadcasts.list"] == 11
+    assert watermark.DeletionWatermark(path).stored == newest + datetime.timedelta(days=4)
+
+
+def test_unsettled_caps_watermark(tmp_path: Path, channel_svc: Channel) -> None:
+    path = tmp_path / "watermark.json"
+    deletion_watermark = watermark.DeletionWatermark(path)
+    streams = list(channel_svc.list_eligible_for_deletion(deletion_watermark=deletion_watermark))
+    oldest = min(streams, key=lambda stream: stream.scheduled_start or START)
+
+    deletion_watermark.advance([oldest])  # e.g. listed without being deleted
+
+    stored = watermark.DeletionWatermark(path).stored
+    assert stored is not None
+    assert oldest.scheduled_start is not None
+    assert stored < oldest.scheduled_start
+    assert len(list(channel_svc.list_eligible_for_deletion(deletion_watermark=watermark.DeletionWatermark(path)))) == 20
+
+
+def test_full_scan(tmp_path: Path, channel_svc: Channel, youtube: fakes.FakeYouTube) -> None:
+    path = tmp_path / "watermark.json"
+    _delete_eligible(channel_svc, watermark.DeletionWatermark(path))
+    calls = youtube.calls["youtube.liveBroadcasts.list"]
+
+    assert _delete_eligible(channel_svc, watermark.DeletionWatermark(path, full=True)) == []
+    assert youtube.calls["youtube.liveBroadcasts.list"] == calls + 10